@@ -0,0 +1,128 @@
+"""
+Sweep benchmark: the same newsletter groups run as one handler job per group
+(synchronous Messages API calls) and as a single batch job ('groups' input,
+Message Batches API), against local stand-ins (see stand_ins.py).
+
+    python benchmarks/bench_batch.py [--groups 12] [--newsletters 6] [--per-group 3]
+        [--llm-delay-ms 200] [--batch-latency-ms 2000] [--output run.json]
+
+Groups draw overlapping newsletter sets, as overnight sweeps do. For each
+mode it reports wall time, the feed/page/API requests served, input and
+output tokens, and an estimated cost at list prices, with the Batches API
+discount applied to batch tokens. The number to track is groups_per_dollar.
+"""
+import argparse
+import contextlib
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import allow_stand_ins, write_results  # noqa: E402
+from stand_ins import StandInConfig, StandInServer  # noqa: E402
+
+# USD per million tokens for the handler's model, and the Batches API discount
+INPUT_PRICE_PER_MTOK = 3.0
+OUTPUT_PRICE_PER_MTOK = 15.0
+BATCH_DISCOUNT = 0.5
+
+def make_groups(base_url: str, groups: int, newsletters: int, per_group: int) -> Dict[str, List[str]]:
+    return {
+        f'group-{index}': [f'{base_url}/n{(index + offset) % newsletters}' for offset in range(per_group)]
+        for index in range(groups)
+    }
+
+def usage_of(stage: Dict) -> Dict[str, int]:
+    usage = stage.get('usage', {}) if isinstance(stage, dict) else {}
+    return {'input_tokens': usage.get('input_tokens', 0) + usage.get('cache_read_input_tokens', 0)
+            + usage.get('cache_creation_input_tokens', 0), 'output_tokens': usage.get('output_tokens', 0)}
+
+def summarize(mode: str, results: List[Dict], elapsed: float, served: Dict, discount: float) -> Dict:
+    tokens = {'input_tokens': 0, 'output_tokens': 0}
+    errors = set()
+    for result in results:
+        for stage in (result.get('research_intelligence'), result.get('outreach_strategy')):
+            if isinstance(stage, dict) and 'error' in stage:
+                errors.add(stage['error'])
+            for name, count in usage_of(stage).items():
+                tokens[name] += count
+    cost = discount * (tokens['input_tokens'] * INPUT_PRICE_PER_MTOK
+                       + tokens['output_tokens'] * OUTPUT_PRICE_PER_MTOK) / 1_000_000
+    return {
+        'mode': mode,
+        'groups': len(results),
+        'errors': sorted(errors),
+        'wall_seconds': round(elapsed, 2),
+        'requests_served': served['requests'],
+        'tokens': tokens,
+        'estimated_cost_usd': round(cost, 4),
+        'groups_per_dollar': round(len(results) / cost, 1) if cost else None,
+    }
+
+def run_mode(handler, mode: str, groups: Dict[str, List[str]], base_input: Dict, server: StandInServer) -> Dict:
+    from security_utils import dns_cache
+
+    handler._feed_cache.clear()
+    dns_cache.clear()
+    before = server.snapshot()['requests']
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if mode == 'per_group_jobs':
+            results = [handler.handler({'input': {**base_input, 'newsletters': urls}}) for urls in groups.values()]
+            discount = 1.0
+        else:
+            results = handler.handler({'input': {**base_input, 'groups': groups}})['groups']
+            discount = BATCH_DISCOUNT
+    elapsed = time.perf_counter() - started
+    after = server.snapshot()['requests']
+    served = {'requests': {kind: count - before.get(kind, 0) for kind, count in after.items()
+                           if count != before.get(kind, 0)}}
+    return summarize(mode, results, elapsed, served, discount)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=12)
+    parser.add_argument('--newsletters', type=int, default=6, help='distinct newsletters the groups draw from')
+    parser.add_argument('--per-group', type=int, default=3, help='newsletters per group')
+    parser.add_argument('--posts', type=int, default=3)
+    parser.add_argument('--llm-delay-ms', type=float, default=200.0)
+    parser.add_argument('--batch-latency-ms', type=float, default=2000.0)
+    parser.add_argument('--output', help='write results JSON to this file')
+    args = parser.parse_args()
+
+    # Let the handler reach the stand-ins and keep its caches out of the real cache volume
+    os.environ['RESEARCH_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-cache-')
+    allow_stand_ins()
+    import claude_utils
+    import handler
+
+    server = StandInServer(StandInConfig(newsletters=args.newsletters, posts=args.posts, page_latency_ms=5,
+                                         llm_delay_ms=args.llm_delay_ms,
+                                         batch_latency_ms=args.batch_latency_ms)).start()
+    try:
+        claude_utils.ANTHROPIC_API_URL = server.base_url
+        claude_utils.BATCH_POLL_SECONDS = min(claude_utils.BATCH_POLL_SECONDS, args.batch_latency_ms / 4000)
+        handler.ANTHROPIC_API_KEY = 'stand-in'
+        groups = make_groups(server.base_url, args.groups, args.newsletters, args.per_group)
+        base_input = {'posts_per_newsletter': args.posts, 'host_delay_seconds': 0,
+                      'cache_policy': 'bypass', 'post_cache': 'bypass'}
+        modes = [run_mode(handler, mode, groups, base_input, server) for mode in ('per_group_jobs', 'batch_job')]
+    finally:
+        server.stop()
+
+    write_results({
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'settings': vars(args),
+        'modes': modes,
+        'groups_per_dollar_ratio': (round(modes[1]['groups_per_dollar'] / modes[0]['groups_per_dollar'], 2)
+                                    if modes[0]['groups_per_dollar'] and modes[1]['groups_per_dollar'] else None),
+    }, args.output)
+
+if __name__ == '__main__':
+    main()
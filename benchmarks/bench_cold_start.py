@@ -0,0 +1,165 @@
+"""
+Cold-start benchmark: how long a fresh worker process takes to import the
+handler, import the runpod SDK and finish its first job.
+
+    python benchmarks/bench_cold_start.py [--runs 5] [--output run.json] [--baseline previous.json]
+        [--image research-worker:cuda --image research-worker:cpu]
+
+Every run is a new interpreter with an empty cache directory. The first job
+goes to local stand-ins (see stand_ins.py), so network time stays small and
+steady. Two modes are compared: 'cold' (no warm-up) and 'warm_up'
+(RESEARCH_WARMUP=1, warm-up thread overlapping the runpod import). The
+number to track is time_to_first_job_ms.p50 in 'warm_up' mode: process
+spawn to first job result, measured by the parent.
+
+Each --image (built from Dockerfile or Dockerfile.cpu) is also started with
+`docker run` to time container start to a ready worker (handler and runpod
+imported) and to report the image size.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import REPO_ROOT, write_results  # noqa: E402
+from stand_ins import StandInConfig, StandInServer  # noqa: E402
+
+# Runs in the fresh process: the same steps as `python handler.py` up to the
+# worker loop, then optionally one job against the stand-ins. The last stdout
+# line is the timings.
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import handler
+imported = time.perf_counter()
+handler.import_runpod()
+ready = time.perf_counter()
+timings = {'import_handler_ms': (imported - started) * 1000, 'import_runpod_ms': (ready - imported) * 1000}
+if len(sys.argv) > 1:
+    sys.path.insert(0, 'benchmarks')
+    from bench_utils import allow_stand_ins
+    allow_stand_ins()
+    result = handler.handler(json.loads(sys.argv[1]))
+    timings['first_job_ms'] = (time.perf_counter() - ready) * 1000
+    timings['error'] = result.get('error') or result['research_intelligence'].get('error')
+print(json.dumps(timings))
+"""
+
+EAGER_RUNPOD_PROBE = """
+import json, time
+started = time.perf_counter()
+import runpod
+print(json.dumps({'import_runpod_ms': (time.perf_counter() - started) * 1000}))
+"""
+
+MODES = {'cold': {}, 'warm_up': {'RESEARCH_WARMUP': '1'}}
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {'p50': round(percentile(values, 0.5), 1), 'min': round(min(values), 1), 'max': round(max(values), 1)}
+
+def run_probe(argv: List[str], env: Dict[str, str]) -> Dict:
+    """Run a probe command, returning its timings plus the parent-measured wall time"""
+    started = time.perf_counter()
+    completed = subprocess.run(argv, env=env, cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings['wall_ms'] = (time.perf_counter() - started) * 1000
+    return timings
+
+def probe_env(extra: Dict[str, str], base_url: Optional[str] = None) -> Dict[str, str]:
+    env = {**os.environ, **extra}
+    env['RESEARCH_CACHE_DIR'] = tempfile.mkdtemp(prefix='cold-start-cache-')
+    env['RESEARCH_WARMUP_HOSTS'] = '127.0.0.1'
+    if base_url:
+        env['ANTHROPIC_API_URL'] = base_url
+        env['ANTHROPIC_API_KEY'] = 'stand-in'
+    return env
+
+def bench_local(runs: int) -> Dict:
+    server = StandInServer(StandInConfig(newsletters=2, posts=3, page_latency_ms=5, llm_delay_ms=50)).start()
+    try:
+        event = {'input': {
+            'newsletters': [f'{server.base_url}/n{i}' for i in range(2)],
+            'posts_per_newsletter': 3,
+            'host_delay_seconds': 0,
+            'content_mode': 'scrape',
+        }}
+        python = [sys.executable, '-c']
+        startup = [run_probe(python + ["print('{}')"], probe_env({}))['wall_ms'] for _ in range(runs)]
+        eager = [run_probe(python + [EAGER_RUNPOD_PROBE], probe_env({}))['import_runpod_ms'] for _ in range(runs)]
+
+        modes = {}
+        for mode, extra in MODES.items():
+            samples = [run_probe(python + [PROBE, json.dumps(event)], probe_env(extra, server.base_url))
+                       for _ in range(runs)]
+            modes[mode] = {
+                'time_to_first_job_ms': summarize([sample['wall_ms'] for sample in samples]),
+                **{key: summarize([sample[key] for sample in samples])
+                   for key in ('import_handler_ms', 'import_runpod_ms', 'first_job_ms')},
+                'errors': sorted({sample['error'] for sample in samples if sample['error']}),
+            }
+    finally:
+        server.stop()
+
+    return {
+        'python_startup_ms': summarize(startup),
+        'eager_runpod_import_ms': summarize(eager),
+        'modes': modes,
+    }
+
+def bench_image(image: str, runs: int) -> Dict:
+    size = subprocess.run(['docker', 'image', 'inspect', '--format', '{{.Size}}', image],
+                          capture_output=True, text=True, check=True).stdout.strip()
+    argv = ['docker', 'run', '--rm', '-e', 'RESEARCH_WARMUP=1', '--entrypoint', 'python', image, '-c', PROBE]
+    samples = [run_probe(argv, dict(os.environ)) for _ in range(runs)]
+    return {
+        'image': image,
+        'size_mb': round(int(size) / 1024 / 1024, 1),
+        'container_ready_ms': summarize([sample['wall_ms'] for sample in samples]),
+        'import_handler_ms': summarize([sample['import_handler_ms'] for sample in samples]),
+        'import_runpod_ms': summarize([sample['import_runpod_ms'] for sample in samples]),
+    }
+
+def compare(results: Dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    for mode, run in results['local']['modes'].items():
+        before = baseline.get('local', {}).get('modes', {}).get(mode)
+        if before:
+            run['vs_baseline'] = {
+                'time_to_first_job': round(run['time_to_first_job_ms']['p50'] / before['time_to_first_job_ms']['p50'], 3),
+            }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per measurement')
+    parser.add_argument('--image', action='append', default=[], help='docker image to time (repeatable)')
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    args = parser.parse_args()
+
+    results = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'local': bench_local(args.runs),
+    }
+    if args.image:
+        results['images'] = [bench_image(image, args.runs) for image in args.image]
+    if args.baseline:
+        compare(results, args.baseline)
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
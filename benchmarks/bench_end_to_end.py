@@ -0,0 +1,208 @@
+"""
+Offline end-to-end benchmark: run handler() against local stand-ins for the
+newsletters and the Anthropic API (see stand_ins.py).
+
+    python benchmarks/bench_end_to_end.py [--scenarios scrape_cold streaming] [--jobs 5]
+        [--page-latency-ms 20] [--llm-delay-ms 200] [--output run.json] [--baseline previous.json]
+
+Each scenario starts a fresh stand-in server in a subprocess, runs its jobs
+(concurrency > 1 overlaps jobs the way async_handler does) and reports
+jobs/sec, p50/p95 job latency, peak RSS of this process, and the requests
+and bytes the stand-ins served. Streaming scenarios also report time to the
+first event and to the first analysis text. The prompt_cache_* scenarios
+compare prompt caching off and on with input processing time simulated
+per uncached token. With --baseline, each scenario
+gains the ratio of its jobs/sec and p95 to the same scenario in that file.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, fields
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import allow_stand_ins, peak_rss_delta_kb, write_results  # noqa: E402
+from stand_ins import StandInConfig  # noqa: E402
+
+STAND_INS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stand_ins.py')
+
+# Stand-in settings, handler job input and run shape per scenario. Cold
+# scenarios bypass every cache and clear the in-memory ones before each job.
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    'scrape_cold': {'server': {}, 'job_input': {'content_mode': 'scrape'}},
+    'feed_first_cold': {'server': {'full_content': True}, 'job_input': {}},
+    'warm_cache': {'server': {}, 'job_input': {'content_mode': 'scrape'}, 'warm': True},
+    'concurrent_jobs': {'server': {}, 'job_input': {'content_mode': 'scrape'}, 'concurrency': 4, 'jobs': 8},
+    'map_reduce': {'server': {}, 'job_input': {'content_mode': 'scrape', 'analysis_mode': 'map_reduce'}},
+    'streaming': {'server': {}, 'job_input': {'content_mode': 'scrape'}, 'streaming': True},
+    'prompt_cache_off': {'server': {'llm_prefill_ms_per_1k_tokens': 20.0},
+                         'job_input': {'content_mode': 'scrape', 'prompt_cache': 'off'}},
+    'prompt_cache_corpus': {'server': {'llm_prefill_ms_per_1k_tokens': 20.0},
+                            'job_input': {'content_mode': 'scrape', 'prompt_cache': 'corpus'}},
+}
+COLD_INPUT = {'cache_policy': 'bypass', 'post_cache': 'bypass'}
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def start_stand_ins(config: StandInConfig) -> subprocess.Popen:
+    argv = [sys.executable, STAND_INS]
+    for name, value in asdict(config).items():
+        flag = '--' + name.replace('_', '-')
+        if isinstance(value, bool):
+            argv += [flag] if value else []
+        else:
+            argv += [flag, str(value)]
+    return subprocess.Popen(argv, stdout=subprocess.PIPE, text=True)
+
+def fetch_stats(base_url: str) -> Dict:
+    with urllib.request.urlopen(f'{base_url}/_stats') as response:
+        return json.loads(response.read())
+
+def run_job(handler, event: Dict, streaming: bool) -> Dict:
+    started = time.perf_counter()
+    timings = {}
+    if streaming:
+        for item in handler.stream_handler(event):
+            timings.setdefault('first_event_ms', (time.perf_counter() - started) * 1000)
+            if item['event'] == 'analysis':
+                timings.setdefault('first_text_ms', (time.perf_counter() - started) * 1000)
+        result = item['result']
+    else:
+        result = handler.handler(event)
+    timings['latency_ms'] = (time.perf_counter() - started) * 1000
+    analysis = result.get('research_intelligence', {})
+    timings['error'] = result.get('error') or analysis.get('error')
+    timings['posts'] = result.get('posts_collected', 0)
+    return timings
+
+def run_scenario(name: str, scenario: Dict, args: argparse.Namespace) -> Dict:
+    import claude_utils
+    import handler
+    from security_utils import dns_cache
+
+    overrides = {field.name: getattr(args, field.name) for field in fields(StandInConfig)
+                 if getattr(args, field.name) is not None}
+    config = StandInConfig(**{**scenario['server'], **overrides})
+    jobs = args.jobs or scenario.get('jobs', 5)
+    concurrency = scenario.get('concurrency', 1)
+    warm = scenario.get('warm', False)
+
+    process = start_stand_ins(config)
+    try:
+        base_url = f"http://127.0.0.1:{json.loads(process.stdout.readline())['port']}"
+        claude_utils.ANTHROPIC_API_URL = base_url
+        handler.ANTHROPIC_API_KEY = 'stand-in'
+
+        event = {'input': {
+            'newsletters': [f'{base_url}/n{i}' for i in range(config.newsletters)],
+            'posts_per_newsletter': config.posts,
+            'host_delay_seconds': 0,
+            **({} if warm else COLD_INPUT),
+            **scenario['job_input'],
+        }}
+
+        def one_job(index: int) -> Dict:
+            if not warm and concurrency == 1:
+                handler._feed_cache.clear()
+                dns_cache.clear()
+            return run_job(handler, {**event, 'id': f'{name}-{index}'}, scenario.get('streaming', False))
+
+        if warm:
+            one_job(-1)
+        runs = []
+
+        def run_all():
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    runs.extend(executor.map(one_job, range(jobs)))
+
+        started = time.perf_counter()
+        peak_rss = peak_rss_delta_kb(run_all)
+        elapsed = time.perf_counter() - started
+        served = fetch_stats(base_url)
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = [run['latency_ms'] for run in runs]
+    result = {
+        'scenario': name,
+        'config': asdict(config),
+        'job_input': {key: value for key, value in event['input'].items() if key != 'newsletters'},
+        'jobs': jobs,
+        'concurrency': concurrency,
+        'errors': sorted({run['error'] for run in runs if run['error']}),
+        'posts_per_job': runs[0]['posts'] if runs else 0,
+        'jobs_per_second': round(jobs / elapsed, 3),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.5), 1),
+            'p95': round(percentile(latencies, 0.95), 1),
+            'max': round(max(latencies), 1),
+        },
+        'peak_rss_delta_kb': peak_rss,
+        'requests_served': served['requests'],
+        'bytes_served': served['bytes_sent'],
+        'prompt_cache_tokens': served['prompt_cache'],
+    }
+    for key in ('first_event_ms', 'first_text_ms'):
+        values = [run[key] for run in runs if key in run]
+        if values:
+            result[key] = {'p50': round(percentile(values, 0.5), 1), 'p95': round(percentile(values, 0.95), 1)}
+    return result
+
+def compare(results: List[Dict], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {run['scenario']: run for run in json.load(f)['scenarios']}
+    for run in results:
+        before = baseline.get(run['scenario'])
+        if before:
+            run['vs_baseline'] = {
+                'jobs_per_second': round(run['jobs_per_second'] / before['jobs_per_second'], 3),
+                'p95_latency': round(run['latency_ms']['p95'] / before['latency_ms']['p95'], 3),
+            }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--jobs', type=int, help='jobs per scenario (default: per scenario)')
+    for field in fields(StandInConfig):
+        flag = '--' + field.name.replace('_', '-')
+        if field.type is bool:
+            parser.add_argument(flag, action='store_true', default=None)
+        else:
+            parser.add_argument(flag, type=field.type, help=f'stand-in setting (default {field.default})')
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    args = parser.parse_args()
+
+    # Let the handler reach the stand-ins and keep its caches out of the real cache volume
+    os.environ['RESEARCH_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-cache-')
+    allow_stand_ins()
+
+    results = []
+    for name in args.scenarios:
+        print(f'running {name}...', file=sys.stderr)
+        results.append(run_scenario(name, SCENARIOS[name], args))
+    if args.baseline:
+        compare(results, args.baseline)
+
+    write_results({
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'scenarios': results,
+    }, args.output)
+
+if __name__ == '__main__':
+    main()
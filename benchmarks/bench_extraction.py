@@ -0,0 +1,95 @@
+"""
+Compare the buffered BeautifulSoup scrape path with the streaming lxml
+extractor on Substack-sized pages.
+
+    python benchmarks/bench_extraction.py [--iterations 20] [--preload-kb 300 1500]
+
+Latency is measured in-process. Peak RSS is measured in a fresh subprocess
+per (mode, size) so the two paths do not share a high-water mark.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import peak_rss_delta_kb  # noqa: E402
+from extract_utils import extract_with_soup, extract_streaming  # noqa: E402
+from synthetic_pages import substack_post_html  # noqa: E402
+
+CHUNK_SIZE = 8192
+MAX_CHARS = 5000
+
+def _chunks(page: bytes):
+    for start in range(0, len(page), CHUNK_SIZE):
+        yield page[start:start + CHUNK_SIZE]
+
+def buffered_path(page: bytes) -> str:
+    """The previous scrape_post_content path: accumulate every chunk, then parse"""
+    content_bytes = b""
+    for chunk in _chunks(page):
+        content_bytes += chunk
+    return extract_with_soup(content_bytes, MAX_CHARS)
+
+def streaming_path(page: bytes) -> str:
+    return extract_streaming(_chunks(page), MAX_CHARS)
+
+MODES = {'buffered': buffered_path, 'streaming': streaming_path}
+
+def _page(preload_kb: int) -> bytes:
+    return substack_post_html(paragraphs=120, preload_bytes=preload_kb * 1024)
+
+def _peak_rss_kb(mode: str, page_path: str) -> int:
+    output = subprocess.check_output(
+        [sys.executable, __file__, '--rss-worker', mode, '--page', page_path], text=True
+    )
+    return json.loads(output)['peak_rss_delta_kb']
+
+def _rss_worker(mode: str, page_path: str) -> None:
+    # Read a pre-generated page so generating it does not set the high-water mark
+    with open(page_path, 'rb') as f:
+        page = f.read()
+    print(json.dumps({'peak_rss_delta_kb': peak_rss_delta_kb(lambda: MODES[mode](page))}))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--preload-kb', type=int, nargs='+', default=[300, 1500])
+    parser.add_argument('--rss-worker', choices=sorted(MODES))
+    parser.add_argument('--page', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_worker:
+        _rss_worker(args.rss_worker, args.page)
+        return
+
+    results = []
+    workdir = tempfile.TemporaryDirectory()
+    for preload_kb in args.preload_kb:
+        page = _page(preload_kb)
+        page_path = os.path.join(workdir.name, f'page-{preload_kb}.html')
+        with open(page_path, 'wb') as f:
+            f.write(page)
+        outputs = {}
+        for mode, extract in MODES.items():
+            started = time.perf_counter()
+            for _ in range(args.iterations):
+                outputs[mode] = extract(page)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / args.iterations
+            results.append({
+                'mode': mode,
+                'page_kb': len(page) // 1024,
+                'latency_ms': round(elapsed_ms, 2),
+                'peak_rss_delta_kb': _peak_rss_kb(mode, page_path),
+            })
+        results.append({'page_kb': len(page) // 1024, 'outputs_match': outputs['buffered'] == outputs['streaming']})
+
+    workdir.cleanup()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
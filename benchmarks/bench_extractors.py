@@ -0,0 +1,100 @@
+"""
+Benchmark every available extractor backend over the fixture corpus
+(built by make_fixtures.py).
+
+    python benchmarks/bench_extractors.py [--iterations 20] [--output results.json]
+
+For each backend this reports pages/second over the corpus, peak RSS
+(measured in a fresh subprocess per backend), and for every fixture
+whether the output matches the reference 'soup' backend, with a short
+diff when it does not. 'recommended' is the fastest backend whose output
+matches outside REFERENCE_QUIRKS; select it with the job input
+'extractor' or RESEARCH_EXTRACTOR.
+"""
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import peak_rss_delta_kb, write_results  # noqa: E402
+from make_fixtures import build_fixtures  # noqa: E402
+from extract_utils import available_extractors, create_extractor  # noqa: E402
+
+REFERENCE = 'soup'
+# Fixtures where the reference itself is wrong: html.parser never auto-closes
+# <p>, so unclosed paragraphs are emitted once per enclosing paragraph
+REFERENCE_QUIRKS = {'malformed.html'}
+CHUNK_SIZE = 8192
+MAX_CHARS = 5000
+
+def run_extractor(name: str, page: bytes) -> str:
+    """Feed a page in network-sized chunks, the way _scrape_post does"""
+    extractor = create_extractor(name, MAX_CHARS)
+    for start in range(0, len(page), CHUNK_SIZE):
+        if extractor.feed(page[start:start + CHUNK_SIZE]):
+            break
+    return extractor.close()
+
+def _diff(expected: str, actual: str, limit: int = 12) -> list:
+    lines = difflib.unified_diff(expected.split('\n\n'), actual.split('\n\n'),
+                                 'reference', 'backend', lineterm='', n=0)
+    return [line[:160] for line in lines][:limit]
+
+def _rss_worker(name: str) -> None:
+    corpus = build_fixtures()
+    peak = peak_rss_delta_kb(lambda: [run_extractor(name, page) for page in corpus.values()])
+    print(json.dumps({'peak_rss_delta_kb': peak}))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    parser.add_argument('--rss-worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_worker:
+        _rss_worker(args.rss_worker)
+        return
+
+    corpus = build_fixtures()
+    reference = {name: run_extractor(REFERENCE, page) for name, page in corpus.items()}
+
+    backends = []
+    for backend in available_extractors():
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            outputs = {name: run_extractor(backend, page) for name, page in corpus.items()}
+        elapsed = time.perf_counter() - started
+
+        rss = json.loads(subprocess.check_output(
+            [sys.executable, __file__, '--rss-worker', backend], text=True))['peak_rss_delta_kb']
+        mismatches = {
+            name: _diff(reference[name], output)
+            for name, output in outputs.items() if output != reference[name]
+        }
+        backends.append({
+            'backend': backend,
+            'pages_per_second': round(len(corpus) * args.iterations / elapsed, 1),
+            'peak_rss_delta_kb': rss,
+            'matches_reference': len(corpus) - len(mismatches),
+            'fixtures': len(corpus),
+            'mismatches': mismatches,
+        })
+
+    backends.sort(key=lambda result: result['pages_per_second'], reverse=True)
+    matching = [result['backend'] for result in backends if not set(result['mismatches']) - REFERENCE_QUIRKS]
+    write_results({
+        'reference': REFERENCE,
+        'corpus_bytes': sum(len(page) for page in corpus.values()),
+        'reference_quirks': sorted(REFERENCE_QUIRKS),
+        'backends': backends,
+        'recommended': matching[0] if matching else REFERENCE,
+    }, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Shared helpers for the offline benchmarks."""
+import json
+import os
+import resource
+import sys
+from typing import Any, Callable, Dict, Optional
+from unittest.mock import patch
+from urllib.parse import urlparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+def allow_stand_ins(host: str = '127.0.0.1') -> None:
+    """
+    Let this benchmark process reach local stand-ins on host. The SSRF guard
+    refuses loopback addresses, so its URL check and connection pinning are
+    patched to pass host through, as the unit tests do; every other host is
+    still checked. For the rest of the process only.
+    """
+    import security_utils
+
+    check_url, resolve_vetted = security_utils._check_url, security_utils.resolve_vetted
+    patch('security_utils._check_url', lambda url: urlparse(url).hostname == host or check_url(url)).start()
+    patch('security_utils.resolve_vetted',
+          lambda hostname: hostname if hostname == host else resolve_vetted(hostname)).start()
+
+def _proc_status_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+def peak_rss_delta_kb(fn: Callable[[], Any]) -> int:
+    """
+    Run fn and return how far peak RSS rose above the RSS before the call.
+    Uses VmHWM reset on Linux; elsewhere falls back to ru_maxrss, which only
+    moves if fn exceeds the process's earlier high-water mark.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        before = _proc_status_kb('VmRSS')
+        fn()
+        return _proc_status_kb('VmHWM') - before
+    except OSError:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        fn()
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+def write_results(results: Dict[str, Any], output: Optional[str]) -> None:
+    """Print results as JSON and optionally save them for later comparison"""
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
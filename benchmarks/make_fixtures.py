@@ -0,0 +1,104 @@
+"""
+Build the HTML fixture corpus used by bench_extractors.py and the extractor
+tests.
+
+The fixtures reproduce the markup structure of the Substack and Ghost
+themes we scrape (containers, paywall blocks, preload blobs, theme chrome)
+with seeded synthetic text, so every run builds the same corpus in memory
+(see build_fixtures) and nothing has to be committed. To inspect the pages,
+write them to the gitignored benchmarks/fixtures/:
+
+    python benchmarks/make_fixtures.py
+"""
+import os
+import sys
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_pages import post_body_html, substack_post_html  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def substack_legacy() -> bytes:
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>Legacy</title>
+<script>window._analytics = {{"events": ["</p>", "<div class='post-content'>"]}}</script></head>
+<body><div class="container"><div class="single-post"><article class="post">
+<h1 class="post-title">Legacy Substack layout</h1>
+<div class="post-content"><div class="body markup">{post_body_html(60, seed=11)}</div></div>
+</article><div class="post-footer"><p>Share this post</p></div></div></div></body></html>""".encode('utf-8')
+
+def substack_paywalled() -> bytes:
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>Paywalled</title></head>
+<body><article class="newsletter-post post"><div class="post-header">
+<h1 class="post-title">Paid post preview</h1><h3 class="subtitle">For subscribers</h3></div>
+<div class="available-content"><div class="body markup">{post_body_html(6, seed=12)}</div>
+<div class="paywall"><h2 class="paywall-title">Keep reading with a 7-day free trial</h2>
+<p class="paywall-cta">Subscribe to keep reading this post.</p></div></div>
+</article></body></html>""".encode('utf-8')
+
+def ghost_casper() -> bytes:
+    return f"""<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">
+<title>Ghost Casper</title><link rel="stylesheet" href="/assets/built/screen.css"></head>
+<body class="post-template"><div class="site-wrapper"><header class="site-header">
+<nav class="site-nav"><ul class="nav"><li><a href="/">Home</a></li></ul></nav></header>
+<main id="site-main" class="site-main outer"><div class="inner">
+<article class="post-full post"><header class="post-full-header">
+<h1 class="post-full-title">Casper theme post</h1></header>
+<section class="post-full-content"><div class="post-content">{post_body_html(50, seed=21)}
+<figure class="kg-card kg-image-card"><img src="/content/images/x.png"><figcaption>Figure</figcaption></figure>
+</div></section></article></div></main>
+<footer class="site-footer"><p>Published with Ghost</p></footer></div></body></html>""".encode('utf-8')
+
+def ghost_source() -> bytes:
+    return f"""<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Ghost Source</title>
+<style>:root {{ --ghost-accent-color: #ff1a75; }}</style></head>
+<body class="post-template has-sans-title"><div class="gh-viewport">
+<header id="gh-navigation"><p>Menu</p></header><main class="gh-main">
+<article class="gh-article post"><header class="gh-article-header gh-canvas">
+<h1 class="gh-article-title is-title">Source theme post</h1>
+<p class="gh-article-excerpt is-body">An excerpt paragraph.</p></header>
+<section class="gh-content gh-canvas is-body">{post_body_html(50, seed=22)}</section>
+</article></main><footer class="gh-footer"><p>Powered by Ghost</p></footer></div></body></html>""".encode('utf-8')
+
+def substack_windows_1252() -> bytes:
+    return ("""<!DOCTYPE html><html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1252">
+<title>Legacy encoding</title></head><body><article><div class="available-content">
+<p>Café culture and “smart quotes” — an older export.</p>
+<p>Naïve résumé of the argument.</p></div></article></body></html>""").encode('cp1252')
+
+def malformed() -> bytes:
+    return b"""<html><body><article><div class="available-content">
+<p>Unclosed paragraph one
+<p>Unclosed paragraph two with <b>bold <i>nesting</b></i>
+<blockquote>Quote without paragraph</blockquote>
+<h2>Heading<h3>Nested heading</h3></h2>
+<p>Entity &amp; stray &lt;tag&gt; text</p>
+</div></article></body>"""
+
+FIXTURES = {
+    'substack_available_content.html': lambda: substack_post_html('Substack post', paragraphs=80,
+                                                                 preload_bytes=400_000, seed=1),
+    'substack_large_preload.html': lambda: substack_post_html('Substack long read', paragraphs=200,
+                                                             preload_bytes=1_500_000, seed=2),
+    'substack_legacy_post_content.html': substack_legacy,
+    'substack_paywalled.html': substack_paywalled,
+    'substack_windows_1252.html': substack_windows_1252,
+    'ghost_casper.html': ghost_casper,
+    'ghost_source.html': ghost_source,
+    'malformed.html': malformed,
+}
+
+def build_fixtures() -> Dict[str, bytes]:
+    """Fixture pages by file name, in name order"""
+    return {name: FIXTURES[name]() for name in sorted(FIXTURES)}
+
+def main() -> None:
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for name, page in build_fixtures().items():
+        with open(os.path.join(FIXTURES_DIR, name), 'wb') as f:
+            f.write(page)
+        print(f"wrote {name}")
+
+if __name__ == '__main__':
+    main()
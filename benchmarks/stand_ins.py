@@ -0,0 +1,346 @@
+"""
+Local stand-ins for Substack newsletters and the Anthropic Messages API, so
+the whole handler can run offline.
+
+    python benchmarks/stand_ins.py [--newsletters 3] [--posts 5] [--page-latency-ms 20] ...
+
+Serves:
+    GET  /n<i>/feed            RSS feed for newsletter i
+    GET  /n<i>/p/post-<j>      Substack-style post page
+    POST /v1/messages          fake Messages API, JSON or SSE when "stream" is set, with
+                               prompt caching for cache_control breakpoints
+    POST /v1/messages/batches  fake Message Batches API: create, then
+    GET  /v1/messages/batches/<id>[/results], POST .../<id>/cancel
+    GET  /_stats               requests and bytes served so far, as JSON
+
+Run as a script it prints {"port": ...} once listening and serves until
+killed, which keeps the server's memory out of the benchmark's RSS.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_pages import rss_feed_xml, substack_post_html  # noqa: E402
+
+# Prompt cache lifetime, refreshed on every read, as for the real API
+PROMPT_CACHE_TTL_SECONDS = 300
+
+WORDS = "researchers story consciousness collaboration wonder uncertainty podcast memory".split()
+
+@dataclass
+class StandInConfig:
+    newsletters: int = 3
+    posts: int = 5
+    paragraphs: int = 40
+    preload_kb: int = 200
+    full_content: bool = False
+    page_latency_ms: float = 20.0
+    llm_delay_ms: float = 200.0
+    llm_output_words: int = 300
+    llm_chunk_words: int = 10
+    llm_chunk_delay_ms: float = 5.0
+    # Input processing time per 1k uncached tokens; cache reads cost nothing
+    llm_prefill_ms_per_1k_tokens: float = 0.0
+    cache_min_tokens: int = 1024
+    # Time for a batch to end, and how many requests of each batch error
+    batch_latency_ms: float = 500.0
+    batch_errors: int = 0
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The streaming extractor closes connections once it has enough text
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class StandInServer:
+    """Threaded HTTP server for the stand-ins; pages are generated up front"""
+
+    def __init__(self, config: StandInConfig, host: str = '127.0.0.1', port: int = 0):
+        self.config = config
+        self.pages: Dict[str, bytes] = {}
+        for i in range(config.newsletters):
+            for j in range(config.posts):
+                self.pages[f'/n{i}/p/post-{j}'] = substack_post_html(
+                    title=f'Newsletter {i} post {j}', paragraphs=config.paragraphs,
+                    preload_bytes=config.preload_kb * 1024, seed=i * 1000 + j,
+                )
+        self.feeds: Dict[str, bytes] = {}
+        self.stats = {'requests': {}, 'bytes_sent': 0,
+                      'prompt_cache': {'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}}
+        self.prompt_cache: Dict[str, float] = {}
+        self.batches: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.httpd = _QuietServer((host, port), _make_handler(self))
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def feed(self, index: int) -> bytes:
+        path = f'/n{index}/feed'
+        with self._lock:
+            if path not in self.feeds:
+                self.feeds[path] = rss_feed_xml(
+                    f'{self.base_url}/n{index}', self.config.posts, self.config.full_content,
+                    self.config.paragraphs, seed=index * 1000,
+                )
+            return self.feeds[path]
+
+    def count(self, kind: str, sent: int) -> None:
+        with self._lock:
+            self.stats['requests'][kind] = self.stats['requests'].get(kind, 0) + 1
+            self.stats['bytes_sent'] += sent
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'requests': dict(self.stats['requests']), 'bytes_sent': self.stats['bytes_sent'],
+                    'prompt_cache': dict(self.stats['prompt_cache'])}
+
+    def prompt_usage(self, request: Dict) -> Tuple[str, Dict[str, int]]:
+        """
+        The request's prompt text and its input usage. Each cache_control
+        breakpoint caches the prefix up to it (system, then user content
+        blocks) when that prefix has at least cache_min_tokens; the longest
+        cached prefix is read, the rest up to the last breakpoint written.
+        """
+        segments = _segments(request.get('system')) + _segments(request['messages'][0]['content'])
+        total = 0
+        breakpoints: List[Tuple[str, int]] = []
+        for index, (text, cached) in enumerate(segments):
+            total += len(text) // 4
+            if cached:
+                prefix = json.dumps([request['model'], [text for text, _ in segments[:index + 1]]])
+                breakpoints.append((hashlib.sha256(prefix.encode('utf-8')).hexdigest(), total))
+
+        now = time.monotonic()
+        read = written = 0
+        with self._lock:
+            for key, tokens in reversed(breakpoints):
+                if self.prompt_cache.get(key, 0) > now:
+                    self.prompt_cache[key] = now + PROMPT_CACHE_TTL_SECONDS
+                    read = tokens
+                    break
+            for key, tokens in breakpoints:
+                if tokens > read and tokens >= self.config.cache_min_tokens:
+                    self.prompt_cache[key] = now + PROMPT_CACHE_TTL_SECONDS
+                    written = tokens - read
+            self.stats['prompt_cache']['cache_read_input_tokens'] += read
+            self.stats['prompt_cache']['cache_creation_input_tokens'] += written
+
+        usage = {'input_tokens': total - read - written,
+                 'cache_creation_input_tokens': written, 'cache_read_input_tokens': read}
+        return ''.join(text for text, _ in segments), usage
+
+    def reply(self, request: Dict) -> Dict:
+        """A Messages API reply for a request, without the response delay"""
+        prompt, usage = self.prompt_usage(request)
+        words = min(self.config.llm_output_words, request.get('max_tokens', self.config.llm_output_words))
+        usage['output_tokens'] = words
+        return {'type': 'message', 'role': 'assistant', 'model': request['model'],
+                'content': [{'type': 'text', 'text': synthetic_reply(prompt, words)}], 'usage': usage}
+
+    def create_batch(self, requests: List[Dict]) -> Dict:
+        """Answer a batch's requests up front; it reports them over batch_latency_ms"""
+        results = []
+        for index, item in enumerate(requests):
+            if index < self.config.batch_errors:
+                result = {'type': 'errored', 'error': {'type': 'error', 'error': {
+                    'type': 'invalid_request_error', 'message': 'stand-in batch error'}}}
+            else:
+                result = {'type': 'succeeded', 'message': self.reply(item['params'])}
+            results.append({'custom_id': item['custom_id'], 'result': result})
+        with self._lock:
+            batch_id = f'msgbatch_{len(self.batches):04d}'
+            self.batches[batch_id] = {'results': results, 'created': time.monotonic(), 'canceled_at': None}
+        return self.batch_status(batch_id)
+
+    def _done(self, batch: Dict) -> int:
+        """Requests of a batch answered so far: all of them after batch_latency_ms, none after a cancel"""
+        now = batch['canceled_at'] or time.monotonic()
+        elapsed_ms = (now - batch['created']) * 1000
+        if elapsed_ms >= self.config.batch_latency_ms:
+            return len(batch['results'])
+        return int(len(batch['results']) * elapsed_ms / self.config.batch_latency_ms)
+
+    def cancel_batch(self, batch_id: str) -> Dict:
+        with self._lock:
+            self.batches[batch_id]['canceled_at'] = self.batches[batch_id]['canceled_at'] or time.monotonic()
+        return self.batch_status(batch_id)
+
+    def batch_status(self, batch_id: str) -> Dict:
+        batch = self.batches[batch_id]
+        total = len(batch['results'])
+        done = self._done(batch)
+        canceled = batch['canceled_at'] is not None
+        ended = done == total or canceled
+        counts = {'processing': 0 if ended else total - done, 'succeeded': 0, 'errored': 0,
+                  'canceled': total - done if canceled else 0, 'expired': 0}
+        for item in batch['results'][:done]:
+            counts[item['result']['type']] += 1
+        return {
+            'id': batch_id, 'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': counts,
+            'results_url': f'{self.base_url}/v1/messages/batches/{batch_id}/results' if ended else None,
+        }
+
+    def batch_results(self, batch_id: str) -> bytes:
+        results = self.batches[batch_id]['results']
+        done = self._done(self.batches[batch_id])
+        lines = results[:done] + [
+            {'custom_id': item['custom_id'], 'result': {'type': 'canceled'}} for item in results[done:]
+        ]
+        return ''.join(json.dumps(line) + '\n' for line in lines).encode('utf-8')
+
+    def start(self) -> 'StandInServer':
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def synthetic_reply(prompt: str, words: int) -> str:
+    digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+    return ' '.join(WORDS[(digest[i % len(digest)] + i) % len(WORDS)] for i in range(words))
+
+def _segments(content) -> List[Tuple[str, bool]]:
+    """(text, is cache breakpoint) pairs for a system prompt or message content"""
+    if not content:
+        return []
+    if isinstance(content, str):
+        return [(content, False)]
+    return [(block['text'], 'cache_control' in block) for block in content]
+
+def _make_handler(server: StandInServer):
+    config = server.config
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, kind: str, body: bytes, content_type: str, status: int = 200) -> None:
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            server.count(kind, len(body))
+
+        def do_GET(self):
+            if self.path == '/_stats':
+                self._send('stats', json.dumps(server.snapshot()).encode('utf-8'), 'application/json')
+                return
+            if self.path.startswith('/v1/messages/batches/'):
+                parts = self.path.split('/')[4:]
+                if parts[0] not in server.batches:
+                    self._send('not_found', b'not found', 'text/plain', status=404)
+                elif parts[1:] == ['results']:
+                    self._send('batch_results', server.batch_results(parts[0]), 'application/x-jsonl')
+                else:
+                    self._send('batch_poll', json.dumps(server.batch_status(parts[0])).encode('utf-8'),
+                               'application/json')
+                return
+
+            time.sleep(config.page_latency_ms / 1000)
+            parts = self.path.strip('/').split('/')
+            if len(parts) == 2 and parts[1] == 'feed' and parts[0][1:].isdigit():
+                index = int(parts[0][1:])
+                if index < config.newsletters:
+                    self._send('feed', server.feed(index), 'application/rss+xml; charset=utf-8')
+                    return
+            if self.path in server.pages:
+                self._send('page', server.pages[self.path], 'text/html; charset=utf-8')
+                return
+            self._send('not_found', b'not found', 'text/plain', status=404)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path == '/v1/messages/batches':
+                batch = server.create_batch(json.loads(body)['requests'])
+                self._send('batch_create', json.dumps(batch).encode('utf-8'), 'application/json')
+                return
+            if self.path.startswith('/v1/messages/batches/') and self.path.endswith('/cancel'):
+                batch_id = self.path.split('/')[4]
+                if batch_id not in server.batches:
+                    self._send('not_found', b'not found', 'text/plain', status=404)
+                    return
+                self._send('batch_cancel', json.dumps(server.cancel_batch(batch_id)).encode('utf-8'),
+                           'application/json')
+                return
+            if self.path != '/v1/messages':
+                self._send('not_found', b'not found', 'text/plain', status=404)
+                return
+
+            request = json.loads(body)
+            reply = server.reply(request)
+            usage = reply['usage']
+            words = usage['output_tokens']
+            text = reply['content'][0]['text']
+            processed = usage['input_tokens'] + usage['cache_creation_input_tokens']
+            time.sleep((config.llm_delay_ms + config.llm_prefill_ms_per_1k_tokens * processed / 1000) / 1000)
+
+            if not request.get('stream'):
+                self._send('messages', json.dumps(reply).encode('utf-8'), 'application/json')
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            sent = 0
+
+            def event(name: str, data: Dict) -> None:
+                nonlocal sent
+                payload = f'event: {name}\ndata: {json.dumps(data)}\n\n'.encode('utf-8')
+                self.wfile.write(f'{len(payload):x}\r\n'.encode('ascii') + payload + b'\r\n')
+                self.wfile.flush()
+                sent += len(payload)
+
+            event('message_start', {'type': 'message_start',
+                                    'message': {'usage': {**usage, 'output_tokens': 1}}})
+            tokens = text.split(' ')
+            for start in range(0, len(tokens), config.llm_chunk_words):
+                chunk = ' '.join(tokens[start:start + config.llm_chunk_words])
+                event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                              'delta': {'type': 'text_delta', 'text': (' ' if start else '') + chunk}})
+                time.sleep(config.llm_chunk_delay_ms / 1000)
+            event('message_delta', {'type': 'message_delta', 'usage': {'output_tokens': words}})
+            event('message_stop', {'type': 'message_stop'})
+            self.wfile.write(b'0\r\n\r\n')
+            server.count('messages_stream', sent)
+
+    return Handler
+
+def parse_config(argv: Optional[list] = None) -> StandInConfig:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = StandInConfig()
+    for name, value in asdict(defaults).items():
+        flag = '--' + name.replace('_', '-')
+        if isinstance(value, bool):
+            parser.add_argument(flag, action='store_true')
+        else:
+            parser.add_argument(flag, type=type(value), default=value)
+    return StandInConfig(**vars(parser.parse_args(argv)))
+
+def main() -> None:
+    server = StandInServer(parse_config())
+    print(json.dumps({'port': server.httpd.server_address[1]}), flush=True)
+    server.httpd.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Synthetic Substack-style pages and feeds for offline benchmarks."""
+import json
+import random
+from email.utils import formatdate
+from html import escape
+
+WORDS = (
+    "model consciousness alignment human agent language reasoning emergent "
+    "scaling benchmark wonder uncertainty memory attention story research "
+    "relationship machine experience feedback dataset inference creative"
+).split()
+
+def _sentence(rng: random.Random, words: int = 18) -> str:
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + '.'
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return ' '.join(_sentence(rng) for _ in range(sentences))
+
+def post_body_html(paragraphs: int = 40, seed: int = 0) -> str:
+    """Article body markup: paragraphs with headings, quotes and inline markup"""
+    rng = random.Random(seed)
+    parts = []
+    for i in range(paragraphs):
+        if i and i % 8 == 0:
+            parts.append(f"<h2>{escape(_sentence(rng, 5))}</h2>")
+        if i and i % 11 == 0:
+            parts.append(f"<blockquote><p>{escape(_paragraph(rng, 2))}</p></blockquote>")
+        words = _paragraph(rng).split(' ')
+        words[3] = f"<em>{words[3]}</em>"
+        words[7] = f'<a href="https://example.com/{i}">{words[7]}</a>'
+        parts.append(f"<p>{' '.join(words)}</p>")
+    return '\n'.join(parts)
+
+def substack_post_html(title: str = "Synthetic post", paragraphs: int = 40,
+                       preload_bytes: int = 300_000, seed: int = 0) -> bytes:
+    """
+    A page shaped like a Substack post: large inline CSS and a big
+    window._preloads JSON blob in <head>, nav chrome, the article inside
+    div.available-content, then comments and footer.
+    """
+    rng = random.Random(seed)
+    body = post_body_html(40, seed)
+    body_html = (body * (preload_bytes // len(body) + 1))[:preload_bytes]
+    preload = json.dumps({'post': {'id': seed, 'body_html': body_html,
+                                   'tags': [rng.choice(WORDS) for _ in range(20)]}})
+    css = '\n'.join(f".c{i}{{margin:{i}px;color:#{i % 999:03d}}}" for i in range(2000))
+    nav = ''.join(f'<li><a href="/p/{i}">{escape(_sentence(rng, 4))}</a></li>' for i in range(30))
+    comments = ''.join(
+        f'<div class="comment"><p>{escape(_paragraph(rng, 2))}</p></div>' for _ in range(40)
+    )
+    page = f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{escape(title)}</title>
+<style>{css}</style>
+<script>window._preloads = JSON.parse({json.dumps(preload)})</script>
+</head><body><div class="main-menu"><ul>{nav}</ul></div>
+<article class="typography newsletter-post post">
+<div class="post-header"><h1 class="post-title">{escape(title)}</h1>
+<h3 class="subtitle">{escape(_sentence(rng, 10))}</h3></div>
+<div class="available-content"><div class="body markup" dir="auto">
+{post_body_html(paragraphs, seed)}
+</div></div></article>
+<div class="comments-page">{comments}</div>
+<footer><p>© Synthetic Substack</p></footer>
+</body></html>"""
+    return page.encode('utf-8')
+
+def rss_feed_xml(base_url: str, posts: int = 10, full_content: bool = False,
+                 paragraphs: int = 40, seed: int = 0) -> bytes:
+    """
+    An RSS 2.0 feed like Substack's /feed, optionally with content:encoded
+    bodies. Post i's body uses seed + i, so feeds built with different seeds
+    do not share posts.
+    """
+    items = []
+    for i in range(posts):
+        content = ''
+        if full_content:
+            content = f"<content:encoded><![CDATA[{post_body_html(paragraphs, seed=seed + i)}]]></content:encoded>"
+        items.append(f"""<item><title>Post {i}</title><link>{base_url}/p/post-{i}</link>
+<guid isPermaLink="false">{base_url}/p/post-{i}</guid>
+<pubDate>{formatdate(1_700_000_000 - i * 86400, usegmt=True)}</pubDate>
+<description>Summary of post {i}</description>{content}</item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">
+<channel><title>Synthetic Newsletter</title><link>{base_url}</link>
+<description>Synthetic feed</description>{''.join(items)}</channel></rss>""".encode('utf-8')
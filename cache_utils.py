@@ -0,0 +1,240 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Persistent cache location: the RunPod network volume when one is attached,
+# so caches survive worker restarts and are shared between workers
+if os.path.isdir('/runpod-volume'):
+    DEFAULT_CACHE_DIR = '/runpod-volume/research-cache'
+else:
+    DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'research-cache')
+CACHE_DIR = os.environ.get('RESEARCH_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+# Cache policies accepted from job input
+CACHE_POLICIES = ('use', 'refresh', 'bypass')
+
+# Feed cache limits
+FEED_CACHE_MAX_ENTRIES = 64
+FEED_FRESH_SECONDS = 300  # Serve cached feeds without revalidating for this long
+
+@dataclass
+class CachedFeed:
+    feed: Any
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def is_fresh(self, max_age: float = FEED_FRESH_SECONDS) -> bool:
+        return time.time() - self.fetched_at < max_age
+
+class FeedCache:
+    """
+    In-process LRU of parsed feeds plus their validators (ETag/Last-Modified).
+    Lives for the life of the worker so warm workers can send conditional
+    requests and reuse the parse on a 304.
+    """
+
+    def __init__(self, max_entries: int = FEED_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedFeed]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[CachedFeed]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url: str, feed: Any, etag: Optional[str] = None, last_modified: Optional[str] = None) -> CachedFeed:
+        entry = CachedFeed(feed=feed, etag=etag, last_modified=last_modified, fetched_at=time.time())
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def touch(self, url: str) -> None:
+        """Mark a cached feed as just revalidated (e.g. after a 304)"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                entry.fetched_at = time.time()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+@dataclass
+class _Flight:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function and callers arriving while it is in flight wait for its result
+    (or exception) instead of repeating the work. Shared by every job on the
+    worker, so concurrent jobs asking for the same URL fetch it once.
+
+    Exceptions of the unshared types say something about the leading call
+    (e.g. its job's deadline) rather than about the work, so waiters seeing
+    one run the call again themselves instead of re-raising it.
+    """
+
+    def __init__(self, unshared: Tuple[type, ...] = ()):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._unshared = unshared
+
+    def do(self, key: Hashable, fn: Callable, *args: Any, **kwargs: Any) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another call produced it"""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+
+            if leader:
+                break
+            flight.done.wait()
+            if isinstance(flight.error, self._unshared):
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+class PersistentCache:
+    """
+    SQLite-backed key/value store with TTL expiry and size-bounded LRU eviction.
+    The database is opened lazily; if it cannot be opened the cache degrades to
+    a no-op so jobs still run.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+                # The database sits on a volume shared by workers on other
+                # hosts; WAL relies on shared memory that network filesystems
+                # do not provide, so use (and switch older files back to) the
+                # rollback journal
+                conn.execute('PRAGMA journal_mode=DELETE')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS cache ('
+                    'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                    'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)')
+                conn.execute('CREATE INDEX IF NOT EXISTS cache_created ON cache (created_at)')
+                # Running total of entry sizes, kept by triggers in the same
+                # transaction as each write so every worker sees it exact
+                conn.execute('CREATE TABLE IF NOT EXISTS cache_size (total INTEGER NOT NULL)')
+                conn.execute(
+                    'INSERT INTO cache_size (total) SELECT COALESCE(SUM(size), 0) FROM cache '
+                    'WHERE NOT EXISTS (SELECT 1 FROM cache_size)'
+                )
+                for name, event, change in (('insert', 'INSERT', 'new.size'), ('delete', 'DELETE', '-old.size'),
+                                            ('update', 'UPDATE OF size', 'new.size - old.size')):
+                    conn.execute(
+                        f'CREATE TRIGGER IF NOT EXISTS cache_size_{name} AFTER {event} ON cache '
+                        f'BEGIN UPDATE cache_size SET total = total + {change}; END'
+                    )
+                conn.commit()
+                self._conn = conn
+            except Exception as e:
+                print(f"⚠️ Cache disabled, cannot open {self.path}: {str(e)}")
+                self._disabled = True
+        return self._conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            now = time.time()
+            try:
+                row = conn.execute(
+                    'SELECT value FROM cache WHERE key = ? AND created_at > ?',
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+                conn.commit()
+                return bytes(row[0])
+            except sqlite3.Error as e:
+                print(f"Cache read error for {self.path}: {str(e)}")
+                return None
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            now = time.time()
+            try:
+                conn.execute(
+                    'INSERT INTO cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                    'created_at = excluded.created_at, accessed_at = excluded.accessed_at',
+                    (key, value, len(value), now, now),
+                )
+                self._evict(conn, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Cache write error for {self.path}: {str(e)}")
+                conn.rollback()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute('DELETE FROM cache WHERE created_at <= ?', (now - self.ttl_seconds,))
+        total = conn.execute('SELECT total FROM cache_size').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until back under the size budget
+        for key, size in conn.execute('SELECT key, size FROM cache ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                conn.execute('DELETE FROM cache')
+                conn.commit()
@@ -0,0 +1,413 @@
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Generator, Iterator, List, Optional, Tuple, Union
+
+from cache_utils import PersistentCache, CACHE_DIR
+from http_utils import get_session, mount_caller_retries, retry_count, RETRY_STATUS_CODES
+from text_utils import estimate_tokens
+from job_context import Span, WorkSkipped, incr, option, span, request_timeout, time_left, MIN_REQUEST_SECONDS
+
+ANTHROPIC_API_URL = os.environ.get('ANTHROPIC_API_URL', 'https://api.anthropic.com')
+ANTHROPIC_VERSION = '2023-06-01'
+CLAUDE_MODEL = os.environ.get('CLAUDE_MODEL', 'claude-3-sonnet-20240229')
+CLAUDE_TIMEOUT_SECONDS = 60
+
+# Rate-limit/overload retries (429, 529, 5xx): jittered exponential backoff,
+# at least the server's Retry-After, and never sleeping past the job deadline
+CLAUDE_MAX_ATTEMPTS = 4
+CLAUDE_BACKOFF_SECONDS = 1.0
+CLAUDE_MAX_BACKOFF_SECONDS = 20.0
+
+# Prompt caching: 'off' sends no cache_control markers and 'corpus' marks
+# the system prompt plus the post corpus block, so the analysis -> outreach
+# chain reads the instructions and posts from the prompt cache. 'corpus' is
+# the default only when CLAUDE_MODEL supports caching (Claude 3 Haiku,
+# Claude 3 Opus, Claude 3.5 Sonnet and later): it puts the corpus in the
+# outreach prompt, which costs input tokens unless it is read from the cache.
+# The API only caches prefixes of at least 1024 tokens (2048 on Haiku), so a
+# marker ending a shorter prefix is not sent.
+PROMPT_CACHE_MODES = ('off', 'corpus')
+NO_PROMPT_CACHE_MODELS = ('claude-3-sonnet-', 'claude-2', 'claude-instant-')
+PROMPT_CACHE_MIN_TOKENS = 1024
+HAIKU_PROMPT_CACHE_MIN_TOKENS = 2048
+EPHEMERAL = {'type': 'ephemeral'}
+
+def supports_prompt_cache(model: str) -> bool:
+    """Whether the API honours cache_control markers for this model"""
+    return not model.startswith(NO_PROMPT_CACHE_MODELS)
+
+DEFAULT_PROMPT_CACHE = 'corpus' if supports_prompt_cache(CLAUDE_MODEL) else 'off'
+CACHE_USAGE_FIELDS = ('cache_creation_input_tokens', 'cache_read_input_tokens')
+
+# Message Batches API: polling starts at BATCH_POLL_SECONDS and backs off to
+# BATCH_MAX_POLL_SECONDS; batches the API has not finished by then expire
+BATCH_POLL_SECONDS = 5.0
+BATCH_MAX_POLL_SECONDS = 60.0
+BATCH_POLL_BACKOFF = 1.5
+
+# Response cache limits
+RESPONSE_CACHE_TTL_SECONDS = 24 * 3600
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_response_cache = PersistentCache(
+    os.path.join(CACHE_DIR, 'responses.sqlite3'),
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+)
+
+class ClaudeAPIError(Exception):
+    """Non-200 response from the Messages API"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"{status_code} - {body}")
+        self.status_code = status_code
+        self.body = body
+
+def content_hash(*parts: Any) -> str:
+    """Stable SHA-256 over JSON-serialisable parts"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+Prompt = Union[str, List[Dict[str, Any]]]
+
+def text_block(text: str, cached: bool = False) -> Dict[str, Any]:
+    """A text content block, marked as a prompt cache breakpoint when cached"""
+    block = {'type': 'text', 'text': text}
+    if cached:
+        block['cache_control'] = EPHEMERAL
+    return block
+
+def prompt_text(prompt: Prompt) -> Union[str, List[str]]:
+    """The text of a prompt without cache_control markers"""
+    if isinstance(prompt, str):
+        return prompt
+    return [block['text'] for block in prompt]
+
+def request_key(model: str, max_tokens: int, prompt: Prompt, system: Optional[str] = None) -> str:
+    # Cache markers do not change the reply, so they stay out of the key
+    return content_hash('messages', model, max_tokens, prompt_text(prompt), system)
+
+def _headers(api_key: str) -> Dict[str, str]:
+    return {
+        'Content-Type': 'application/json',
+        'x-api-key': api_key,
+        'anthropic-version': ANTHROPIC_VERSION,
+    }
+
+def _cached_entry(key: str, policy: str) -> Optional[Dict[str, Any]]:
+    if policy != 'use':
+        return None
+    cached = _response_cache.get(key)
+    if cached is None:
+        return None
+    entry = json.loads(cached)
+    usage = entry.get('usage', {})
+    incr('llm_cache', 'hits')
+    incr('llm_cache', 'tokens_saved', usage.get('input_tokens', 0) + usage.get('output_tokens', 0))
+    incr('llm_cache', 'latency_saved_seconds', entry.get('latency_seconds', 0.0))
+    return {**entry, 'cache': 'hit'}
+
+def _store_entry(key: str, policy: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    if policy == 'bypass':
+        return {**entry, 'cache': 'bypass'}
+    incr('llm_cache', 'misses')
+    _response_cache.put(key, json.dumps(entry).encode('utf-8'))
+    return {**entry, 'cache': 'miss'}
+
+def _cache_breakpoints(model: str, prompt: Prompt, system: Optional[str]) -> Tuple[Prompt, bool]:
+    """
+    The prompt and whether to mark the system prompt, keeping only the cache
+    markers the API can act on: none when the job's 'prompt_cache' is 'off',
+    and none ending a prefix shorter than the model's caching minimum.
+    """
+    enabled = option('prompt_cache', DEFAULT_PROMPT_CACHE) != 'off'
+    minimum = HAIKU_PROMPT_CACHE_MIN_TOKENS if 'haiku' in model else PROMPT_CACHE_MIN_TOKENS
+    prefix = estimate_tokens(system or '')
+    mark_system = enabled and prefix >= minimum
+    if isinstance(prompt, str):
+        return prompt, mark_system
+
+    blocks = []
+    for block in prompt:
+        prefix += estimate_tokens(block['text'])
+        blocks.append(text_block(block['text'], cached=enabled and 'cache_control' in block and prefix >= minimum))
+    return blocks, mark_system
+
+def _payload(model: str, max_tokens: int, prompt: Prompt, system: Optional[str] = None) -> Dict[str, Any]:
+    prompt, mark_system = _cache_breakpoints(model, prompt, system)
+    payload = {
+        'model': model,
+        'max_tokens': max_tokens,
+        'messages': [
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ]
+    }
+    if system:
+        payload['system'] = [text_block(system, cached=mark_system)]
+    return payload
+
+def _backoff_seconds(attempt: int, response) -> float:
+    delay = random.uniform(0, min(CLAUDE_MAX_BACKOFF_SECONDS, CLAUDE_BACKOFF_SECONDS * 2 ** attempt))
+    retry_after = response.headers.get('retry-after')
+    if isinstance(retry_after, str) and retry_after.strip().isdigit():
+        delay = max(delay, min(float(retry_after), CLAUDE_MAX_BACKOFF_SECONDS))
+    return delay
+
+def _post_message(api_key: str, payload: Dict[str, Any], call: Span, stream: bool = False,
+                  path: str = '/v1/messages'):
+    """
+    POST a Messages API request, retrying retryable statuses with backoff
+    while attempts and the job's time allow. Returns the last response.
+    Raises WorkSkipped when the deadline leaves no time for a request.
+    """
+    mount_caller_retries(ANTHROPIC_API_URL)
+    attempt = 0
+    while True:
+        response = get_session().post(
+            f"{ANTHROPIC_API_URL}{path}",
+            headers=_headers(api_key),
+            json=payload,
+            timeout=request_timeout(CLAUDE_TIMEOUT_SECONDS),
+            stream=stream
+        )
+        call.add('retries', retry_count(response))
+        attempt += 1
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= CLAUDE_MAX_ATTEMPTS:
+            return response
+
+        delay = _backoff_seconds(attempt - 1, response)
+        left = time_left()
+        if left is not None and delay + MIN_REQUEST_SECONDS > left:
+            return response
+        response.close()
+        call.add('retries', 1)
+        call.add('backoff_ms', delay * 1000)
+        time.sleep(delay)
+
+def _observe(call: Span, message: Dict[str, Any]) -> Dict[str, Any]:
+    call.tag('cache', message['cache'])
+    if message['cache'] != 'hit':
+        call.add('output_tokens', message['usage'].get('output_tokens', 0))
+        for name in ('input_tokens', *CACHE_USAGE_FIELDS):
+            call.add(name, message['usage'].get(name, 0))
+            incr('prompt_cache', name, message['usage'].get(name, 0))
+    return message
+
+def create_message(api_key: str, prompt: Prompt, max_tokens: int, model: str = CLAUDE_MODEL,
+                   cache_key: Optional[str] = None, system: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Send a single-turn Messages API request through the shared session.
+
+    prompt is the user turn, as text or content blocks (see text_block). The
+    system prompt is sent as a prompt cache breakpoint unless the job's
+    'prompt_cache' is 'off' or it is too short to cache; the usage then
+    includes the API's cache_creation_input_tokens and cache_read_input_tokens.
+
+    Responses are cached by cache_key (default: a hash of model, max_tokens and
+    prompt) according to the job's 'cache_policy': 'use' reads and writes the
+    cache, 'refresh' only writes, 'bypass' skips it. Returns a dict with
+    'text', 'usage', 'cache' ('hit', 'miss' or 'bypass') and 'latency_seconds'.
+    Retryable statuses (429, 529, 5xx) are retried with jittered backoff
+    within the job's deadline. Raises ClaudeAPIError for non-200 responses
+    and WorkSkipped when the deadline leaves no time for the call.
+    """
+    policy = option('cache_policy', 'use')
+    key = cache_key or request_key(model, max_tokens, prompt, system)
+
+    with span('claude', model=model, stream=False) as call:
+        cached = _cached_entry(key, policy)
+        if cached is not None:
+            return _observe(call, cached)
+
+        started = time.monotonic()
+        response = _post_message(api_key, _payload(model, max_tokens, prompt, system), call)
+        latency = time.monotonic() - started
+
+        if response.status_code != 200:
+            raise ClaudeAPIError(response.status_code, response.text)
+
+        result = response.json()
+        entry = {
+            'text': result['content'][0]['text'],
+            'usage': result.get('usage', {}),
+            'latency_seconds': latency,
+        }
+        return _observe(call, _store_entry(key, policy, entry))
+
+def iter_sse_events(lines: Iterator[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Parse server-sent event lines into (event, data) pairs with JSON data"""
+    event = None
+    data = []
+    for line in lines:
+        if not line:
+            if data:
+                yield event or 'message', json.loads('\n'.join(data))
+            event = None
+            data = []
+        elif line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data.append(line[len('data:'):].strip())
+    if data:
+        yield event or 'message', json.loads('\n'.join(data))
+
+def stream_message(api_key: str, prompt: Prompt, max_tokens: int, model: str = CLAUDE_MODEL,
+                   cache_key: Optional[str] = None, system: Optional[str] = None) -> Generator[str, None, Dict[str, Any]]:
+    """
+    Streaming counterpart of create_message using Messages API SSE.
+
+    Yields text deltas as they arrive and returns the same dict create_message
+    would, sharing its cache entries: a cache hit yields the whole text at once.
+    Raises ClaudeAPIError for non-200 responses and in-stream error events.
+    """
+    policy = option('cache_policy', 'use')
+    key = cache_key or request_key(model, max_tokens, prompt, system)
+
+    with span('claude', model=model, stream=True) as call:
+        cached = _cached_entry(key, policy)
+        if cached is not None:
+            yield cached['text']
+            return _observe(call, cached)
+
+        started = time.monotonic()
+        text = []
+        usage = {}
+        payload = {**_payload(model, max_tokens, prompt, system), 'stream': True}
+        with _post_message(api_key, payload, call, stream=True) as response:
+            if response.status_code != 200:
+                raise ClaudeAPIError(response.status_code, response.text)
+
+            for event, data in iter_sse_events(response.iter_lines(decode_unicode=True)):
+                if event == 'message_start':
+                    usage.update(data.get('message', {}).get('usage', {}))
+                elif event == 'content_block_delta' and data.get('delta', {}).get('type') == 'text_delta':
+                    if not text:
+                        call.add('first_token_ms', (time.monotonic() - started) * 1000)
+                    text.append(data['delta']['text'])
+                    yield data['delta']['text']
+                elif event == 'message_delta':
+                    usage.update(data.get('usage', {}))
+                elif event == 'error':
+                    raise ClaudeAPIError(response.status_code, json.dumps(data.get('error', data)))
+
+        entry = {
+            'text': ''.join(text),
+            'usage': usage,
+            'latency_seconds': time.monotonic() - started,
+        }
+        return _observe(call, _store_entry(key, policy, entry))
+
+def _batch_post(api_key: str, path: str, call: Span, payload: Optional[Dict[str, Any]] = None):
+    response = _post_message(api_key, payload or {}, call, path=path)
+    if response.status_code != 200:
+        raise ClaudeAPIError(response.status_code, response.text)
+    return response
+
+def _batch_get(api_key: str, url: str, call: Span, stream: bool = False):
+    mount_caller_retries(ANTHROPIC_API_URL)
+    response = get_session().get(url, headers=_headers(api_key), timeout=request_timeout(CLAUDE_TIMEOUT_SECONDS),
+                                 stream=stream)
+    call.add('retries', retry_count(response))
+    if response.status_code != 200:
+        raise ClaudeAPIError(response.status_code, response.text)
+    return response
+
+def _batch_progress(batch: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'batch_id': batch['id'],
+        'status': batch['processing_status'],
+        'request_counts': batch.get('request_counts', {}),
+    }
+
+def batch_messages(api_key: str, requests: List[Dict[str, Any]],
+                   model: str = CLAUDE_MODEL) -> Generator[Dict[str, Any], None, Dict[str, Dict[str, Any]]]:
+    """
+    Send many single-turn requests through the Message Batches API, at half
+    the price of create_message and without holding a connection per call.
+
+    Each request has a 'custom_id', 'prompt', 'max_tokens' and optionally
+    'system' and 'cache_key', as for create_message. Requests the response
+    cache answers are not submitted; the rest go out as one batch, polled
+    with growing intervals (BATCH_POLL_SECONDS up to BATCH_MAX_POLL_SECONDS)
+    until it ends. Yields a progress dict after every poll and returns
+    {custom_id: message}, where message is what create_message returns or
+    {'error': ...} for a request that errored, expired or was canceled.
+    Raises ClaudeAPIError for failed batch calls and WorkSkipped (after
+    canceling the batch) when the job's deadline passes first.
+    """
+    policy = option('cache_policy', 'use')
+    results: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[str, str] = {}
+
+    with span('claude_batch', model=model) as call:
+        submitted = []
+        for request in requests:
+            key = request.get('cache_key') or request_key(
+                model, request['max_tokens'], request['prompt'], request.get('system'))
+            cached = _cached_entry(key, policy)
+            if cached is not None:
+                results[request['custom_id']] = _observe(call, cached)
+                continue
+            pending[request['custom_id']] = key
+            params = _payload(model, request['max_tokens'], request['prompt'], request.get('system'))
+            submitted.append({'custom_id': request['custom_id'], 'params': params})
+        call.add('requests', len(submitted))
+        incr('batch', 'cached', len(requests) - len(submitted))
+        if not submitted:
+            return results
+
+        started = time.monotonic()
+        batch = _batch_post(api_key, '/v1/messages/batches', call, {'requests': submitted}).json()
+        incr('batch', 'batches')
+        incr('batch', 'requests', len(submitted))
+        batch_path = f"/v1/messages/batches/{batch['id']}"
+
+        delay = BATCH_POLL_SECONDS
+        while batch['processing_status'] != 'ended':
+            yield _batch_progress(batch)
+            # Stop while there is still time to cancel: the results would come too late
+            left = time_left()
+            if left is not None and delay + 2 * MIN_REQUEST_SECONDS > left:
+                _batch_post(api_key, f"{batch_path}/cancel", call)
+                raise WorkSkipped('deadline')
+            time.sleep(delay)
+            delay = min(delay * BATCH_POLL_BACKOFF, BATCH_MAX_POLL_SECONDS)
+            call.add('polls', 1)
+            try:
+                batch = _batch_get(api_key, f"{ANTHROPIC_API_URL}{batch_path}", call).json()
+            except ClaudeAPIError as e:
+                # A failed poll leaves the batch running; try again next interval
+                if e.status_code not in RETRY_STATUS_CODES:
+                    raise
+        yield _batch_progress(batch)
+        latency = time.monotonic() - started
+        incr('batch', 'wait_seconds', latency)
+
+        with _batch_get(api_key, batch['results_url'], call, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                item = json.loads(line)
+                custom_id = item['custom_id']
+                outcome = item['result']
+                incr('batch', outcome['type'])
+                if outcome['type'] != 'succeeded':
+                    # errored results wrap the API error: {'type': 'error', 'error': {'type', 'message'}}
+                    detail = outcome.get('error', {}).get('error', {}).get('message')
+                    results[custom_id] = {'error': f"Batch request {outcome['type']}" + (f": {detail}" if detail else '')}
+                    continue
+                entry = {
+                    'text': outcome['message']['content'][0]['text'],
+                    'usage': outcome['message'].get('usage', {}),
+                    'latency_seconds': latency,
+                }
+                results[custom_id] = _observe(call, _store_entry(pending[custom_id], policy, entry))
+
+        for custom_id in pending:
+            results.setdefault(custom_id, {'error': 'Batch request missing from results'})
+        return results
@@ -0,0 +1,94 @@
+import hashlib
+import heapq
+import re
+from typing import Iterable, List
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Words per shingle and MinHash signature size (bottom-k, one hash function)
+SHINGLE_WORDS = 5
+MINHASH_SIZE = 128
+
+# Query parameters that only track where a link was shared from
+TRACKING_PARAMS = {'r', 's', 'ref', 'source', 'triedredirect', 'publication_id', 'post_id', 'isfreemail'}
+
+WORD_RE = re.compile(r'\w+')
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize a post URL so copies of the same link compare equal: scheme and
+    'www.' are dropped, the host is lowercased, tracking parameters (utm_*,
+    Substack referral codes), fragments and trailing slashes are removed.
+    """
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    if parsed.port and parsed.port not in (80, 443):
+        host = f"{host}:{parsed.port}"
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not name.lower().startswith('utm_') and name.lower() not in TRACKING_PARAMS
+    )
+    path = parsed.path.rstrip('/') or '/'
+    return urlunparse(('', host, path, '', urlencode(query), '')).lstrip('/')
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def minhash_signature(text: str, size: int = MINHASH_SIZE) -> List[int]:
+    """Bottom-k MinHash of the text's lowercased word shingles (empty for empty text)"""
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return []
+    width = min(SHINGLE_WORDS, len(words))
+    shingles = {' '.join(words[i:i + width]) for i in range(len(words) - width + 1)}
+    return heapq.nsmallest(size, {_hash64(shingle) for shingle in shingles})
+
+def estimate_similarity(a: Iterable[int], b: Iterable[int], size: int = MINHASH_SIZE) -> float:
+    """Estimate the Jaccard similarity of two shingle sets from their signatures"""
+    a, b = frozenset(a), frozenset(b)
+    both = a & b
+    if not both:
+        return 0.0
+    union = heapq.nsmallest(size, a | b)
+    return sum(1 for value in union if value in both) / len(union)
+
+def duplicate_groups(urls: List[str], texts: List[str], threshold: float) -> List[List[int]]:
+    """
+    Group item indexes that share a canonical URL or whose texts have an
+    estimated similarity of at least threshold. Groups and their members are
+    in first-seen order; unique items form groups of one.
+    """
+    parent = list(range(len(urls)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def union(a: int, b: int) -> None:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    first_by_url = {}
+    for index, url in enumerate(urls):
+        key = canonical_url(url) if url else None
+        if key in first_by_url:
+            union(first_by_url[key], index)
+        elif key:
+            first_by_url[key] = index
+
+    # Pairwise over signatures is fine at job sizes (tens to a few hundred posts)
+    signatures = [frozenset(minhash_signature(text)) for text in texts]
+    for i in range(len(signatures)):
+        for j in range(i + 1, len(signatures)):
+            if find(i) != find(j) and estimate_similarity(signatures[i], signatures[j]) >= threshold:
+                union(i, j)
+
+    groups = {}
+    for index in range(len(urls)):
+        groups.setdefault(find(index), []).append(index)
+    return list(groups.values())
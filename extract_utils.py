@@ -0,0 +1,314 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from lxml import etree, html as lxml_html
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # Optional fast backend: pip install selectolax
+    LexborHTMLParser = None
+
+# Content containers in order of preference (Substack specific first)
+CONTAINER_PRIORITY = (
+    ('div', 'post-content'),
+    ('div', 'available-content'),
+    ('article', None),
+)
+TEXT_TAGS = ('p', 'h1', 'h2', 'h3', 'blockquote')
+DEFAULT_MAX_CHARS = 5000
+DEFAULT_EXTRACTOR = os.environ.get('RESEARCH_EXTRACTOR', 'streaming')
+
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+_RAW_TEXT_OPEN_RE = re.compile(rb'<(script|style)\b[^>]*>', re.IGNORECASE)
+_RAW_TEXT_CLOSE_RES = {
+    b'script': re.compile(rb'</script', re.IGNORECASE),
+    b'style': re.compile(rb'</style', re.IGNORECASE),
+}
+MAX_PENDING_TAG_BYTES = 1024
+
+def sniff_encoding(content_type: Optional[str], head: bytes) -> str:
+    """Pick a document encoding from the Content-Type header, then <meta>, else UTF-8"""
+    if content_type and 'charset=' in content_type.lower():
+        return content_type.lower().split('charset=')[-1].split(';')[0].strip(' "\'')
+    match = _CHARSET_RE.search(head[:4096])
+    if match:
+        return match.group(1).decode('ascii').lower()
+    return 'utf-8'
+
+def _container_rank(tag: str, classes: List[str]) -> Optional[int]:
+    for rank, (container_tag, container_class) in enumerate(CONTAINER_PRIORITY):
+        if tag == container_tag and (container_class is None or container_class in classes):
+            return rank
+    return None
+
+def extract_with_soup(html: bytes, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """Reference extractor: parse the whole document with BeautifulSoup + html.parser"""
+    from bs4 import BeautifulSoup  # imported here to keep it off the worker's start-up path
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Find the main content area (Substack specific)
+    content_div = soup.find('div', class_='post-content')
+    if not content_div:
+        content_div = soup.find('div', class_='available-content')
+    if not content_div:
+        # Fallback to finding paragraphs
+        content_div = soup.find('article')
+
+    if content_div:
+        # Extract text while preserving structure
+        paragraphs = content_div.find_all(list(TEXT_TAGS))
+        content = '\n\n'.join([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
+        return content[:max_chars]
+    return ""
+
+class RawTextFilter:
+    """
+    Drop the bodies of <script> and <style> elements from an HTML byte stream.
+
+    None of that text can end up in extracted content, and libxml2 stops
+    parsing the whole document when a script body contains markup such as
+    "</p>" (common in Substack's window._preloads), so it is removed before
+    the parser sees it. Tags split across chunks are buffered.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self._close_re = None
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._pending + chunk
+        self._pending = b""
+        out = []
+        pos = 0
+        while pos < len(data):
+            if self._close_re is None:
+                match = _RAW_TEXT_OPEN_RE.search(data, pos)
+                if match is None:
+                    # Hold back a trailing, unterminated tag that may be a split opener
+                    tag_start = data.rfind(b'<', pos)
+                    if tag_start != -1 and b'>' not in data[tag_start:] and len(data) - tag_start < MAX_PENDING_TAG_BYTES:
+                        out.append(data[pos:tag_start])
+                        self._pending = data[tag_start:]
+                    else:
+                        out.append(data[pos:])
+                    break
+                out.append(data[pos:match.end()])
+                self._close_re = _RAW_TEXT_CLOSE_RES[match.group(1).lower()]
+                pos = match.end()
+            else:
+                match = self._close_re.search(data, pos)
+                if match is None:
+                    # Keep enough bytes to spot a closing tag split across chunks
+                    self._pending = data[max(pos, len(data) - len(b'</script')):]
+                    break
+                self._close_re = None
+                pos = match.start()
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        pending = b"" if self._close_re is not None else self._pending
+        self._pending = b""
+        return pending
+
+class StreamingExtractor:
+    """
+    Incremental post-content extractor built on lxml's HTMLPullParser.
+
+    Feed it response chunks as they arrive. It locates the same container as
+    extract_with_soup (post-content, then available-content, then article),
+    collects paragraph-level text, and discards finished subtrees so memory
+    stays flat regardless of page size. feed() returns True once enough text
+    has been collected that the rest of the download can be skipped.
+    """
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_CHARS, content_type: Optional[str] = None):
+        self.max_chars = max_chars
+        self.content_type = content_type
+        self._parser = None
+        self._filter = RawTextFilter()
+        self._stack: List[etree._Element] = []
+        self._container = None
+        self._container_rank: Optional[int] = None
+        self._container_level = -1
+        self._container_open = False
+        self._text_depth = 0
+        self._parts: List[str] = []
+        self._chars = 0
+        self.done = False
+
+    def feed(self, chunk: bytes) -> bool:
+        if self._parser is None:
+            # lxml would otherwise assume Latin-1 for pages without a charset
+            encoding = sniff_encoding(self.content_type, chunk)
+            try:
+                self._parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+            except LookupError:
+                self._parser = etree.HTMLPullParser(events=('start', 'end'), encoding='utf-8')
+        if not self.done:
+            self._parser.feed(self._filter.feed(chunk))
+            self._process_events()
+        return self.done
+
+    def close(self) -> str:
+        """Finish parsing and return the extracted text"""
+        if self._parser is not None and not self.done:
+            try:
+                self._parser.feed(self._filter.flush())
+                self._parser.close()
+            except etree.XMLSyntaxError:
+                pass
+            self._process_events()
+        return '\n\n'.join(self._parts)[:self.max_chars]
+
+    def _process_events(self) -> None:
+        for event, element in self._parser.read_events():
+            if not isinstance(element.tag, str):
+                continue
+            if event == 'start':
+                self._start(element)
+            else:
+                self._end(element)
+            if self.done:
+                return
+
+    def _start(self, element) -> None:
+        self._stack.append(element)
+        rank = _container_rank(element.tag, element.get('class', '').split())
+        if rank is not None and (self._container_rank is None or rank < self._container_rank):
+            # A better container than the current one: start over inside it
+            self._container = element
+            self._container_rank = rank
+            self._container_level = len(self._stack) - 1
+            self._container_open = True
+            self._text_depth = 0
+            self._parts = []
+            self._chars = 0
+        elif self._container_open and element.tag in TEXT_TAGS:
+            self._text_depth += 1
+
+    def _end(self, element) -> None:
+        if self._stack:
+            self._stack.pop()
+        inside = self._container_open and len(self._stack) > self._container_level
+
+        if element is self._container:
+            self._container_open = False
+            # Nothing can outrank the best container, so stop once it closes
+            if self._container_rank == 0:
+                self.done = True
+        elif inside and element.tag in TEXT_TAGS:
+            self._text_depth = max(self._text_depth - 1, 0)
+            text = ''.join(element.itertext()).strip()
+            if text:
+                self._chars += len(text) + (2 if self._parts else 0)
+                self._parts.append(text)
+            if self._chars >= self.max_chars and self._container.tag == 'div':
+                self.done = True
+
+        # Drop finished subtrees unless an enclosing text block still needs them
+        if not (inside and self._text_depth > 0) and element is not self._container:
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+def extract_streaming(chunks, max_chars: int = DEFAULT_MAX_CHARS, content_type: Optional[str] = None) -> str:
+    """Run StreamingExtractor over an iterable of byte chunks"""
+    extractor = StreamingExtractor(max_chars=max_chars, content_type=content_type)
+    for chunk in chunks:
+        if extractor.feed(chunk):
+            break
+    return extractor.close()
+
+def _xpath_class(tag: str, css_class: Optional[str]) -> str:
+    if css_class is None:
+        return f"//{tag}"
+    return f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]"
+
+_LXML_CONTAINER_XPATHS = [etree.XPath(f"({_xpath_class(tag, css_class)})[1]") for tag, css_class in CONTAINER_PRIORITY]
+_LXML_TEXT_XPATH = etree.XPath('descendant::*[' + ' or '.join(f'self::{tag}' for tag in TEXT_TAGS) + ']')
+_SELECTOLAX_CONTAINERS = [f"{tag}.{css_class}" if css_class else tag for tag, css_class in CONTAINER_PRIORITY]
+_SELECTOLAX_TEXT = ', '.join(TEXT_TAGS)
+
+def _join_paragraphs(texts, max_chars: int) -> str:
+    return '\n\n'.join(text for text in (t.strip() for t in texts) if text)[:max_chars]
+
+def _strip_raw_text(html: bytes) -> bytes:
+    text_filter = RawTextFilter()
+    return text_filter.feed(html) + text_filter.flush()
+
+def extract_with_lxml(html: bytes, max_chars: int = DEFAULT_MAX_CHARS, content_type: Optional[str] = None) -> str:
+    """Parse the whole document with lxml and locate content with compiled XPath"""
+    html = _strip_raw_text(html)
+    if not html.strip():
+        return ""
+    parser = lxml_html.HTMLParser(encoding=sniff_encoding(content_type, html))
+    root = lxml_html.document_fromstring(html, parser=parser)
+    for container_xpath in _LXML_CONTAINER_XPATHS:
+        found = container_xpath(root)
+        if found:
+            return _join_paragraphs((''.join(el.itertext()) for el in _LXML_TEXT_XPATH(found[0])), max_chars)
+    return ""
+
+def extract_with_selectolax(html: bytes, max_chars: int = DEFAULT_MAX_CHARS, content_type: Optional[str] = None) -> str:
+    """Parse with selectolax's lexbor engine and locate content with CSS selectors"""
+    encoding = sniff_encoding(content_type, html)
+    tree = LexborHTMLParser(html.decode(encoding, errors='replace'))
+    for selector in _SELECTOLAX_CONTAINERS:
+        container = tree.css_first(selector)
+        if container is not None:
+            return _join_paragraphs((node.text(deep=True) for node in container.css(_SELECTOLAX_TEXT)), max_chars)
+    return ""
+
+class BufferedExtraction:
+    """feed()/close() adapter for extractors that need the whole document"""
+
+    def __init__(self, extract: Callable[..., str], max_chars: int, content_type: Optional[str]):
+        self._extract = extract
+        self.max_chars = max_chars
+        self.content_type = content_type
+        self._chunks: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> bool:
+        self._chunks.append(chunk)
+        return False
+
+    def close(self) -> str:
+        return self._extract(b"".join(self._chunks), self.max_chars, self.content_type)
+
+EXTRACTORS: Dict[str, Callable[[int, Optional[str]], object]] = {
+    'streaming': lambda max_chars, content_type: StreamingExtractor(max_chars, content_type),
+    'soup': lambda max_chars, content_type: BufferedExtraction(
+        lambda html, limit, _content_type: extract_with_soup(html, limit), max_chars, content_type),
+    'lxml': lambda max_chars, content_type: BufferedExtraction(extract_with_lxml, max_chars, content_type),
+}
+if LexborHTMLParser is not None:
+    EXTRACTORS['selectolax'] = lambda max_chars, content_type: BufferedExtraction(
+        extract_with_selectolax, max_chars, content_type)
+
+def available_extractors() -> List[str]:
+    return list(EXTRACTORS)
+
+def create_extractor(name: str = DEFAULT_EXTRACTOR, max_chars: int = DEFAULT_MAX_CHARS,
+                     content_type: Optional[str] = None):
+    """
+    Return a fresh extraction session for the named backend. Every session
+    has feed(chunk) -> bool (True when no more input is needed) and
+    close() -> str.
+    """
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor '{name}'. Available: {', '.join(available_extractors())}")
+    return EXTRACTORS[name](max_chars, content_type)
+
+def extract_fragment(fragment: str, name: str = DEFAULT_EXTRACTOR, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """
+    Extract paragraph text from a body fragment that has no page container,
+    such as a feed's content:encoded, in the same format as page scraping.
+    """
+    page = f"<html><head><meta charset=\"utf-8\"></head><body><article>{fragment}</article></body></html>"
+    extractor = create_extractor(name, max_chars, 'text/html; charset=utf-8')
+    extractor.feed(page.encode('utf-8'))
+    return extractor.close()
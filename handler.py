@@ -1,20 +1,102 @@
-import runpod
-import requests
+import asyncio
+import contextvars
 import json
 import os
+import sys
+import threading
 import time
 import re
 from datetime import datetime
-from typing import Dict, List, Any
-import feedparser
-from bs4 import BeautifulSoup
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Generator
 import socket
 import ipaddress
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 
+from security_utils import is_safe_url, dns_cache
+from http_utils import (
+    HostRateLimiter,
+    JobRateLimiter,
+    DEFAULT_HOST_INTERVAL_SECONDS,
+    MAX_HOST_INTERVAL_SECONDS,
+    get_session,
+    job_connection_stats,
+    read_limited,
+    retry_count,
+    guarded_get,
+    host_breaker,
+)
+from extract_utils import create_extractor, extract_fragment, available_extractors, DEFAULT_EXTRACTOR
+import claude_utils
+from claude_utils import (
+    create_message, stream_message, batch_messages, content_hash, text_block, ClaudeAPIError, Prompt,
+    CLAUDE_MODEL, DEFAULT_PROMPT_CACHE, PROMPT_CACHE_MODES,
+)
+from cache_utils import FeedCache, PersistentCache, SingleFlight, CACHE_DIR, CACHE_POLICIES
+from job_context import (
+    JobStats, JobMetrics, Span, WorkSkipped, job_scope, fetch_slot, submit, record, incr, option,
+    span, record_span, metrics_enabled, current_stats,
+)
+from text_utils import estimate_tokens, truncate_to_tokens, allocate_budget
+from dedup_utils import duplicate_groups
+from ranking_utils import bm25_scores, query_terms, DEFAULT_TOPIC_QUERY
+from output_utils import project, sources_table, encode_result, json_size, available_encodings
+
 # Configuration
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY')
 
+# Claude request sizes
+ANALYSIS_MAX_TOKENS = 3000
+OUTREACH_MAX_TOKENS = 2500
+MAP_MAX_TOKENS = 800
+
+# Analysis modes: one prompt over every post, or concurrent per-shard
+# summaries reduced into the final report
+ANALYSIS_MODES = ('single', 'map_reduce')
+ANALYSIS_SHARDS = ('newsletter', 'post')
+DEFAULT_ANALYSIS_PARALLELISM = 4
+MAX_ANALYSIS_PARALLELISM = 8
+
+# Jobs a worker runs at once; the work is I/O-bound so one worker can
+# overlap many jobs on a thread pool
+DEFAULT_WORKER_JOB_CONCURRENCY = 8
+MAX_WORKER_JOB_CONCURRENCY = 32
+WORKER_JOB_CONCURRENCY = max(1, min(
+    int(os.environ.get('RESEARCH_JOB_CONCURRENCY', DEFAULT_WORKER_JOB_CONCURRENCY)),
+    MAX_WORKER_JOB_CONCURRENCY,
+))
+
+# Structured JSON span logs for every job, unless the job input says otherwise
+METRICS_LOG_DEFAULT = os.environ.get('RESEARCH_METRICS_LOG', '').lower() in ('1', 'true', 'yes')
+
+# Optional per-job time budget. Collection stops starting new fetches early
+# enough to leave the LLM stages up to LLM_RESERVE_SECONDS (at most half the
+# budget); feeds then fall back to stale copies and posts to their feed text
+MIN_DEADLINE_SECONDS = 5
+MAX_DEADLINE_SECONDS = 3600
+LLM_RESERVE_SECONDS = 30
+
+# Warm-up at module load (off unless RESEARCH_WARMUP is set): runs on a
+# background thread so it overlaps the runpod import. RESEARCH_WARMUP_HOSTS
+# (comma-separated) overrides the hosts resolved ahead of the first job.
+WARMUP_ENABLED = os.environ.get('RESEARCH_WARMUP', '').lower() in ('1', 'true', 'yes')
+WARMUP_HOSTS = os.environ.get('RESEARCH_WARMUP_HOSTS')
+
+# Near-duplicate posts: estimated shingle similarity at which copies are merged
+DEDUP_THRESHOLD = 0.8
+
+# Streaming worker (stream_handler) and the size/interval of streamed text chunks
+STREAMING_ENABLED = os.environ.get('RESEARCH_STREAMING', '').lower() in ('1', 'true', 'yes')
+STREAM_CHUNK_CHARS = 200
+STREAM_CHUNK_SECONDS = 0.5
+# Post fields sent in 'posts' stream events; the content is in the final result
+STREAM_POST_FIELDS = ('title', 'url', 'published', 'author', 'content_source')
+
+# Estimated tokens of post content (or summaries) packed into each prompt
+PROMPT_TOKEN_BUDGET = 25000
+MIN_PROMPT_TOKEN_BUDGET = 1000
+MAX_PROMPT_TOKEN_BUDGET = 150000
+
 # Security limits
 MAX_NEWSLETTERS = 10
 MAX_POSTS_PER_NEWSLETTER = 5
@@ -40,6 +122,69 @@ MAX_POSTS_PER_NEWSLETTER = 5
 MAX_SCRAPED_CONTENT_LENGTH = 5000  # Characters for final content
 MAX_RESPONSE_SIZE_BYTES = 1024 * 1024 * 2  # 2MB limit for raw download
 
+# Concurrency limits (global cap on in-flight network fetches per job)
+DEFAULT_MAX_CONCURRENCY = 8
+MAX_CONCURRENCY = 32
+
+# Per-host minimum spacing between requests (seconds); jobs may raise it, not lower it
+HOST_RATE_LIMITS: Dict[str, float] = {}
+
+# Shared by every job on the worker, so concurrent jobs do not multiply the
+# request rate a host sees
+worker_rate_limiter = HostRateLimiter(default_interval=0.0, host_intervals=HOST_RATE_LIMITS)
+
+# Feed-first extraction: use content:encoded when it has at least this much text
+FEED_CONTENT_MIN_CHARS = 2000
+CONTENT_MODES = ('feed_first', 'scrape')
+
+# Post content store limits
+POST_CACHE_TTL_SECONDS = 7 * 24 * 3600
+POST_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Incremental runs: per-newsletter cursors of seen entries and the rolling
+# report they feed, kept per state key
+STATE_TTL_SECONDS = 90 * 24 * 3600
+STATE_MAX_BYTES = 64 * 1024 * 1024
+CURSOR_MAX_ENTRIES = 200
+MAX_STATE_KEY_LENGTH = 200
+
+# Batch jobs ('groups' input): many newsletter groups collected together,
+# with every group's prompts sent through the Message Batches API
+MAX_BATCH_GROUPS = 50
+MAX_BATCH_NEWSLETTERS = 100
+MAX_GROUP_NAME_LENGTH = 100
+
+# Threads running jobs for the async handlers
+_job_executor = ThreadPoolExecutor(max_workers=WORKER_JOB_CONCURRENCY, thread_name_prefix='job')
+
+# Parsed feeds and their validators, kept across jobs on a warm worker
+_feed_cache = FeedCache()
+
+# In-flight feed and post fetches, shared by concurrent jobs on this worker.
+# A fetch skipped for the leading job's deadline, fetch slots or circuit
+# breaker is not shared: the waiting jobs fetch under their own limits.
+_feeds_in_flight = SingleFlight(unshared=(WorkSkipped,))
+_posts_in_flight = SingleFlight(unshared=(WorkSkipped,))
+
+# Extracted post content, persisted across workers on the cache volume
+_post_store = PersistentCache(
+    os.path.join(CACHE_DIR, 'posts.sqlite3'),
+    ttl_seconds=POST_CACHE_TTL_SECONDS,
+    max_bytes=POST_CACHE_MAX_BYTES,
+)
+
+# Incremental-run cursors and rolling reports, on the cache volume
+_state_store = PersistentCache(
+    os.path.join(CACHE_DIR, 'state.sqlite3'),
+    ttl_seconds=STATE_TTL_SECONDS,
+    max_bytes=STATE_MAX_BYTES,
+)
+
+def note_skipped(target: str, stage: str, reason: str) -> None:
+    """Record work the job dropped (a feed, post or LLM call) and why"""
+    print(f"⏭️ Skipping {stage} for {target}: {reason}")
+    record('skipped', target, {'stage': stage, 'reason': reason})
+
 def extract_substack_content(newsletter_url: str, max_posts: int = 5) -> List[Dict]:
     """Extract recent posts from Substack using RSS and web scraping"""
     # Enforce hard limit
@@ -59,104 +204,267 @@ def extract_substack_content(newsletter_url: str, max_posts: int = 5) -> List[Di
             print(f"Skipping unsafe RSS URL: {rss_url}")
             return posts
 
-        feed = feedparser.parse(rss_url)
-        
-        for entry in feed.entries[:max_posts]:
-            # Get full content by scraping the actual post
-            if not entry.get('link'):
-                continue
+        feed = fetch_feed(rss_url)
+
+        entries = [entry for entry in feed.entries if entry.get('link')]
+        if option('incremental', False):
+            # Drop seen entries before taking max_posts, so entries beyond the
+            # first max_posts new ones are picked up by later runs
+            entries = new_entries(newsletter_url, entries, max_posts)
+        else:
+            entries = entries[:max_posts]
+        if not entries:
+            return posts
 
-            full_content = scrape_post_content(entry.link)
-            
+        # Get full content from the feed or by scraping the actual posts
+        # concurrently, collecting results in feed order
+        with ThreadPoolExecutor(max_workers=len(entries)) as executor:
+            futures = [submit(executor, _entry_content, entry) for entry in entries]
+            contents = [future.result() for future in futures]
+
+        for entry, (full_content, content_source) in zip(entries, contents):
             post_data = {
                 'title': entry.get('title', ''),
                 'url': entry.get('link', ''),
                 'published': entry.get('published', ''),
                 'summary': entry.get('summary', ''),
                 'full_content': full_content,
+                'content_source': content_source,
                 'source': newsletter_url,
                 'author': feed.feed.get('title', ''),
                 'scraped_at': datetime.now().isoformat()
             }
             posts.append(post_data)
-            
-            # Be respectful - small delay between requests
-            time.sleep(1)
-            
+
     except Exception as e:
         print(f"Error extracting from {newsletter_url}: {str(e)}")
         
     return posts
 
+def fetch_feed(rss_url: str):
+    """
+    Fetch and parse an RSS feed through the bounded download path.
+    Sends conditional requests using cached ETag/Last-Modified validators and
+    reuses the cached parse on a 304. Concurrent jobs asking for the same feed
+    share one in-flight fetch. A fetch skipped for the job's deadline or the
+    host's circuit breaker serves the stale cached parse, or an empty feed.
+    Records the outcome in job stats.
+    """
+    import feedparser
+
+    with span('feed_fetch', url=rss_url) as fetch:
+        try:
+            feed, shared = _feeds_in_flight.do(rss_url, _fetch_feed, rss_url, fetch)
+        except WorkSkipped as e:
+            cached = _feed_cache.get(rss_url)
+            status = 'stale' if cached is not None else 'skipped'
+            fetch.tag('status', status)
+            record('feeds', rss_url, {'status': status, 'bytes': 0})
+            note_skipped(rss_url, 'feed_fetch', e.reason)
+            return cached.feed if cached is not None else feedparser.parse(b"")
+        if shared:
+            fetch.tag('status', 'shared')
+            incr('coalesced', 'feeds')
+            record('feeds', rss_url, {'status': 'shared', 'bytes': 0})
+    return feed
+
+def _fetch_feed(rss_url: str, fetch: Span):
+    import feedparser
+
+    cached = _feed_cache.get(rss_url)
+    if cached is not None and cached.is_fresh():
+        fetch.tag('status', 'hit')
+        record('feeds', rss_url, {'status': 'hit', 'bytes': 0})
+        return cached.feed
+
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+    with fetch_slot(rss_url), guarded_get(get_session(), rss_url, timeout=10, headers=headers, stream=True) as response:
+        fetch.add('retries', retry_count(response))
+        if response.status_code == 304 and cached is not None:
+            _feed_cache.touch(rss_url)
+            fetch.tag('status', 'not_modified')
+            record('feeds', rss_url, {'status': 'not_modified', 'bytes': 0})
+            return cached.feed
+
+        if response.status_code != 200:
+            fetch.tag('status', 'error')
+            record('feeds', rss_url, {'status': 'error', 'http_status': response.status_code})
+            return feedparser.parse(b"")
+
+        body = read_limited(response, MAX_RESPONSE_SIZE_BYTES)
+        fetch.add('bytes', len(body))
+        with span('feed_parse'):
+            feed = feedparser.parse(body, response_headers={
+                'content-location': rss_url,
+                'content-type': response.headers.get('Content-Type', 'application/xml'),
+            })
+        _feed_cache.put(rss_url, feed, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        fetch.tag('status', 'miss')
+        record('feeds', rss_url, {'status': 'miss', 'bytes': len(body)})
+        return feed
+
+def content_from_feed(entry) -> str:
+    """
+    Extract a feed entry's content:encoded body in the scraped-text format.
+    Returns "" when the feed carries no body or it looks truncated (shorter
+    than the job's 'feed_content_min_chars').
+    """
+    bodies = [content.get('value', '') for content in entry.get('content', []) if content.get('value')]
+    if not bodies:
+        return ""
+
+    text = extract_fragment(bodies[0], option('extractor', DEFAULT_EXTRACTOR), MAX_SCRAPED_CONTENT_LENGTH)
+    min_chars = min(option('feed_content_min_chars', FEED_CONTENT_MIN_CHARS), MAX_SCRAPED_CONTENT_LENGTH)
+    if len(text) < min_chars:
+        return ""
+    return text
+
+def feed_text(entry) -> str:
+    """Whatever body or summary the feed carries for an entry, however short"""
+    bodies = [content.get('value', '') for content in entry.get('content', []) if content.get('value')]
+    text = bodies[0] if bodies else entry.get('summary', '')
+    if not text:
+        return ""
+    return extract_fragment(text, option('extractor', DEFAULT_EXTRACTOR), MAX_SCRAPED_CONTENT_LENGTH)
+
+def _entry_content(entry) -> Tuple[str, str]:
+    """
+    Return (content, content_source) for a feed entry: 'feed', 'cache',
+    'scrape', or 'feed_summary' when the scrape was skipped
+    """
+    if option('content_mode', 'feed_first') == 'feed_first':
+        content = content_from_feed(entry)
+        if content:
+            incr('content_sources', 'feed')
+            return content, 'feed'
+
+    try:
+        content, content_source = _shared_post_content(entry.link, entry.get('updated') or entry.get('published', ''))
+    except WorkSkipped as e:
+        note_skipped(entry.link, 'post_scrape', e.reason)
+        content, content_source = feed_text(entry), 'feed_summary'
+    incr('content_sources', content_source)
+    return content, content_source
+
+def _shared_post_content(post_url: str, stamp: str = '') -> Tuple[str, str]:
+    """_get_post_content, sharing one in-flight fetch between concurrent jobs with the same settings"""
+    key = (post_url, stamp, option('post_cache', 'use'), option('extractor', DEFAULT_EXTRACTOR))
+    result, shared = _posts_in_flight.do(key, _get_post_content, post_url, stamp)
+    if shared:
+        incr('coalesced', 'posts')
+    return result
+
+def get_post_content(post_url: str, stamp: str = '') -> str:
+    """
+    Return a post's extracted content, from the persistent post store when
+    possible. Entries are keyed by URL plus the feed's updated/published stamp
+    and the job's extractor, so edited posts are scraped again and each
+    backend's output is kept apart. Honors the job's 'post_cache' policy.
+    """
+    try:
+        return _get_post_content(post_url, stamp)[0]
+    except WorkSkipped:
+        return ""
+
+def _get_post_content(post_url: str, stamp: str = '') -> Tuple[str, str]:
+    policy = option('post_cache', 'use')
+    key = f"{post_url}|{stamp}|{option('extractor', DEFAULT_EXTRACTOR)}"
+
+    if policy == 'use':
+        cached = _post_store.get(key)
+        if cached is not None:
+            entry = json.loads(cached)
+            incr('post_cache', 'hits')
+            incr('post_cache', 'bytes_saved', entry['bytes'])
+            return entry['content'], 'cache'
+
+    content, bytes_downloaded = _scrape_post(post_url)
+    incr('post_cache', 'misses')
+    if policy != 'bypass' and content:
+        _post_store.put(key, json.dumps({'content': content, 'bytes': bytes_downloaded}).encode('utf-8'))
+    return content, 'scrape'
+
 def scrape_post_content(post_url: str) -> str:
     """Scrape full content from a Substack post"""
+    return get_post_content(post_url)
+
+def _scrape_post(post_url: str) -> Tuple[str, int]:
+    """
+    Scrape a post, returning its content and the number of bytes downloaded.
+    Raises WorkSkipped when the deadline or the host's circuit breaker rules
+    the request out.
+    """
     if not is_safe_url(post_url):
         print(f"Skipping unsafe post URL: {post_url}")
-        return ""
+        return "", 0
 
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (compatible; AI Research Bot/1.0)'
-        }
-        
         # Use stream=True to prevent loading massive files into memory
-        with requests.get(post_url, headers=headers, timeout=10, stream=True) as response:
+        with span('post_scrape', url=post_url) as scrape, \
+                fetch_slot(post_url), guarded_get(get_session(), post_url, timeout=10, stream=True) as response:
+            scrape.add('retries', retry_count(response))
             if response.status_code != 200:
-                return ""
+                scrape.tag('status', response.status_code)
+                return "", 0
 
-            # Read only the first N bytes to prevent DoS via massive content
-            content_bytes = b""
+            # Parse incrementally and stop as soon as enough text is collected.
+            # Read at most N bytes to prevent DoS via massive content
+            extractor = create_extractor(
+                option('extractor', DEFAULT_EXTRACTOR),
+                MAX_SCRAPED_CONTENT_LENGTH,
+                response.headers.get('Content-Type'),
+            )
+            # Download and parse interleave chunk by chunk, so time them
+            # separately only when metrics are on
+            timed = metrics_enabled()
+            parse_seconds = 0.0
+            started = time.perf_counter() if timed else 0.0
+            bytes_read = 0
             for chunk in response.iter_content(chunk_size=8192):
-                content_bytes += chunk
-                if len(content_bytes) > MAX_RESPONSE_SIZE_BYTES:
+                bytes_read += len(chunk)
+                if timed:
+                    parse_started = time.perf_counter()
+                    done = extractor.feed(chunk)
+                    parse_seconds += time.perf_counter() - parse_started
+                else:
+                    done = extractor.feed(chunk)
+                if done or bytes_read >= MAX_RESPONSE_SIZE_BYTES:
                     break
 
-            soup = BeautifulSoup(content_bytes, 'html.parser')
-            
-            # Find the main content area (Substack specific)
-            content_div = soup.find('div', class_='post-content')
-            if not content_div:
-                content_div = soup.find('div', class_='available-content')
-            if not content_div:
-                # Fallback to finding paragraphs
-                content_div = soup.find('article')
-                
-            if content_div:
-                # Extract text while preserving structure
-                paragraphs = content_div.find_all(['p', 'h1', 'h2', 'h3', 'blockquote'])
-                content = '\n\n'.join([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
-                return content[:5000]  # Limit length
-                
-        return ""
-        
+            if timed:
+                parse_started = time.perf_counter()
+            content = extractor.close()
+            if timed:
+                parse_seconds += time.perf_counter() - parse_started
+                record_span('post_download', time.perf_counter() - started - parse_seconds, bytes=bytes_read)
+                record_span('post_parse', parse_seconds, chars=len(content))
+            scrape.add('bytes', bytes_read)
+            return content, bytes_read
+
+    except WorkSkipped:
+        raise
     except Exception as e:
         print(f"Error scraping {post_url}: {str(e)}")
-        return ""
-
-def analyze_research_intelligence(posts: List[Dict]) -> Dict:
-    """Analyze posts with Claude for research intelligence and story opportunities"""
-    
-    if not ANTHROPIC_API_KEY:
-        return {"error": "No Anthropic API key configured"}
-    
-    # Prepare content for analysis
-    analysis_content = ""
-    for post in posts:
-        analysis_content += f"""
-=== POST ===
-Author: {post['author']}
-Title: {post['title']}
-URL: {post['url']}
-Published: {post['published']}
-Content: {post['full_content'][:2000]}...
-Source: {post['source']}
+        return "", 0
 
+# Stable instructions, sent as the system prompt so they form a cacheable
+# prefix (see claude_utils.PROMPT_CACHE_MODES). The analysis and outreach
+# calls share SYSTEM_PROMPT, so the outreach call can read the analysis
+# call's prefix from the prompt cache; map shards only get the summary
+# instructions. The variable material goes in the user turn, followed by a
+# short task line naming the section to follow.
+_SYSTEM_PREAMBLE = """
+You are an expert at identifying storytelling opportunities and collaboration potential in AI consciousness research for "The Papers That Dream" podcast. Each request gives you newsletter posts, or summaries of them, followed by a task. Follow the instructions below for that task, focusing on the human elements and narrative potential, not just technical content.
 """
-    
-    analysis_prompt = f"""
-You are an expert at identifying storytelling opportunities and collaboration potential in AI consciousness research. Analyze these newsletter posts for "The Papers That Dream" podcast.
 
-{analysis_content}
+SYSTEM_PROMPT = _SYSTEM_PREAMBLE + """
+## Research intelligence analysis
 
 Provide a detailed analysis including:
 
@@ -177,60 +485,9 @@ Provide a detailed analysis including:
 
 7. **Research Gaps**: What questions about AI consciousness are these researchers NOT addressing that could become story topics?
 
-Focus on the human elements and narrative potential, not just technical content.
-"""
-    
-    try:
-        headers = {
-            'Content-Type': 'application/json',
-            'x-api-key': ANTHROPIC_API_KEY,
-            'anthropic-version': '2023-06-01'
-        }
-        
-        payload = {
-            'model': 'claude-3-sonnet-20240229',
-            'max_tokens': 3000,
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': analysis_prompt
-                }
-            ]
-        }
-        
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return {
-                'research_intelligence': result['content'][0]['text'],
-                'analysis_timestamp': datetime.now().isoformat(),
-                'posts_analyzed': len(posts),
-                'sources_covered': list(set([post['source'] for post in posts]))
-            }
-        else:
-            return {"error": f"Claude API error: {response.status_code} - {response.text}"}
-            
-    except Exception as e:
-        return {"error": f"Analysis error: {str(e)}"}
-
-def generate_outreach_strategy(analysis: Dict, target_researchers: List[str] = None) -> Dict:
-    """Generate personalized outreach strategies based on analysis"""
-    
-    if not ANTHROPIC_API_KEY or 'research_intelligence' not in analysis:
-        return {"error": "No analysis available for outreach strategy"}
-    
-    strategy_prompt = f"""
-Based on this research intelligence analysis:
+## Outreach strategy
 
-{analysis['research_intelligence']}
-
-Generate specific outreach strategies for "The Papers That Dream" podcast. Create:
+Based on the research intelligence analysis you are given, generate specific outreach strategies for the podcast. Create:
 
 1. **Personalized Email Templates**: For each researcher mentioned, craft a specific approach that:
    - References their recent work authentically
@@ -248,49 +505,822 @@ Generate specific outreach strategies for "The Papers That Dream" podcast. Creat
 
 Make each approach feel like a genuine creative collaboration opportunity.
 """
-    
+
+MAP_SYSTEM_PROMPT = _SYSTEM_PREAMBLE + """
+## Post summaries
+
+You are preparing notes for the analyst who will write the research intelligence analysis. For each post, write a short summary covering:
+- The core argument and key themes
+- Personal anecdotes, emotional language, uncertainty or philosophical questions
+- Signs the author would be open to creative storytelling partnerships
+- Researchers, projects or ideas the post connects to
+
+Keep author names, titles and URLs so they can be cited in the final report.
+"""
+
+ANALYSIS_PROMPT_TEMPLATE = """
+Analyze these {material} for "The Papers That Dream" podcast: write the research intelligence analysis.
+"""
+
+MAP_PROMPT_TEMPLATE = """
+Summarize these newsletter posts: write the post summaries.
+"""
+
+ROLLING_PROMPT_TEMPLATE = """
+This is the current research intelligence report:
+
+{previous_report}
+
+The {material} above have been published since it was written. Update the report with what the new material adds or changes. Keep its structure (Key Themes & Trends, Story Opportunities, Collaboration Targets, Emotional Undertones, Connection Mapping, Outreach Insights, Research Gaps), keep insights that still hold, revise the ones the new material changes, and work the new authors and posts into every section they touch. Return the complete updated report.
+"""
+
+OUTREACH_PROMPT_TEMPLATE = """
+Based on this research intelligence analysis:
+
+{analysis}
+
+Write the outreach strategy.
+"""
+
+def user_prompt(material: str, task: str) -> Prompt:
+    """
+    The user turn: the posts or summaries first, then the task. With the
+    job's 'prompt_cache' set to 'corpus' they are separate content blocks and
+    the material is a cache breakpoint, so a later call that starts with the
+    same material (the outreach step) reads it from the prompt cache.
+    """
+    if material and option('prompt_cache', DEFAULT_PROMPT_CACHE) == 'corpus':
+        return [text_block(material, cached=True), text_block(task)]
+    return material + task
+
+def _post_block(post: Dict, content: str, truncated: bool) -> str:
+    return f"""
+=== POST ===
+Author: {post['author']}
+Title: {post['title']}
+URL: {post['url']}
+Published: {post['published']}
+Content: {content}{'...' if truncated else ''}
+Source: {post['source']}
+
+"""
+
+def pack_posts(posts: List[Dict], token_budget: int) -> str:
+    """
+    Format posts for a prompt, sharing token_budget across their bodies so
+    short posts are kept whole and long ones are trimmed evenly.
+    """
+    headers = [estimate_tokens(_post_block(post, '', False)) for post in posts]
+    sizes = [estimate_tokens(post['full_content']) for post in posts]
+    allocation = allocate_budget(sizes, max(0, token_budget - sum(headers)))
+
+    blocks = []
+    for post, size, allowance in zip(posts, sizes, allocation):
+        content = truncate_to_tokens(post['full_content'], allowance)
+        blocks.append(_post_block(post, content, allowance < size))
+    return "".join(blocks)
+
+def pack_summaries(shards: List[Tuple[List[Dict], str]], token_budget: int) -> str:
+    """Format (posts, summary) pairs for the reduce prompt within token_budget"""
+    headers = [
+        f"""
+=== SUMMARY ===
+Source: {posts[0]['source']}
+Posts: {'; '.join(post['title'] for post in posts)}
+"""
+        for posts, _ in shards
+    ]
+    sizes = [estimate_tokens(summary) for _, summary in shards]
+    budget = max(0, token_budget - sum(estimate_tokens(header) for header in headers))
+    allocation = allocate_budget(sizes, budget)
+
+    return "".join(
+        f"{header}{truncate_to_tokens(summary, allowance)}\n"
+        for header, (_, summary), allowance in zip(headers, shards, allocation)
+    )
+
+def _analysis_shards(posts: List[Dict], shard_by: str) -> List[List[Dict]]:
+    """Split posts into map shards: one per post, or one per newsletter in input order"""
+    if shard_by == 'post':
+        return [[post] for post in posts]
+
+    shards: Dict[str, List[Dict]] = {}
+    for post in posts:
+        shards.setdefault(post['source'], []).append(post)
+    return list(shards.values())
+
+def _summarize_shard(posts: List[Dict], token_budget: int) -> Dict:
+    # Shard material is never reused, so it gets no cache breakpoint
+    prompt = pack_posts(posts, token_budget) + MAP_PROMPT_TEMPLATE
+    return create_message(ANTHROPIC_API_KEY, prompt, MAP_MAX_TOKENS, system=MAP_SYSTEM_PROMPT)
+
+def _map_summaries(posts: List[Dict], token_budget: int) -> Tuple[List[Tuple[List[Dict], str]], Dict, List[str]]:
+    """
+    Summarize shards concurrently, at most 'analysis_parallelism' in flight.
+    Returns (shard posts, summary) pairs in input order, the summed usage and
+    the errors of shards that failed.
+    """
+    shards = _analysis_shards(posts, option('analysis_shard', 'newsletter'))
+    parallelism = min(option('analysis_parallelism', DEFAULT_ANALYSIS_PARALLELISM), len(shards))
+
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = [submit(executor, _summarize_shard, shard, token_budget) for shard in shards]
+
+        summaries = []
+        usage = {'input_tokens': 0, 'output_tokens': 0}
+        errors = []
+        for shard, future in zip(shards, futures):
+            try:
+                message = future.result()
+            except WorkSkipped as e:
+                note_skipped(f"map:{shard[0]['source']}", 'map', e.reason)
+                errors.append(f"{shard[0]['source']}: skipped ({e.reason})")
+                continue
+            except ClaudeAPIError as e:
+                errors.append(f"{shard[0]['source']}: Claude API error: {e.status_code}")
+                continue
+            except Exception as e:
+                errors.append(f"{shard[0]['source']}: {str(e)}")
+                continue
+            summaries.append((shard, message['text']))
+            for name in usage:
+                usage[name] += message['usage'].get(name, 0)
+
+    return summaries, usage, errors
+
+def analyze_research_intelligence(posts: List[Dict]) -> Dict:
+    """
+    Analyze posts with Claude for research intelligence and story opportunities.
+
+    In 'single' mode every post goes into one prompt. In 'map_reduce' mode each
+    shard (a post or a newsletter) is summarized concurrently first and the
+    report is built from the summaries, so latency follows the slowest shard
+    rather than the total input size. Either way each prompt's variable
+    content is packed into the job's 'prompt_token_budget'.
+
+    In an 'incremental' job the stored rolling report is updated with the
+    new posts instead; with no new posts it is returned without an LLM call.
+    """
+    previous = rolling_state() if option('incremental', False) else None
+    if previous is not None and not posts:
+        return _unchanged_result(previous)
+
+    if not ANTHROPIC_API_KEY:
+        return {"error": "No Anthropic API key configured"}
+
     try:
-        headers = {
-            'Content-Type': 'application/json',
-            'x-api-key': ANTHROPIC_API_KEY,
-            'anthropic-version': '2023-06-01'
-        }
-        
-        payload = {
-            'model': 'claude-3-sonnet-20240229',
-            'max_tokens': 2500,
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': strategy_prompt
-                }
-            ]
+        analysis_prompt, details = _analysis_prompt(posts, previous)
+        message = create_message(ANTHROPIC_API_KEY, analysis_prompt, ANALYSIS_MAX_TOKENS, system=SYSTEM_PROMPT)
+        return _analysis_result(posts, message, details)
+
+    except WorkSkipped as e:
+        note_skipped('analysis', 'analysis', e.reason)
+        return {"error": f"Analysis skipped: {e.reason}"}
+    except ClaudeAPIError as e:
+        return {"error": f"Claude API error: {e.status_code} - {e.body}"}
+    except Exception as e:
+        return {"error": f"Analysis error: {str(e)}"}
+
+def stream_research_intelligence(posts: List[Dict]) -> Generator[str, None, Dict]:
+    """Streaming analyze_research_intelligence: yields report text as it arrives, returns the analysis"""
+    previous = rolling_state() if option('incremental', False) else None
+    if previous is not None and not posts:
+        yield previous['report']
+        return _unchanged_result(previous)
+
+    if not ANTHROPIC_API_KEY:
+        return {"error": "No Anthropic API key configured"}
+
+    try:
+        analysis_prompt, details = _analysis_prompt(posts, previous)
+        message = yield from stream_message(ANTHROPIC_API_KEY, analysis_prompt, ANALYSIS_MAX_TOKENS, system=SYSTEM_PROMPT)
+        return _analysis_result(posts, message, details)
+
+    except WorkSkipped as e:
+        note_skipped('analysis', 'analysis', e.reason)
+        return {"error": f"Analysis skipped: {e.reason}"}
+    except ClaudeAPIError as e:
+        return {"error": f"Claude API error: {e.status_code} - {e.body}"}
+    except Exception as e:
+        return {"error": f"Analysis error: {str(e)}"}
+
+def _analysis_prompt(posts: List[Dict], previous: Optional[Dict] = None) -> Tuple[Prompt, Dict]:
+    """
+    Build the analysis prompt, running the map stage first in 'map_reduce'
+    mode. With a previous rolling report the prompt asks for it to be updated,
+    and the report's size comes out of the packing budget. In 'corpus'
+    prompt caching the packed material is kept for the outreach prompt.
+    """
+    mode = option('analysis_mode', 'single')
+    token_budget = option('prompt_token_budget', PROMPT_TOKEN_BUDGET)
+    pack_budget = token_budget
+    if previous is not None:
+        pack_budget = max(token_budget - estimate_tokens(previous['report']), MIN_PROMPT_TOKEN_BUDGET)
+    details = {'analysis_mode': mode}
+
+    if mode != 'map_reduce' or not posts:
+        material = 'newsletter posts'
+        analysis_content = pack_posts(posts, pack_budget)
+        analyzed = posts
+    else:
+        summaries, map_usage, shard_errors = _map_summaries(posts, token_budget)
+        if not summaries:
+            raise RuntimeError(f"every shard failed ({shard_errors[0]})")
+        material = 'summaries of newsletter posts'
+        analysis_content = pack_summaries(summaries, pack_budget)
+        analyzed = [post for shard, _ in summaries for post in shard]
+        details.update({
+            'shards_analyzed': len(summaries),
+            'shard_errors': shard_errors,
+            'map_usage': map_usage,
+        })
+
+    if option('incremental', False):
+        note_analyzed(analyzed)
+        details['incremental'] = {
+            'mode': 'initial' if previous is None else 'update',
+            'new_posts': len(posts),
+            'previous_update_at': previous['updated_at'] if previous is not None else None,
         }
-        
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return {
-                'outreach_strategy': result['content'][0]['text'],
-                'strategy_timestamp': datetime.now().isoformat()
-            }
-        else:
-            return {"error": f"Strategy generation error: {response.status_code}"}
-            
+    if option('prompt_cache', DEFAULT_PROMPT_CACHE) == 'corpus':
+        record('prompt_corpus', 'analysis', analysis_content)
+    if previous is None:
+        task = ANALYSIS_PROMPT_TEMPLATE.format(material=material)
+    else:
+        task = ROLLING_PROMPT_TEMPLATE.format(previous_report=previous['report'], material=material)
+    return user_prompt(analysis_content, task), details
+
+def _analysis_result(posts: List[Dict], message: Dict, details: Dict) -> Dict:
+    return {
+        'research_intelligence': message['text'],
+        'analysis_timestamp': datetime.now().isoformat(),
+        'posts_analyzed': len(posts),
+        'sources_covered': list(set([post['source'] for post in posts])),
+        'analysis_hash': content_hash(message['text']),
+        **details,
+        'usage': message['usage'],
+        'cache': message['cache']
+    }
+
+def _unchanged_result(state: Dict) -> Dict:
+    """The stored rolling report as an analysis result, for incremental jobs with nothing new"""
+    return {
+        'research_intelligence': state['report'],
+        'analysis_timestamp': state['updated_at'],
+        'posts_analyzed': 0,
+        'sources_covered': state['sources_covered'],
+        'analysis_hash': state['analysis_hash'],
+        'incremental': {'mode': 'unchanged', 'new_posts': 0, 'previous_update_at': state['updated_at']},
+        'usage': {'input_tokens': 0, 'output_tokens': 0},
+        'cache': 'state',
+    }
+
+def _stored_outreach(analysis: Dict) -> Optional[Dict]:
+    """The outreach strategy stored with an unchanged rolling report, if any"""
+    if analysis.get('incremental', {}).get('mode') != 'unchanged':
+        return None
+    state = rolling_state()
+    if state is None or not state.get('outreach') or state['analysis_hash'] != analysis['analysis_hash']:
+        return None
+    return {**state['outreach'], 'usage': {'input_tokens': 0, 'output_tokens': 0}, 'cache': 'state'}
+
+def generate_outreach_strategy(analysis: Dict, target_researchers: List[str] = None) -> Dict:
+    """Generate personalized outreach strategies based on analysis"""
+    stored = _stored_outreach(analysis)
+    if stored is not None:
+        return stored
+
+    if not ANTHROPIC_API_KEY or 'research_intelligence' not in analysis:
+        return {"error": "No analysis available for outreach strategy"}
+
+    strategy_prompt, cache_key = _outreach_request(analysis)
+
+    try:
+        message = create_message(ANTHROPIC_API_KEY, strategy_prompt, OUTREACH_MAX_TOKENS, cache_key=cache_key,
+                                 system=SYSTEM_PROMPT)
+        return _outreach_result(message)
+
+    except WorkSkipped as e:
+        note_skipped('outreach', 'outreach', e.reason)
+        return {"error": f"Strategy skipped: {e.reason}"}
+    except ClaudeAPIError as e:
+        return {"error": f"Strategy generation error: {e.status_code}"}
     except Exception as e:
         return {"error": f"Strategy error: {str(e)}"}
 
-def handler(event):
-    """Main handler for RunPod serverless"""
-    
-    job_input = event.get('input', {})
-    
+def stream_outreach_strategy(analysis: Dict) -> Generator[str, None, Dict]:
+    """Streaming generate_outreach_strategy: yields strategy text as it arrives, returns the strategy"""
+    stored = _stored_outreach(analysis)
+    if stored is not None:
+        yield stored['outreach_strategy']
+        return stored
+
+    if not ANTHROPIC_API_KEY or 'research_intelligence' not in analysis:
+        return {"error": "No analysis available for outreach strategy"}
+
+    strategy_prompt, cache_key = _outreach_request(analysis)
+
+    try:
+        message = yield from stream_message(ANTHROPIC_API_KEY, strategy_prompt, OUTREACH_MAX_TOKENS, cache_key=cache_key,
+                                           system=SYSTEM_PROMPT)
+        return _outreach_result(message)
+
+    except WorkSkipped as e:
+        note_skipped('outreach', 'outreach', e.reason)
+        return {"error": f"Strategy skipped: {e.reason}"}
+    except ClaudeAPIError as e:
+        return {"error": f"Strategy generation error: {e.status_code}"}
+    except Exception as e:
+        return {"error": f"Strategy error: {str(e)}"}
+
+def _analysis_corpus() -> str:
+    """The material of the job's last analysis prompt, kept in 'corpus' prompt caching"""
+    stats = current_stats()
+    return stats.section('prompt_corpus').get('analysis', '') if stats else ''
+
+def _outreach_request(analysis: Dict, corpus: Optional[str] = None) -> Tuple[Prompt, str]:
+    """
+    The outreach prompt and its response cache key. In 'corpus' prompt
+    caching the prompt starts with the analysis step's material (corpus,
+    by default the job's last analysis material), which the API then reads
+    from the prompt cache instead of processing it again.
+    """
+    task = OUTREACH_PROMPT_TEMPLATE.format(analysis=analysis['research_intelligence'])
+    if corpus is None:
+        corpus = _analysis_corpus()
+    strategy_prompt = user_prompt(corpus, task)
+
+    # Chain the cache entry off the analysis content hash rather than the
+    # full prompt, so identical analyses reuse the same outreach strategy
+    analysis_hash = analysis.get('analysis_hash') or content_hash(analysis['research_intelligence'])
+    cache_key = content_hash('outreach', CLAUDE_MODEL, OUTREACH_MAX_TOKENS, SYSTEM_PROMPT, OUTREACH_PROMPT_TEMPLATE,
+                             analysis_hash, content_hash(corpus) if corpus else None)
+    return strategy_prompt, cache_key
+
+def _outreach_result(message: Dict) -> Dict:
+    return {
+        'outreach_strategy': message['text'],
+        'strategy_timestamp': datetime.now().isoformat(),
+        'usage': message['usage'],
+        'cache': message['cache']
+    }
+
+def _extract_newsletter(newsletter_url: str, posts_per_newsletter: int) -> List[Dict]:
+    print(f"📰 Extracting from: {newsletter_url}")
+    posts = extract_substack_content(newsletter_url, posts_per_newsletter)
+    print(f"✅ Found {len(posts)} posts from {newsletter_url}")
+    return posts
+
+def iter_newsletter_posts(newsletters: List[str], posts_per_newsletter: int,
+                          max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                          rate_limiter: HostRateLimiter = None) -> Iterator[Tuple[int, List[Dict]]]:
+    """Extract newsletters concurrently, yielding (index, posts) as each one finishes"""
+    if not newsletters:
+        return
+
+    if rate_limiter is None:
+        rate_limiter = JobRateLimiter(worker_rate_limiter)
+
+    with job_scope(max_concurrency=max_concurrency, rate_limiter=rate_limiter):
+        workers = min(max_concurrency, len(newsletters))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                submit(executor, _extract_newsletter, newsletter_url, posts_per_newsletter): index
+                for index, newsletter_url in enumerate(newsletters)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+def collect_posts(newsletters: List[str], posts_per_newsletter: int,
+                  max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                  rate_limiter: HostRateLimiter = None) -> List[Dict]:
+    """Collect posts from all newsletters concurrently, keeping input order"""
+    results = dict(iter_newsletter_posts(newsletters, posts_per_newsletter, max_concurrency, rate_limiter))
+    return [post for index in sorted(results) for post in results[index]]
+
+def _load_state(key: str) -> Optional[Dict]:
+    cached = _state_store.get(key)
+    return json.loads(cached) if cached is not None else None
+
+def _save_state(key: str, value: Dict) -> None:
+    _state_store.put(key, json.dumps(value).encode('utf-8'))
+
+def _entry_id(entry) -> str:
+    return entry.get('id') or entry.get('link', '')
+
+def new_entries(newsletter_url: str, entries: List, max_entries: int) -> List:
+    """
+    Return up to max_entries feed entries the job's state has not seen yet
+    for this newsletter. The entries returned are noted in job stats so the
+    cursor can be advanced past the ones that get analyzed (see
+    commit_incremental_state).
+    """
+    cursor = _load_state(f"cursor|{option('state_key')}|{newsletter_url}") or {}
+    seen = set(cursor.get('seen', []))
+    fresh = [entry for entry in entries if _entry_id(entry) not in seen]
+    incr('incremental', 'entries_skipped', len(entries) - len(fresh))
+
+    fresh = fresh[:max_entries]
+    if fresh:
+        record('cursor_updates', newsletter_url, [
+            {
+                'id': _entry_id(entry),
+                'url': entry.get('link', ''),
+                'published': (time.strftime('%Y-%m-%dT%H:%M:%SZ', entry.published_parsed)
+                              if entry.get('published_parsed') else None),
+            }
+            for entry in fresh
+        ])
+    return fresh
+
+def note_analyzed(posts: List[Dict]) -> None:
+    """
+    Note the posts whose content goes into an incremental job's analysis,
+    with the duplicates merged into them. Failed scrapes and posts left with
+    only the feed summary are not noted, so their entries stay new.
+    """
+    for post in posts:
+        if not post.get('full_content') or post.get('content_source') == 'feed_summary':
+            continue
+        for url in {post.get('url', '')} | {copy.get('url', '') for copy in post.get('sources', [])}:
+            record('analyzed_posts', url, True)
+
+def rolling_state() -> Optional[Dict]:
+    """The rolling report stored for the job's state key, or None"""
+    return _load_state(f"report|{option('state_key')}")
+
+def commit_incremental_state(stats: JobStats, analysis: Dict, outreach: Optional[Dict]) -> int:
+    """
+    After a successful incremental analysis, advance each newsletter's cursor
+    past the new entries that were analyzed (see note_analyzed) and store the
+    updated report (and the outreach strategy, when one was generated).
+    Entries that were not analyzed (failed or skipped scrapes, posts ranked
+    out of the analysis) stay new for the next run. Returns the cursors
+    advanced.
+    """
+    key = option('state_key')
+    analyzed = stats.section('analyzed_posts')
+    advanced = 0
+    for newsletter_url, entries in stats.section('cursor_updates').items():
+        entries = [entry for entry in entries if entry['url'] in analyzed]
+        if not entries:
+            continue
+        ids = [entry['id'] for entry in entries]
+        cursor_key = f"cursor|{key}|{newsletter_url}"
+        cursor = _load_state(cursor_key) or {'seen': []}
+        seen = ids + [entry_id for entry_id in cursor['seen'] if entry_id not in ids]
+        latest = [cursor.get('latest_published')] + [entry['published'] for entry in entries]
+        _save_state(cursor_key, {
+            'seen': seen[:CURSOR_MAX_ENTRIES],
+            'latest_published': max((value for value in latest if value), default=None),
+        })
+        advanced += 1
+
+    previous = rolling_state() or {}
+    _save_state(f"report|{key}", {
+        'report': analysis['research_intelligence'],
+        'analysis_hash': analysis['analysis_hash'],
+        'updated_at': analysis['analysis_timestamp'],
+        'sources_covered': sorted(set(previous.get('sources_covered', [])) | set(analysis['sources_covered'])),
+        'outreach': outreach if outreach and 'error' not in outreach else None,
+    })
+    return advanced
+
+def dedupe_posts(posts: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """
+    Collapse posts with the same canonical URL or near-duplicate content
+    (MinHash similarity of at least the job's 'dedup_threshold') into the
+    copy with the most content, listing every copy under 'sources'.
+    Returns the remaining posts, in first-seen order, and dedup stats.
+    """
+    threshold = option('dedup_threshold', DEDUP_THRESHOLD)
+    stats = {'enabled': bool(option('dedup', True)), 'threshold': threshold,
+             'duplicates_removed': 0, 'tokens_saved': 0}
+    if not stats['enabled']:
+        return posts, stats
+
+    groups = duplicate_groups(
+        [post.get('url', '') for post in posts],
+        [post.get('full_content', '') for post in posts],
+        threshold,
+    )
+
+    deduped = []
+    for group in groups:
+        copies = [posts[index] for index in group]
+        kept = max(copies, key=lambda post: len(post.get('full_content', '')))
+        if len(copies) > 1:
+            kept = {**kept, 'sources': [
+                {'url': post.get('url'), 'source': post.get('source'), 'author': post.get('author')} for post in copies
+            ]}
+            stats['duplicates_removed'] += len(copies) - 1
+            stats['tokens_saved'] += sum(
+                estimate_tokens(post.get('full_content', '')) for post in copies
+            ) - estimate_tokens(kept.get('full_content', ''))
+        deduped.append(kept)
+
+    return deduped, stats
+
+def rank_posts(posts: List[Dict]) -> Tuple[List[Dict], List[Dict], Dict]:
+    """
+    Score posts against the job's 'topic_query' with BM25 and choose the ones
+    forwarded to analysis: the 'top_k' best, further limited to what fits in
+    'rank_token_budget'. With neither set every post is forwarded in its
+    original order. Returns the posts annotated with 'relevance_score' and
+    'analyzed', the forwarded posts and ranking stats.
+    """
+    top_k = option('top_k')
+    token_budget = option('rank_token_budget')
+    scores = bm25_scores(
+        [f"{post.get('title', '')} {post.get('title', '')} {post.get('full_content') or post.get('summary', '')}"
+         for post in posts],
+        option('topic_query', DEFAULT_TOPIC_QUERY),
+    )
+
+    if top_k is None and token_budget is None:
+        selected = list(range(len(posts)))
+    else:
+        ranked = sorted(range(len(posts)), key=lambda index: -scores[index])
+        selected = ranked[:top_k] if top_k is not None else ranked
+        if token_budget is not None:
+            fitted = []
+            used = 0
+            for index in selected:
+                tokens = estimate_tokens(posts[index].get('full_content', ''))
+                if fitted and used + tokens > token_budget:
+                    break
+                fitted.append(index)
+                used += tokens
+            selected = fitted
+
+    chosen = set(selected)
+    annotated = [
+        {**post, 'relevance_score': round(score, 4), 'analyzed': index in chosen}
+        for index, (post, score) in enumerate(zip(posts, scores))
+    ]
+    forwarded = [annotated[index] for index in selected]
+    return annotated, forwarded, {
+        'posts_ranked': len(posts),
+        'posts_forwarded': len(forwarded),
+        'top_k': top_k,
+        'token_budget': token_budget,
+        'tokens_forwarded': sum(estimate_tokens(post.get('full_content', '')) for post in forwarded),
+    }
+
+def prepare_posts(posts: List[Dict]) -> Tuple[List[Dict], List[Dict], Dict]:
+    """
+    Run the local stages between collection and analysis: dedup, then
+    relevance ranking. Returns the posts for the output, the posts to
+    analyze and the stages' stats.
+    """
+    posts, dedup_stats = dedupe_posts(posts)
+    posts, forwarded, ranking_stats = rank_posts(posts)
+    return posts, forwarded, {'dedup_stats': dedup_stats, 'ranking_stats': ranking_stats}
+
+def report_progress(event: Dict, progress: Dict) -> None:
+    """Log a long job's progress and, on a worker, publish it as the job's in-progress output"""
+    print(f"⏳ {json.dumps(progress)}")
+    runpod = sys.modules.get('runpod')
+    if runpod is not None and event.get('id'):
+        runpod.serverless.progress_update(event, progress)
+
+def _batch_round(stage: str, requests: List[Dict], error_prefix: str) -> Generator[Dict, None, Dict[str, Dict]]:
+    """
+    Send one stage's requests as a Message Batch, re-yielding its progress
+    tagged with the stage. Returns {custom_id: message}; when the batch as a
+    whole fails every request gets {'error': ...}.
+    """
+    if not requests:
+        return {}
+    try:
+        messages = batch_messages(ANTHROPIC_API_KEY, requests)
+        while True:
+            try:
+                progress = next(messages)
+            except StopIteration as stop:
+                return stop.value
+            yield {'stage': stage, **progress}
+
+    except WorkSkipped as e:
+        note_skipped(stage, stage, e.reason)
+        error = f"{error_prefix} skipped: {e.reason}"
+    except ClaudeAPIError as e:
+        error = f"Claude API error: {e.status_code} - {e.body}"
+    except Exception as e:
+        error = f"{error_prefix} error: {str(e)}"
+    return {request['custom_id']: {'error': error} for request in requests}
+
+def batch_job(job: Dict, collect_deadline: Optional[float] = None) -> Generator[Dict, None, Dict]:
+    """
+    Run a batch job (input 'groups') inside its job_scope. Every group's
+    newsletters are collected in one pass, so a newsletter shared by groups
+    is fetched once, and each group's posts are deduplicated and ranked on
+    their own. All analysis prompts then go out as one Message Batch, and
+    the outreach prompts for the groups that got an analysis as a second.
+    Groups left with no posts are not sent; they are listed under
+    'empty_groups'. Yields progress dicts ('stage' and its counts) and
+    returns the result, with one entry per group under 'groups'.
+    """
+    newsletters = job['newsletters']
+    collected: Dict[str, List[Dict]] = {}
+    with span('collect'), job_scope(deadline=collect_deadline):
+        for index, posts in iter_newsletter_posts(
+            newsletters, job['posts_per_newsletter'], job['max_concurrency'], job['rate_limiter']
+        ):
+            collected[newsletters[index]] = posts
+            yield {'stage': 'collect', 'newsletters_done': len(collected), 'newsletters': len(newsletters)}
+
+    groups = []
+    with span('prepare'):
+        for name, urls in job['groups']:
+            posts, analysis_posts, stage_stats = prepare_posts([post for url in urls for post in collected[url]])
+            groups.append({'name': name, 'newsletters': urls, 'posts': posts,
+                           'analysis_posts': analysis_posts, 'stage_stats': stage_stats})
+
+    analyzed = [index for index, group in enumerate(groups) if group['analysis_posts']]
+    print(f"🧠 Analyzing {len(analyzed)} groups with the Message Batches API...")
+    with span('analysis'):
+        if not ANTHROPIC_API_KEY:
+            messages = {f'analysis-{index}': {'error': 'No Anthropic API key configured'} for index in analyzed}
+        else:
+            requests = []
+            for index in analyzed:
+                group = groups[index]
+                prompt, group['details'] = _analysis_prompt(group['analysis_posts'])
+                group['corpus'] = _analysis_corpus()
+                requests.append({'custom_id': f'analysis-{index}', 'prompt': prompt,
+                                 'max_tokens': ANALYSIS_MAX_TOKENS, 'system': SYSTEM_PROMPT})
+            messages = yield from _batch_round('analysis', requests, 'Analysis')
+
+    for index, group in enumerate(groups):
+        message = messages.get(f'analysis-{index}', {'error': 'No posts collected'})
+        group['analysis'] = (message if 'error' in message
+                             else _analysis_result(group['analysis_posts'], message, group['details']))
+
+    outreach = {}
+    if job['include_outreach_strategy']:
+        requests = []
+        for index, group in enumerate(groups):
+            if 'error' in group['analysis']:
+                continue
+            prompt, cache_key = _outreach_request(group['analysis'], group['corpus'])
+            requests.append({'custom_id': f'outreach-{index}', 'prompt': prompt, 'max_tokens': OUTREACH_MAX_TOKENS,
+                             'system': SYSTEM_PROMPT, 'cache_key': cache_key})
+        with span('outreach'):
+            messages = yield from _batch_round('outreach', requests, 'Strategy')
+        outreach = {custom_id: message if 'error' in message else _outreach_result(message)
+                    for custom_id, message in messages.items()}
+
+    results = []
+    for index, group in enumerate(groups):
+        entry = {
+            'name': group['name'],
+            'newsletters': group['newsletters'],
+            'posts_collected': len(group['posts']),
+            'posts': group['posts'],
+            'research_intelligence': group['analysis'],
+            **group['stage_stats'],
+        }
+        if f'outreach-{index}' in outreach:
+            entry['outreach_strategy'] = outreach[f'outreach-{index}']
+        results.append(entry)
+
+    return {
+        'groups_processed': len(groups),
+        'empty_groups': [group['name'] for group in groups if not group['analysis_posts']],
+        'newsletters_scanned': len(newsletters),
+        'posts_collected': sum(len(posts) for posts in collected.values()),
+        'groups': results,
+        'generated_at': datetime.now().isoformat(),
+    }
+
+def _dns_summary(dns: Dict) -> Dict:
+    hits = dns.get('hits', 0)
+    misses = dns.get('misses', 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+        'resolve_ms': round(dns.get('resolve_seconds', 0.0) * 1000, 1),
+    }
+
+def _llm_cache_summary(llm_cache: Dict) -> Dict:
+    return {
+        'hits': llm_cache.get('hits', 0),
+        'misses': llm_cache.get('misses', 0),
+        'tokens_saved': llm_cache.get('tokens_saved', 0),
+        'latency_saved_ms': round(llm_cache.get('latency_saved_seconds', 0.0) * 1000, 1),
+    }
+
+def _prompt_cache_summary(prompt_cache: Dict) -> Dict:
+    read = prompt_cache.get('cache_read_input_tokens', 0)
+    written = prompt_cache.get('cache_creation_input_tokens', 0)
+    uncached = prompt_cache.get('input_tokens', 0)
+    total = read + written + uncached
+    return {
+        'cache_read_input_tokens': read,
+        'cache_creation_input_tokens': written,
+        'input_tokens': uncached,
+        'read_ratio': round(read / total, 3) if total else 0.0,
+    }
+
+def _batch_summary(batch: Dict) -> Dict:
+    return {
+        'batches': batch.get('batches', 0),
+        'requests': batch.get('requests', 0),
+        'cached': batch.get('cached', 0),
+        'succeeded': batch.get('succeeded', 0),
+        'errored': batch.get('errored', 0),
+        'canceled': batch.get('canceled', 0),
+        'expired': batch.get('expired', 0),
+        'wait_ms': round(batch.get('wait_seconds', 0.0) * 1000, 1),
+    }
+
+def _job_metrics(job: Dict, event: Dict) -> Optional[JobMetrics]:
+    """Span collection for the job, or None (no overhead) unless metrics or metrics_log is set"""
+    if not job['metrics'] and not job['metrics_log']:
+        return None
+    return JobMetrics(job_id=event.get('id'), log=job['metrics_log'])
+
+def _job_stats_summary(stats: JobStats) -> Dict:
+    return {
+        'connection_stats': job_connection_stats(stats.section('connections')),
+        'feed_stats': stats.section('feeds'),
+        'post_cache_stats': {'hits': 0, 'misses': 0, 'bytes_saved': 0, **stats.section('post_cache')},
+        'dns_stats': _dns_summary(stats.section('dns')),
+        'content_source_stats': {
+            'feed': 0, 'cache': 0, 'scrape': 0, 'feed_summary': 0, **stats.section('content_sources'),
+        },
+        'llm_cache_stats': _llm_cache_summary(stats.section('llm_cache')),
+        'prompt_cache_stats': _prompt_cache_summary(stats.section('prompt_cache')),
+        'coalesced_stats': {'feeds': 0, 'posts': 0, **stats.section('coalesced')},
+        'skipped': stats.section('skipped'),
+        'open_circuits': host_breaker.open_hosts(),
+    }
+
+def _incremental_stats(stats: JobStats, analysis: Dict, outreach: Optional[Dict]) -> Dict:
+    """Commit an incremental job's state when it produced a new report, and summarize the run"""
+    mode = analysis.get('incremental', {}).get('mode', 'failed')
+    cursors_advanced = 0
+    if 'error' not in analysis and mode in ('initial', 'update'):
+        cursors_advanced = commit_incremental_state(stats, analysis, outreach)
+    return {
+        'state_key': option('state_key'),
+        'mode': mode,
+        'new_entries': sum(len(entries) for entries in stats.section('cursor_updates').values()),
+        'entries_skipped': stats.section('incremental').get('entries_skipped', 0),
+        'cursors_advanced': cursors_advanced,
+    }
+
+def _job_deadlines(job: Dict) -> Tuple[Optional[float], Optional[float]]:
+    """
+    The job's deadline and the earlier one for collection, as time.monotonic()
+    values; (None, None) when the job has no 'deadline_seconds'
+    """
+    budget = job['deadline_seconds']
+    if budget is None:
+        return None, None
+    started = time.monotonic()
+    return started + budget, started + budget - min(LLM_RESERVE_SECONDS, budget / 2)
+
+def _finish_batch(result: Dict, job: Dict, stats: JobStats, metrics: Optional[JobMetrics]) -> Dict:
+    """Add the job-level stats to a batch job's result"""
+    result['batch_stats'] = _batch_summary(stats.section('batch'))
+    result.update(_job_stats_summary(stats))
+    if job['metrics']:
+        result['metrics'] = metrics.summary()
+    return result
+
+def shape_result(result: Dict, job: Dict) -> Dict:
+    """
+    Apply the job's output settings to a finished result: the 'fields' and
+    'exclude_fields' projection, the shared 'source_table' and the
+    compressed 'encoding'. Sizes before and after go in 'size_stats'. A
+    batch job's groups share one source table.
+    """
+    size_stats = {'result_bytes': json_size(result)}
+    result = project(result, job['fields'], job['exclude_fields'])
+    if job['sources_table'] and isinstance(result.get('posts'), list):
+        result['posts'], result['source_table'] = sources_table(result['posts'])
+    groups = [group for group in result.get('groups', []) if isinstance(group.get('posts'), list)]
+    if job['sources_table'] and groups:
+        posts, result['source_table'] = sources_table([post for group in groups for post in group['posts']])
+        for group in groups:
+            group['posts'], posts = posts[:len(group['posts'])], posts[len(group['posts']):]
+    size_stats['projected_bytes'] = json_size(result)
+
+    if job['encoding'] == 'json':
+        return {**result, 'size_stats': size_stats}
+    envelope = encode_result(result, job['encoding'])
+    size_stats['encoded_bytes'] = json_size(envelope)
+    return {**envelope, 'size_stats': size_stats}
+
+def parse_job_input(job_input: Dict) -> Dict:
+    """
+    Validate job input and apply limits. Returns {"error": ...} for invalid
+    input, otherwise the job settings and the options for its job_scope.
+    """
     # Configuration from input
     newsletters = job_input.get('newsletters', list(RESEARCH_TARGETS.values()))
     # Enforce limit on number of newsletters
@@ -306,6 +1336,36 @@ def handler(event):
 
     include_outreach_strategy = job_input.get('include_outreach_strategy', True)
 
+    max_concurrency = job_input.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+    host_delay_seconds = job_input.get('host_delay_seconds', DEFAULT_HOST_INTERVAL_SECONDS)
+    host_delays = job_input.get('host_delays', {})
+    respect_crawl_delay = job_input.get('respect_crawl_delay', False)
+    post_cache = job_input.get('post_cache', 'use')
+    extractor = job_input.get('extractor', DEFAULT_EXTRACTOR)
+    content_mode = job_input.get('content_mode', 'feed_first')
+    cache_policy = job_input.get('cache_policy', 'use')
+    prompt_cache = job_input.get('prompt_cache', DEFAULT_PROMPT_CACHE)
+    feed_content_min_chars = job_input.get('feed_content_min_chars', FEED_CONTENT_MIN_CHARS)
+    analysis_mode = job_input.get('analysis_mode', 'single')
+    analysis_shard = job_input.get('analysis_shard', 'newsletter')
+    analysis_parallelism = job_input.get('analysis_parallelism', DEFAULT_ANALYSIS_PARALLELISM)
+    prompt_token_budget = job_input.get('prompt_token_budget', PROMPT_TOKEN_BUDGET)
+    dedup = job_input.get('dedup', True)
+    dedup_threshold = job_input.get('dedup_threshold', DEDUP_THRESHOLD)
+    topic_query = job_input.get('topic_query', DEFAULT_TOPIC_QUERY)
+    top_k = job_input.get('top_k')
+    rank_token_budget = job_input.get('rank_token_budget')
+    metrics = job_input.get('metrics', False)
+    metrics_log = job_input.get('metrics_log', METRICS_LOG_DEFAULT)
+    deadline_seconds = job_input.get('deadline_seconds')
+    fields = job_input.get('fields')
+    exclude_fields = job_input.get('exclude_fields')
+    use_sources_table = job_input.get('sources_table', False)
+    encoding = job_input.get('encoding', 'json')
+    incremental = job_input.get('incremental', False)
+    state_key = job_input.get('state_key')
+    groups = job_input.get('groups')
+
     # Security validation
     if not isinstance(newsletters, list):
         return {"error": "Input 'newsletters' must be a list of URLs"}
@@ -318,42 +1378,429 @@ def handler(event):
 
     if posts_per_newsletter > MAX_POSTS_PER_NEWSLETTER:
         return {"error": f"Too many posts per newsletter. Max allowed: {MAX_POSTS_PER_NEWSLETTER}"}
-    
-    print(f"🔍 Starting research intelligence collection...")
-    print(f"📊 Targeting {len(newsletters)} newsletters, {posts_per_newsletter} posts each")
-    
-    all_posts = []
-    
-    # Collect posts from each newsletter
-    for newsletter_url in newsletters:
-        print(f"📰 Extracting from: {newsletter_url}")
-        posts = extract_substack_content(newsletter_url, posts_per_newsletter)
-        all_posts.extend(posts)
-        print(f"✅ Found {len(posts)} posts")
-    
-    print(f"🧠 Analyzing {len(all_posts)} posts with Claude...")
-    
-    # Analyze with Claude for research intelligence
-    intelligence_analysis = analyze_research_intelligence(all_posts)
-    
-    result = {
-        'posts_collected': len(all_posts),
-        'newsletters_scanned': len(newsletters),
-        'posts': all_posts,
-        'research_intelligence': intelligence_analysis,
-        'generated_at': datetime.now().isoformat()
+
+    if not isinstance(max_concurrency, int) or max_concurrency < 1:
+        return {"error": "Input 'max_concurrency' must be a positive integer"}
+
+    if max_concurrency > MAX_CONCURRENCY:
+        print(f"⚠️ Capping max_concurrency from {max_concurrency} to {MAX_CONCURRENCY}")
+        max_concurrency = MAX_CONCURRENCY
+
+    if not isinstance(host_delay_seconds, (int, float)) or not 0 <= host_delay_seconds <= MAX_HOST_INTERVAL_SECONDS:
+        return {"error": f"Input 'host_delay_seconds' must be between 0 and {MAX_HOST_INTERVAL_SECONDS}"}
+
+    if not isinstance(host_delays, dict) or not all(
+        isinstance(host, str) and isinstance(delay, (int, float)) and 0 <= delay <= MAX_HOST_INTERVAL_SECONDS
+        for host, delay in host_delays.items()
+    ):
+        return {"error": f"Input 'host_delays' must map hostnames to delays between 0 and {MAX_HOST_INTERVAL_SECONDS}"}
+
+    if post_cache not in CACHE_POLICIES:
+        return {"error": f"Input 'post_cache' must be one of: {', '.join(CACHE_POLICIES)}"}
+
+    if extractor not in available_extractors():
+        return {"error": f"Input 'extractor' must be one of: {', '.join(available_extractors())}"}
+
+    if content_mode not in CONTENT_MODES:
+        return {"error": f"Input 'content_mode' must be one of: {', '.join(CONTENT_MODES)}"}
+
+    if not isinstance(feed_content_min_chars, int) or feed_content_min_chars < 0:
+        return {"error": "Input 'feed_content_min_chars' must be a non-negative integer"}
+
+    if cache_policy not in CACHE_POLICIES:
+        return {"error": f"Input 'cache_policy' must be one of: {', '.join(CACHE_POLICIES)}"}
+
+    if prompt_cache not in PROMPT_CACHE_MODES:
+        return {"error": f"Input 'prompt_cache' must be one of: {', '.join(PROMPT_CACHE_MODES)}"}
+
+    if analysis_mode not in ANALYSIS_MODES:
+        return {"error": f"Input 'analysis_mode' must be one of: {', '.join(ANALYSIS_MODES)}"}
+
+    if analysis_shard not in ANALYSIS_SHARDS:
+        return {"error": f"Input 'analysis_shard' must be one of: {', '.join(ANALYSIS_SHARDS)}"}
+
+    if not isinstance(analysis_parallelism, int) or analysis_parallelism < 1:
+        return {"error": "Input 'analysis_parallelism' must be a positive integer"}
+
+    if analysis_parallelism > MAX_ANALYSIS_PARALLELISM:
+        print(f"⚠️ Capping analysis_parallelism from {analysis_parallelism} to {MAX_ANALYSIS_PARALLELISM}")
+        analysis_parallelism = MAX_ANALYSIS_PARALLELISM
+
+    if not isinstance(prompt_token_budget, int) or not MIN_PROMPT_TOKEN_BUDGET <= prompt_token_budget <= MAX_PROMPT_TOKEN_BUDGET:
+        return {"error": f"Input 'prompt_token_budget' must be between {MIN_PROMPT_TOKEN_BUDGET} and {MAX_PROMPT_TOKEN_BUDGET}"}
+
+    if not isinstance(dedup, bool):
+        return {"error": "Input 'dedup' must be a boolean"}
+
+    if isinstance(dedup_threshold, bool) or not isinstance(dedup_threshold, (int, float)) or not 0 < dedup_threshold <= 1:
+        return {"error": "Input 'dedup_threshold' must be a number in (0, 1]"}
+
+    if not (isinstance(topic_query, str) or (
+        isinstance(topic_query, list) and all(isinstance(term, str) for term in topic_query)
+    )) or not query_terms(topic_query):
+        return {"error": "Input 'topic_query' must be a non-empty string or list of terms"}
+
+    if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1):
+        return {"error": "Input 'top_k' must be a positive integer"}
+
+    if rank_token_budget is not None and (
+        isinstance(rank_token_budget, bool) or not isinstance(rank_token_budget, int) or rank_token_budget < 1
+    ):
+        return {"error": "Input 'rank_token_budget' must be a positive integer"}
+
+    if not isinstance(metrics, bool) or not isinstance(metrics_log, bool):
+        return {"error": "Inputs 'metrics' and 'metrics_log' must be booleans"}
+
+    if deadline_seconds is not None and (
+        isinstance(deadline_seconds, bool) or not isinstance(deadline_seconds, (int, float))
+        or not MIN_DEADLINE_SECONDS <= deadline_seconds <= MAX_DEADLINE_SECONDS
+    ):
+        return {"error": f"Input 'deadline_seconds' must be between {MIN_DEADLINE_SECONDS} and {MAX_DEADLINE_SECONDS}"}
+
+    for name, paths in (('fields', fields), ('exclude_fields', exclude_fields)):
+        if paths is not None and (not isinstance(paths, list) or not all(
+            isinstance(path, str) and path and all(path.split('.')) for path in paths
+        )):
+            return {"error": f"Input '{name}' must be a list of field paths such as 'posts.title'"}
+
+    if not isinstance(use_sources_table, bool):
+        return {"error": "Input 'sources_table' must be a boolean"}
+
+    if encoding not in available_encodings():
+        return {"error": f"Input 'encoding' must be one of: {', '.join(available_encodings())}"}
+
+    if not isinstance(incremental, bool):
+        return {"error": "Input 'incremental' must be a boolean"}
+
+    if groups is not None:
+        if not isinstance(groups, dict) or not 0 < len(groups) <= MAX_BATCH_GROUPS or not all(
+            isinstance(name, str) and 0 < len(name) <= MAX_GROUP_NAME_LENGTH
+            and isinstance(urls, list) and 0 < len(urls) <= MAX_NEWSLETTERS and all(isinstance(url, str) for url in urls)
+            for name, urls in groups.items()
+        ):
+            return {"error": f"Input 'groups' must map 1 to {MAX_BATCH_GROUPS} group names to lists of 1 to {MAX_NEWSLETTERS} newsletter URLs"}
+        newsletters = list(dict.fromkeys(url for urls in groups.values() for url in urls))
+        if len(newsletters) > MAX_BATCH_NEWSLETTERS:
+            return {"error": f"Too many newsletters across groups. Max allowed: {MAX_BATCH_NEWSLETTERS}"}
+        if analysis_mode != 'single' or incremental:
+            return {"error": "Input 'groups' requires analysis_mode 'single' and no 'incremental'"}
+        groups = list(groups.items())
+
+    if state_key is not None and (not isinstance(state_key, str) or not 0 < len(state_key) <= MAX_STATE_KEY_LENGTH):
+        return {"error": f"Input 'state_key' must be a string of 1 to {MAX_STATE_KEY_LENGTH} characters"}
+    if state_key is None:
+        state_key = content_hash('state', sorted(newsletters))
+
+    rate_limiter = JobRateLimiter(
+        worker_rate_limiter,
+        default_interval=host_delay_seconds,
+        host_intervals=host_delays,
+        respect_crawl_delay=bool(respect_crawl_delay),
+    )
+
+    return {
+        'newsletters': newsletters,
+        'groups': groups,
+        'posts_per_newsletter': posts_per_newsletter,
+        'include_outreach_strategy': include_outreach_strategy,
+        'max_concurrency': max_concurrency,
+        'rate_limiter': rate_limiter,
+        'metrics': metrics,
+        'metrics_log': metrics_log,
+        'deadline_seconds': deadline_seconds,
+        'fields': fields,
+        'exclude_fields': exclude_fields,
+        'sources_table': use_sources_table,
+        'encoding': encoding,
+        'options': {
+            'post_cache': post_cache,
+            'extractor': extractor,
+            'content_mode': content_mode,
+            'feed_content_min_chars': feed_content_min_chars,
+            'cache_policy': cache_policy,
+            'prompt_cache': prompt_cache,
+            'analysis_mode': analysis_mode,
+            'analysis_shard': analysis_shard,
+            'analysis_parallelism': analysis_parallelism,
+            'prompt_token_budget': prompt_token_budget,
+            'dedup': dedup,
+            'dedup_threshold': dedup_threshold,
+            'topic_query': topic_query,
+            'top_k': top_k,
+            'rank_token_budget': rank_token_budget,
+            'incremental': incremental,
+            'state_key': state_key,
+        },
     }
+
+def handler(event):
+    """Main handler for RunPod serverless"""
     
-    # Generate outreach strategy if requested
-    if include_outreach_strategy and 'error' not in intelligence_analysis:
-        print(f"📧 Generating outreach strategies...")
-        outreach_strategy = generate_outreach_strategy(intelligence_analysis)
-        result['outreach_strategy'] = outreach_strategy
+    job = parse_job_input(event.get('input', {}))
+    if 'error' in job:
+        return job
+    newsletters = job['newsletters']
+
+    print(f"🔍 Starting research intelligence collection...")
+    print(f"📊 Targeting {len(newsletters)} newsletters, {job['posts_per_newsletter']} posts each")
     
+    stats = JobStats()
+    metrics = _job_metrics(job, event)
+    deadline, collect_deadline = _job_deadlines(job)
+
+    if job['groups'] is not None:
+        with job_scope(stats=stats, options=job['options'], metrics=metrics, deadline=deadline):
+            progress = batch_job(job, collect_deadline)
+            while True:
+                try:
+                    report_progress(event, next(progress))
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+        return shape_result(_finish_batch(result, job, stats, metrics), job)
+
+    with job_scope(stats=stats, options=job['options'], metrics=metrics, deadline=deadline):
+        with span('collect'), job_scope(deadline=collect_deadline):
+            all_posts = collect_posts(
+                newsletters, job['posts_per_newsletter'], job['max_concurrency'], job['rate_limiter']
+            )
+        with span('prepare'):
+            all_posts, analysis_posts, stage_stats = prepare_posts(all_posts)
+
+        print(f"🧠 Analyzing {len(analysis_posts)} posts with Claude...")
+
+        # Analyze with Claude for research intelligence
+        with span('analysis'):
+            intelligence_analysis = analyze_research_intelligence(analysis_posts)
+
+        result = {
+            'posts_collected': len(all_posts),
+            'newsletters_scanned': len(newsletters),
+            'posts': all_posts,
+            'research_intelligence': intelligence_analysis,
+            'generated_at': datetime.now().isoformat(),
+            **stage_stats
+        }
+
+        # Generate outreach strategy if requested
+        if job['include_outreach_strategy'] and 'error' not in intelligence_analysis:
+            print(f"📧 Generating outreach strategies...")
+            with span('outreach'):
+                outreach_strategy = generate_outreach_strategy(intelligence_analysis)
+            result['outreach_strategy'] = outreach_strategy
+
+        if job['options']['incremental']:
+            result['incremental_stats'] = _incremental_stats(
+                stats, intelligence_analysis, result.get('outreach_strategy')
+            )
+
+    result.update(_job_stats_summary(stats))
+    if job['metrics']:
+        result['metrics'] = metrics.summary()
+
     print(f"✨ Research intelligence complete!")
     
-    return result
+    return shape_result(result, job)
+
+def _stream_text(event: str, deltas: Generator[str, None, Dict]) -> Generator[Dict, None, Dict]:
+    """
+    Re-yield text deltas as stream events, coalescing them into chunks of at
+    least STREAM_CHUNK_CHARS (or STREAM_CHUNK_SECONDS apart) so the stream
+    stays compact. Returns the wrapped generator's result.
+    """
+    buffer = []
+    buffered = 0
+    flushed_at = time.monotonic()
+    while True:
+        try:
+            delta = next(deltas)
+        except StopIteration as stop:
+            if buffer:
+                yield {'event': event, 'text': ''.join(buffer)}
+            return stop.value
+
+        buffer.append(delta)
+        buffered += len(delta)
+        if buffered >= STREAM_CHUNK_CHARS or time.monotonic() - flushed_at >= STREAM_CHUNK_SECONDS:
+            yield {'event': event, 'text': ''.join(buffer)}
+            buffer = []
+            buffered = 0
+            flushed_at = time.monotonic()
+
+def _progress_events(progress: Generator[Dict, None, Dict]) -> Generator[Dict, None, Dict]:
+    """Re-yield a batch job's progress as 'progress' stream events, returning its result"""
+    while True:
+        try:
+            item = next(progress)
+        except StopIteration as stop:
+            return stop.value
+        yield {'event': 'progress', **item}
+
+def stream_handler(event):
+    """
+    Generator handler for RunPod's /stream endpoint.
+
+    Yields a 'started' event, a 'posts' event per newsletter as soon as it is
+    extracted (post metadata only, see STREAM_POST_FIELDS), the analysis and
+    outreach text as 'analysis' and 'outreach' chunks, and finally a 'result'
+    event whose 'result' is exactly what handler() returns for the same input.
+    """
+    job = parse_job_input(event.get('input', {}))
+    if 'error' in job:
+        yield {'event': 'result', 'result': job}
+        return
+    newsletters = job['newsletters']
+
+    yield {'event': 'started', 'newsletters': newsletters, 'posts_per_newsletter': job['posts_per_newsletter']}
+
+    stats = JobStats()
+    metrics = _job_metrics(job, event)
+    deadline, collect_deadline = _job_deadlines(job)
+
+    if job['groups'] is not None:
+        with job_scope(stats=stats, options=job['options'], metrics=metrics, deadline=deadline):
+            result = yield from _progress_events(batch_job(job, collect_deadline))
+        yield {'event': 'result', 'result': shape_result(_finish_batch(result, job, stats, metrics), job)}
+        return
+
+    with job_scope(stats=stats, options=job['options'], metrics=metrics, deadline=deadline):
+        results = {}
+        with span('collect'), job_scope(deadline=collect_deadline):
+            for index, posts in iter_newsletter_posts(
+                newsletters, job['posts_per_newsletter'], job['max_concurrency'], job['rate_limiter']
+            ):
+                results[index] = posts
+                yield {'event': 'posts', 'newsletter': newsletters[index], 'posts': [
+                    {field: post.get(field) for field in STREAM_POST_FIELDS} for post in posts
+                ]}
+        all_posts = [post for index in sorted(results) for post in results[index]]
+        with span('prepare'):
+            all_posts, analysis_posts, stage_stats = prepare_posts(all_posts)
+
+        with span('analysis'):
+            intelligence_analysis = yield from _stream_text('analysis', stream_research_intelligence(analysis_posts))
+
+        result = {
+            'posts_collected': len(all_posts),
+            'newsletters_scanned': len(newsletters),
+            'posts': all_posts,
+            'research_intelligence': intelligence_analysis,
+            'generated_at': datetime.now().isoformat(),
+            **stage_stats
+        }
+
+        if job['include_outreach_strategy'] and 'error' not in intelligence_analysis:
+            with span('outreach'):
+                result['outreach_strategy'] = yield from _stream_text(
+                    'outreach', stream_outreach_strategy(intelligence_analysis)
+                )
+
+        if job['options']['incremental']:
+            result['incremental_stats'] = _incremental_stats(
+                stats, intelligence_analysis, result.get('outreach_strategy')
+            )
+
+    result.update(_job_stats_summary(stats))
+    if job['metrics']:
+        result['metrics'] = metrics.summary()
+
+    yield {'event': 'result', 'result': shape_result(result, job)}
+
+def _warm_up_dns(hosts: List[str]) -> None:
+    for host in hosts:
+        try:
+            dns_cache.resolve(host)
+        except OSError as e:
+            print(f"Warm-up could not resolve {host}: {str(e)}")
+
+def _warm_up_parsers() -> None:
+    import feedparser
+
+    feedparser.parse(b'<rss version="2.0"><channel><title>warm-up</title><item><title>post</title>'
+                     b'<link>https://example.com/p/post</link></item></channel></rss>')
+    extractor = create_extractor(DEFAULT_EXTRACTOR, MAX_SCRAPED_CONTENT_LENGTH, 'text/html; charset=utf-8')
+    extractor.feed(b'<html><body><article><p>warm-up</p></article></body></html>')
+    extractor.close()
+    extract_fragment('<p>warm-up</p>', DEFAULT_EXTRACTOR, MAX_SCRAPED_CONTENT_LENGTH)
+
+def warm_up(hosts: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Pay first-job costs ahead of time: the deferred imports and parser set-up,
+    the pooled HTTP session, the cache databases and DNS entries for hosts
+    (default: RESEARCH_WARMUP_HOSTS, else the default newsletters and the
+    Anthropic API). Returns the milliseconds each step took; a failing step
+    is logged and skipped.
+    """
+    if hosts is None:
+        if WARMUP_HOSTS is not None:
+            hosts = [host.strip() for host in WARMUP_HOSTS.split(',') if host.strip()]
+        else:
+            hosts = [urlparse(url).hostname for url in RESEARCH_TARGETS.values()]
+            hosts.append(urlparse(claude_utils.ANTHROPIC_API_URL).hostname)
+
+    steps = (
+        ('parsers', _warm_up_parsers),
+        ('session', get_session),
+        ('caches', lambda: (_post_store.get('warm-up'), claude_utils._response_cache.get('warm-up'))),
+        ('dns', lambda: _warm_up_dns(hosts)),
+    )
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {str(e)}")
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🔥 Warm-up done: {json.dumps(timings)}")
+    return timings
+
+def import_runpod():
+    """
+    Import the runpod SDK, which takes seconds and is only needed to run the
+    worker loop, so importing handler for tests, benchmarks or warm-up stays
+    cheap.
+    """
+    import runpod
+    return runpod
+
+if WARMUP_ENABLED:
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+def concurrency_modifier(current_concurrency: int) -> int:
+    """RunPod concurrency modifier: how many jobs this worker takes at once"""
+    return WORKER_JOB_CONCURRENCY
+
+async def async_handler(event):
+    """
+    Async handler for RunPod: runs the blocking handler on the worker's job
+    pool so the event loop can pick up further jobs meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_job_executor, handler, event)
+
+async def async_stream_handler(event):
+    """Async generator counterpart of stream_handler for concurrent workers"""
+    loop = asyncio.get_running_loop()
+    events = stream_handler(event)
+    # Step the generator in one context so its job_scope spans every step
+    context = contextvars.copy_context()
+    while True:
+        item = await loop.run_in_executor(_job_executor, context.run, next, events, None)
+        if item is None:
+            return
+        yield item
 
 # Start the serverless worker
 if __name__ == '__main__':
-    runpod.serverless.start({'handler': handler})
+    runpod = import_runpod()
+    config = {'concurrency_modifier': concurrency_modifier}
+    if STREAMING_ENABLED:
+        # /stream yields the events as they happen; /run and /runsync return
+        # them all as a list whose final 'result' event holds the handler()
+        # result (without aggregation they would return no output at all)
+        config['handler'] = async_stream_handler
+        config['return_aggregate_stream'] = True
+    else:
+        config['handler'] = async_handler
+    runpod.serverless.start(config)
@@ -0,0 +1,390 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, NewConnectionError
+from urllib3.util.retry import Retry
+
+import security_utils
+from job_context import WorkSkipped, incr, request_timeout, time_left, MIN_REQUEST_SECONDS
+from security_utils import is_safe_url, UnsafeAddressError
+
+USER_AGENT = 'Mozilla/5.0 (compatible; AI Research Bot/1.0)'
+
+# Connection pooling
+POOL_CONNECTIONS = 32  # Number of distinct host pools kept alive
+POOL_MAXSIZE_PER_HOST = 8  # Keep-alive connections per host
+HOST_POOL_SIZES = {
+    'https://api.anthropic.com': 8,
+}
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504, 529)
+
+# Transport retries: exponential backoff plus up to RETRY_BACKOFF_JITTER
+# seconds of random jitter, so hosts are not retried in lockstep, with a
+# server's Retry-After capped at RETRY_AFTER_MAX_SECONDS (Retry's
+# retry_after_max needs urllib3 2.6.3; see requirements.txt)
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_BACKOFF_JITTER = 0.5
+RETRY_AFTER_MAX_SECONDS = 10
+
+# Per-host circuit breaker: after this many consecutive failures a host is
+# skipped for the cooldown, then a single trial request decides whether it
+# closes again
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 60.0
+
+try:
+    import brotli  # noqa: F401 - enables br decoding in urllib3
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+# Politeness defaults
+DEFAULT_HOST_INTERVAL_SECONDS = 1.0
+MAX_HOST_INTERVAL_SECONDS = 30.0
+MAX_ROBOTS_TXT_BYTES = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+# Base URLs whose callers retry statuses themselves (see mount_caller_retries)
+_caller_retry_prefixes = set()
+
+class _PinnedConnectionMixin:
+    """Connect to the address vetted by security_utils instead of resolving again"""
+
+    def _new_conn(self):
+        hostname = self._dns_host
+        try:
+            address = security_utils.resolve_vetted(hostname)
+        except socket.gaierror as e:
+            raise NameResolutionError(hostname, self, e) from e
+        except UnsafeAddressError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+        # Only the socket connect uses the pinned address; TLS SNI, certificate
+        # checks and the Host header still see the original hostname
+        self._dns_host = address
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = hostname
+
+class PinnedHTTPConnection(_PinnedConnectionMixin, HTTPConnection):
+    pass
+
+class PinnedHTTPSConnection(_PinnedConnectionMixin, HTTPSConnection):
+    pass
+
+class _JobCountingPoolMixin:
+    """
+    Count requests and new connections against the job that made them; the
+    pools are shared by concurrent jobs, so their own counters are worker-wide
+    """
+
+    def _new_conn(self):
+        incr('connections', 'new_connections')
+        return super()._new_conn()
+
+    def _make_request(self, *args, **kwargs):
+        incr('connections', 'requests')
+        return super()._make_request(*args, **kwargs)
+
+class PinnedHTTPConnectionPool(_JobCountingPoolMixin, HTTPConnectionPool):
+    ConnectionCls = PinnedHTTPConnection
+
+class PinnedHTTPSConnectionPool(_JobCountingPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = PinnedHTTPSConnection
+
+class PinnedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections are pinned to vetted, cached DNS results"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': PinnedHTTPConnectionPool,
+            'https': PinnedHTTPSConnectionPool,
+        }
+
+def _make_adapter(pool_maxsize: int, status_retries: bool = True) -> HTTPAdapter:
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=1,
+        status=2,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        backoff_jitter=RETRY_BACKOFF_JITTER,
+        retry_after_max=RETRY_AFTER_MAX_SECONDS,
+        status_forcelist=RETRY_STATUS_CODES if status_retries else None,
+        # POST is not idempotent: a read timeout may come after the server
+        # acted on it, so only its caller may decide to send it again
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False,
+    )
+    return PinnedHTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize, max_retries=retry)
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide pooled session.
+    It is created on first use and kept for the life of the worker, so warm
+    workers reuse keep-alive connections across jobs.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update({
+                    'User-Agent': USER_AGENT,
+                    'Accept-Encoding': ACCEPT_ENCODING,
+                })
+                session.mount('https://', _make_adapter(POOL_MAXSIZE_PER_HOST))
+                session.mount('http://', _make_adapter(POOL_MAXSIZE_PER_HOST))
+                for prefix, pool_size in HOST_POOL_SIZES.items():
+                    session.mount(prefix, _make_adapter(pool_size))
+                _session = session
+    return _session
+
+def mount_caller_retries(base_url: str) -> None:
+    """
+    Send requests to base_url through an adapter without status retries,
+    for callers that retry statuses themselves (deadline-aware), so the two
+    layers do not multiply. Mounted once per base URL by swapping in a new
+    adapter map, leaving lookups already running on other threads alone.
+    """
+    if base_url in _caller_retry_prefixes:
+        return
+    session = get_session()
+    with _session_lock:
+        if base_url in _caller_retry_prefixes:
+            return
+        adapters = OrderedDict(session.adapters)
+        adapters[base_url] = _make_adapter(HOST_POOL_SIZES.get(base_url, POOL_MAXSIZE_PER_HOST), status_retries=False)
+        # requests picks the first matching prefix, so keep the longest first
+        session.adapters = OrderedDict(sorted(adapters.items(), key=lambda item: -len(item[0])))
+        _caller_retry_prefixes.add(base_url)
+
+def job_connection_stats(counts: Dict[str, int]) -> Dict[str, int]:
+    """One job's request/connection counters, from its 'connections' stats section"""
+    requests_sent = counts.get('requests', 0)
+    new_connections = counts.get('new_connections', 0)
+    return {
+        'requests': requests_sent,
+        'new_connections': new_connections,
+        'reused': max(requests_sent - new_connections, 0),
+    }
+
+def retry_count(response) -> int:
+    """Number of retries urllib3 made before this response"""
+    history = getattr(getattr(getattr(response, 'raw', None), 'retries', None), 'history', None)
+    return len(history) if isinstance(history, tuple) else 0
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker keyed by hostname. A host that fails
+    failure_threshold times in a row is open (skipped) for cooldown seconds;
+    after that one trial request is let through, and its outcome closes the
+    circuit or opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+        self._trials = set()
+        self._lock = threading.Lock()
+
+    def allow(self, host: str) -> bool:
+        """Whether a request to host may go ahead now"""
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return True
+            if self._clock() < open_until or host in self._trials:
+                return False
+            self._trials.add(host)
+            return True
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+            self._trials.discard(host)
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            self._trials.discard(host)
+            if failures >= self.failure_threshold:
+                self._open_until[host] = self._clock() + self.cooldown
+
+    def open_hosts(self) -> Dict[str, float]:
+        """Hosts currently skipped, with the seconds left in their cooldown"""
+        with self._lock:
+            now = self._clock()
+            return {host: round(until - now, 1) for host, until in self._open_until.items() if until > now}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._failures.clear()
+            self._open_until.clear()
+            self._trials.clear()
+
+# Kept for the life of the worker, so a host failing in one job is skipped by the next
+host_breaker = CircuitBreaker()
+
+@contextmanager
+def guarded_get(session: requests.Session, url: str, timeout: float, **kwargs):
+    """
+    session.get(url) as a context manager, with timeout capped to the job's
+    time left. Raises WorkSkipped instead of sending the request when the
+    deadline is too close or the host's circuit is open. Connection errors,
+    timeouts and retryable statuses count as host failures.
+    """
+    host = (urlparse(url).hostname or '').lower()
+    timeout = request_timeout(timeout)
+    if not host_breaker.allow(host):
+        raise WorkSkipped('circuit_open')
+
+    try:
+        with session.get(url, timeout=timeout, **kwargs) as response:
+            if response.status_code in RETRY_STATUS_CODES:
+                host_breaker.record_failure(host)
+            else:
+                host_breaker.record_success(host)
+            yield response
+    except requests.RequestException:
+        host_breaker.record_failure(host)
+        raise
+
+def read_limited(response: requests.Response, max_bytes: int, chunk_size: int = 8192) -> bytes:
+    """Read a streamed response body, stopping once max_bytes have been read"""
+    chunks = []
+    total = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        chunks.append(chunk)
+        total += len(chunk)
+        if total >= max_bytes:
+            break
+    return b"".join(chunks)[:max_bytes]
+
+def fetch_robots_txt(scheme: str, host: str) -> str:
+    """Fetch robots.txt for a host, returning an empty string on any failure"""
+    robots_url = f"{scheme}://{host}/robots.txt"
+    if not is_safe_url(robots_url):
+        return ""
+
+    try:
+        with get_session().get(robots_url, timeout=5, stream=True) as response:
+            if response.status_code != 200:
+                return ""
+            body = response.raw.read(MAX_ROBOTS_TXT_BYTES, decode_content=True)
+            return body.decode('utf-8', errors='replace')
+    except Exception as e:
+        print(f"Error fetching {robots_url}: {str(e)}")
+        return ""
+
+class HostRateLimiter:
+    """
+    Minimum-interval throttle keyed by hostname.
+    Requests to different hosts never wait on each other; requests to the same
+    host are spaced at least `interval_for(host)` seconds apart, or the
+    caller's min_interval when that is larger.
+    """
+
+    def __init__(self, default_interval: float = DEFAULT_HOST_INTERVAL_SECONDS,
+                 host_intervals: Optional[Dict[str, float]] = None,
+                 respect_crawl_delay: bool = False,
+                 robots_fetcher: Callable[[str, str], str] = fetch_robots_txt):
+        self.default_interval = default_interval
+        self.host_intervals = {host.lower(): delay for host, delay in (host_intervals or {}).items()}
+        self.respect_crawl_delay = respect_crawl_delay
+        self._robots_fetcher = robots_fetcher
+        self._crawl_delays: Dict[str, Optional[float]] = {}
+        self._last_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _crawl_delay(self, scheme: str, host: str) -> Optional[float]:
+        with self._lock:
+            if host in self._crawl_delays:
+                return self._crawl_delays[host]
+
+        parser = RobotFileParser()
+        parser.parse(self._robots_fetcher(scheme, host).splitlines())
+        delay = parser.crawl_delay(USER_AGENT) or parser.crawl_delay('*')
+        delay = float(delay) if delay is not None else None
+
+        with self._lock:
+            self._crawl_delays[host] = delay
+        return delay
+
+    def interval_for(self, host: str, scheme: str = 'https') -> float:
+        """Return the minimum spacing between requests to host, in seconds"""
+        host = host.lower()
+        interval = self.host_intervals.get(host, self.default_interval)
+        if self.respect_crawl_delay:
+            crawl_delay = self._crawl_delay(scheme, host)
+            if crawl_delay is not None:
+                interval = max(interval, crawl_delay)
+        return min(interval, MAX_HOST_INTERVAL_SECONDS)
+
+    def wait(self, url: str, min_interval: float = 0.0) -> float:
+        """
+        Block until a request to url's host is allowed. Returns seconds waited.
+        Raises WorkSkipped('deadline'), without taking the slot, when the
+        slot would leave less than MIN_REQUEST_SECONDS before the job's deadline.
+        """
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+        if not host:
+            return 0.0
+
+        interval = max(self.interval_for(host, parsed.scheme or 'https'), min_interval)
+
+        # Reserve the slot under the lock, sleep outside it so other hosts
+        # are not held up
+        with self._lock:
+            now = time.monotonic()
+            last = self._last_slot.get(host)
+            slot = now if last is None else max(now, last + interval)
+            left = time_left()
+            if left is not None and slot - now + MIN_REQUEST_SECONDS > left:
+                raise WorkSkipped('deadline')
+            self._last_slot[host] = slot
+
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+class JobRateLimiter(HostRateLimiter):
+    """
+    One job's intervals applied on a worker-wide HostRateLimiter.
+    Concurrent jobs share the worker's per-host slots, so the host sees one
+    request stream; each request is spaced by the larger of the worker's
+    interval and the requesting job's.
+    """
+
+    def __init__(self, shared: HostRateLimiter, **kwargs):
+        super().__init__(**kwargs)
+        self.shared = shared
+
+    def wait(self, url: str, min_interval: float = 0.0) -> float:
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+        if not host:
+            return 0.0
+        interval = max(self.interval_for(host, parsed.scheme or 'https'), min_interval)
+        return self.shared.wait(url, min_interval=interval)
@@ -0,0 +1,248 @@
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# Per-job state. Worker threads see the submitting job's values because
+# work is submitted through submit(), which copies the caller's context.
+_fetch_slots = contextvars.ContextVar('fetch_slots', default=None)
+_host_limiter = contextvars.ContextVar('host_limiter', default=None)
+_job_stats = contextvars.ContextVar('job_stats', default=None)
+_job_options = contextvars.ContextVar('job_options', default={})
+_job_metrics = contextvars.ContextVar('job_metrics', default=None)
+_job_deadline = contextvars.ContextVar('job_deadline', default=None)
+
+# Requests are not started with less time than this left before the deadline
+MIN_REQUEST_SECONDS = 1.0
+
+class WorkSkipped(Exception):
+    """Work dropped before it started; reason is 'deadline' or 'circuit_open'"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class JobStats:
+    """Thread-safe per-job counters and records, grouped into sections"""
+
+    def __init__(self):
+        self._sections: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, section: str, key: str, value: Any) -> None:
+        with self._lock:
+            self._sections.setdefault(section, {})[key] = value
+
+    def incr(self, section: str, key: str, amount: float = 1) -> None:
+        with self._lock:
+            values = self._sections.setdefault(section, {})
+            values[key] = values.get(key, 0) + amount
+
+    def section(self, section: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._sections.get(section, {}))
+
+class Span:
+    """Measures (summed) and tags (counted) attached to one timed span"""
+    __slots__ = ('measures', 'tags')
+
+    def __init__(self):
+        self.measures: Dict[str, float] = {}
+        self.tags: Dict[str, str] = {}
+
+    def add(self, name: str, amount: float = 1) -> None:
+        self.measures[name] = self.measures.get(name, 0) + amount
+
+    def tag(self, name: str, value: Any) -> None:
+        self.tags[name] = str(value)
+
+class _NullSpan:
+    """Span handed out when metrics are off; every call is a no-op"""
+    __slots__ = ()
+
+    def add(self, name: str, amount: float = 1) -> None:
+        pass
+
+    def tag(self, name: str, value: Any) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class JobMetrics:
+    """
+    Per-job span aggregates by stage: count, total and max wall time, summed
+    measures (bytes, tokens, retries) and counted tags (cache status, errors).
+    With log=True every span is also printed as one JSON line.
+    """
+
+    def __init__(self, job_id: Optional[str] = None, log: bool = False):
+        self.job_id = job_id
+        self.log = log
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def observe(self, stage: str, seconds: float, measures: Dict[str, float],
+                tags: Dict[str, str], labels: Dict[str, Any]) -> None:
+        with self._lock:
+            totals = self._stages.setdefault(stage, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            totals['count'] += 1
+            totals['total_ms'] += seconds * 1000
+            totals['max_ms'] = max(totals['max_ms'], seconds * 1000)
+            for name, amount in measures.items():
+                totals[name] = totals.get(name, 0) + amount
+            for name, value in tags.items():
+                counts = totals.setdefault(name, {})
+                counts[value] = counts.get(value, 0) + 1
+
+        if self.log:
+            print(json.dumps({
+                'event': 'span',
+                'job_id': self.job_id,
+                'stage': stage,
+                'ms': round(seconds * 1000, 2),
+                **labels,
+                **measures,
+                **tags,
+            }, default=str), flush=True)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {
+                    name: round(value, 2) if isinstance(value, float) else value
+                    for name, value in totals.items()
+                }
+                for stage, totals in self._stages.items()
+            }
+        return {'wall_ms': round((time.perf_counter() - self._started) * 1000, 2), 'stages': stages}
+
+@contextmanager
+def span(stage: str, **labels: Any):
+    """
+    Time the block as one span of the given stage in the current job's
+    metrics. Yields a Span for measures and tags; labels (e.g. url) only go
+    to the JSON log. Costs one context lookup when metrics are off.
+    """
+    metrics = _job_metrics.get()
+    if metrics is None:
+        yield _NULL_SPAN
+        return
+
+    current = Span()
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.tag('error', type(e).__name__)
+        raise
+    finally:
+        metrics.observe(stage, time.perf_counter() - started, current.measures, current.tags, labels)
+
+def record_span(stage: str, seconds: float, **measures: float) -> None:
+    """Record a span timed by the caller, e.g. interleaved download and parse time"""
+    metrics = _job_metrics.get()
+    if metrics is not None:
+        metrics.observe(stage, seconds, measures, {}, {})
+
+def metrics_enabled() -> bool:
+    return _job_metrics.get() is not None
+
+def submit(executor: Executor, fn, *args, **kwargs) -> Future:
+    """Submit fn to executor, carrying over the caller's job context"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+@contextmanager
+def job_scope(max_concurrency: Optional[int] = None, rate_limiter=None, stats: Optional[JobStats] = None,
+              options: Optional[Dict[str, Any]] = None, metrics: Optional[JobMetrics] = None,
+              deadline: Optional[float] = None):
+    """
+    Install the given per-job state for the duration of the block. deadline
+    is a time.monotonic() value; a nested scope can only tighten it.
+    """
+    tokens = []
+    if options is not None:
+        tokens.append((_job_options, _job_options.set({**_job_options.get(), **options})))
+    if max_concurrency is not None:
+        tokens.append((_fetch_slots, _fetch_slots.set(threading.BoundedSemaphore(max_concurrency))))
+    if rate_limiter is not None:
+        tokens.append((_host_limiter, _host_limiter.set(rate_limiter)))
+    if stats is not None:
+        tokens.append((_job_stats, _job_stats.set(stats)))
+    if metrics is not None:
+        tokens.append((_job_metrics, _job_metrics.set(metrics)))
+    if deadline is not None:
+        current = _job_deadline.get()
+        tokens.append((_job_deadline, _job_deadline.set(deadline if current is None else min(current, deadline))))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+@contextmanager
+def fetch_slot(url: Optional[str] = None):
+    """
+    Wait for url's host to be free, then hold one of the job's concurrency
+    slots. Raises WorkSkipped('deadline') when either wait would run past
+    the point where a request still fits before the job's deadline.
+    """
+    with span('fetch_wait'):
+        limiter = _host_limiter.get()
+        if limiter is not None and url:
+            limiter.wait(url)
+
+        slots = _fetch_slots.get()
+        if slots is not None:
+            left = time_left()
+            if left is None:
+                slots.acquire()
+            elif not slots.acquire(timeout=max(0.0, left - MIN_REQUEST_SECONDS)):
+                raise WorkSkipped('deadline')
+
+    try:
+        yield
+    finally:
+        if slots is not None:
+            slots.release()
+
+def time_left() -> Optional[float]:
+    """Seconds until the current job's deadline, or None when it has none"""
+    deadline = _job_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def request_timeout(timeout: float) -> float:
+    """
+    timeout capped to the time left before the job's deadline. Raises
+    WorkSkipped('deadline') when less than MIN_REQUEST_SECONDS are left.
+    """
+    left = time_left()
+    if left is None:
+        return timeout
+    if left < MIN_REQUEST_SECONDS:
+        raise WorkSkipped('deadline')
+    return min(timeout, left)
+
+def option(name: str, default: Any = None) -> Any:
+    """Look up a validated job input option for the current job"""
+    return _job_options.get().get(name, default)
+
+def current_stats() -> Optional[JobStats]:
+    return _job_stats.get()
+
+def record(section: str, key: str, value: Any) -> None:
+    """Record a value in the current job's stats; no-op outside a job"""
+    stats = _job_stats.get()
+    if stats is not None:
+        stats.record(section, key, value)
+
+def incr(section: str, key: str, amount: float = 1) -> None:
+    """Increment a counter in the current job's stats; no-op outside a job"""
+    stats = _job_stats.get()
+    if stats is not None:
+        stats.incr(section, key, amount)
@@ -0,0 +1,115 @@
+import base64
+import gzip
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional zstd encoding: pip install zstandard
+    zstandard = None
+
+# Per-post metadata moved into the shared sources table
+SOURCE_FIELDS = ('source', 'author', 'scraped_at')
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    'gzip': lambda body: gzip.compress(body, compresslevel=6),
+}
+DECOMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    'gzip': gzip.decompress,
+}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda body: zstandard.ZstdCompressor(level=10).compress(body)
+    DECOMPRESSORS['zstd'] = lambda body: zstandard.ZstdDecompressor().decompress(body)
+
+def available_encodings() -> List[str]:
+    return ['json', *COMPRESSORS]
+
+def json_size(value: Any) -> int:
+    """Bytes of value serialised the way the response is"""
+    return len(json.dumps(value, default=str).encode('utf-8'))
+
+def _include(value: Any, paths: List[List[str]]) -> Any:
+    if isinstance(value, list):
+        return [_include(item, paths) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    children: Dict[str, List[List[str]]] = {}
+    for path in paths:
+        children.setdefault(path[0], []).append(path[1:])
+    projected = {}
+    for key, item in value.items():
+        if key not in children:
+            continue
+        rest = children[key]
+        projected[key] = item if any(not path for path in rest) else _include(item, rest)
+    return projected
+
+def _exclude(value: Any, path: List[str]) -> Any:
+    if isinstance(value, list):
+        return [_exclude(item, path) for item in value]
+    if not isinstance(value, dict) or path[0] not in value:
+        return value
+    if len(path) == 1:
+        return {key: item for key, item in value.items() if key != path[0]}
+    return {**value, path[0]: _exclude(value[path[0]], path[1:])}
+
+def project(result: Dict, fields: Optional[List[str]] = None, exclude: Optional[List[str]] = None) -> Dict:
+    """
+    Keep only the dotted paths in fields (all when None), then drop the ones
+    in exclude. Paths step into every item of a list, so 'posts.title' keeps
+    each post's title and exclude ['posts.full_content'] drops each body.
+    """
+    if fields is not None:
+        result = _include(result, [path.split('.') for path in fields])
+    for path in exclude or ():
+        result = _exclude(result, path.split('.'))
+    return result
+
+def sources_table(posts: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Move each post's source, author and scraped_at into a shared table of
+    unique (source, author) entries, leaving a 'source_id' index on the post
+    and on every copy listed under a deduplicated post's 'sources'. The
+    table keeps the earliest scraped_at for its entry. Returns (posts, table).
+    """
+    table: List[Dict] = []
+    index: Dict[Tuple, int] = {}
+
+    def source_id(item: Dict) -> int:
+        key = (item.get('source'), item.get('author'))
+        if key not in index:
+            index[key] = len(table)
+            table.append({'source': key[0], 'author': key[1]})
+        entry = table[index[key]]
+        scraped_at = item.get('scraped_at')
+        if scraped_at and (entry.get('scraped_at') is None or scraped_at < entry['scraped_at']):
+            entry['scraped_at'] = scraped_at
+        return index[key]
+
+    compacted = []
+    for post in posts:
+        if not any(field in post for field in SOURCE_FIELDS):
+            compacted.append(post)
+            continue
+        item = {key: value for key, value in post.items() if key not in SOURCE_FIELDS}
+        item['source_id'] = source_id(post)
+        if isinstance(post.get('sources'), list):
+            item['sources'] = [
+                {**{key: value for key, value in copy.items() if key not in SOURCE_FIELDS},
+                 'source_id': source_id(copy)}
+                for copy in post['sources']
+            ]
+        compacted.append(item)
+    return compacted, table
+
+def encode_result(result: Dict, encoding: str) -> Dict[str, str]:
+    """Compress result's compact JSON and wrap it as {'encoding': '<name>+base64', 'payload': ...}"""
+    body = json.dumps(result, separators=(',', ':'), default=str).encode('utf-8')
+    payload = base64.b64encode(COMPRESSORS[encoding](body)).decode('ascii')
+    return {'encoding': f'{encoding}+base64', 'payload': payload}
+
+def decode_result(envelope: Dict) -> Dict:
+    """Inverse of encode_result, for clients and tests"""
+    encoding = envelope['encoding'].split('+')[0]
+    return json.loads(DECOMPRESSORS[encoding](base64.b64decode(envelope['payload'])))
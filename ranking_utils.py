@@ -0,0 +1,71 @@
+import math
+import re
+from collections import Counter
+from typing import List, Union
+
+# Default topic for "The Papers That Dream": seed vocabulary, not a sentence
+DEFAULT_TOPIC_QUERY = (
+    "consciousness conscious sentience sentient subjective experience qualia mind minds "
+    "self-awareness introspection feelings emotions empathy personhood moral patienthood "
+    "human-AI relationships companionship trust loneliness collaboration storytelling "
+    "philosophy uncertainty wonder meaning identity agency understanding"
+)
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'with',
+}
+SUFFIXES = ('ness', 'ing', 'ed', 'ly')
+
+def _stem(word: str) -> str:
+    """
+    Light stemming so 'minds'/'mind', 'stories'/'story' and
+    'consciousness'/'conscious' match: drop a plural, then one common suffix.
+    """
+    if word.endswith('ies') and len(word) > 4:
+        word = word[:-3] + 'y'
+    elif word.endswith('s') and not word.endswith(('ss', 'us', 'is')) and len(word) > 3:
+        word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(word) for word in WORD_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+def query_terms(query: Union[str, List[str]]) -> List[str]:
+    """Unique stemmed terms of a query string or list of seed terms, in order"""
+    if isinstance(query, list):
+        query = ' '.join(query)
+    return list(dict.fromkeys(tokenize(query)))
+
+def bm25_scores(documents: List[str], query: Union[str, List[str]],
+                k1: float = BM25_K1, b: float = BM25_B) -> List[float]:
+    """Okapi BM25 score of each document against the query terms"""
+    terms = query_terms(query)
+    if not documents or not terms:
+        return [0.0] * len(documents)
+
+    term_set = set(terms)
+    tokenized = [tokenize(document) for document in documents]
+    lengths = [len(tokens) for tokens in tokenized]
+    average_length = (sum(lengths) / len(lengths)) or 1.0
+
+    frequencies = [Counter(token for token in tokens if token in term_set) for tokens in tokenized]
+    document_frequency = Counter(term for counts in frequencies for term in counts)
+    idf = {
+        term: math.log(1 + (len(documents) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+        for term in terms
+    }
+
+    scores = []
+    for counts, length in zip(frequencies, lengths):
+        norm = k1 * (1 - b + b * length / average_length)
+        scores.append(sum(idf[term] * count * (k1 + 1) / (count + norm) for term, count in counts.items()))
+    return scores
@@ -1,12 +1,118 @@
 import ipaddress
 import socket
+import threading
+import time
+from typing import Dict, List, Tuple
 from urllib.parse import urlparse
 
+from job_context import incr, span
+
+# DNS cache lifetimes (seconds)
+DNS_CACHE_TTL_SECONDS = 300
+DNS_NEGATIVE_TTL_SECONDS = 30
+DNS_CACHE_MAX_ENTRIES = 1024
+
+class UnsafeAddressError(OSError):
+    """Raised when a hostname resolves to an address we refuse to connect to"""
+
+def _is_public_ip(ip) -> bool:
+    if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
+        return False
+    if ip.is_multicast:
+        return False
+    return True
+
+class DNSCache:
+    """
+    TTL-bounded cache of getaddrinfo results shared by the SSRF check and the
+    HTTP connection layer, so each host is resolved once per TTL and the
+    connection goes to the same addresses that were vetted.
+    """
+
+    def __init__(self, ttl: float = DNS_CACHE_TTL_SECONDS, negative_ttl: float = DNS_NEGATIVE_TTL_SECONDS,
+                 max_entries: int = DNS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, hostname: str) -> List[str]:
+        """Return the addresses for hostname (IPv4 first). Raises socket.gaierror."""
+        hostname = hostname.lower()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(hostname)
+        if entry is not None and entry[0] > now:
+            incr('dns', 'hits')
+            if not entry[1]:
+                raise socket.gaierror(socket.EAI_NONAME, f"cached resolution failure for {hostname}")
+            return entry[1]
+
+        incr('dns', 'misses')
+        started = time.monotonic()
+        try:
+            addr_info = socket.getaddrinfo(hostname, None)
+        except socket.gaierror:
+            self._store(hostname, [], self.negative_ttl)
+            raise
+        finally:
+            incr('dns', 'resolve_seconds', time.monotonic() - started)
+
+        addr_info.sort(key=lambda info: info[0] != socket.AF_INET)
+        addresses = list(dict.fromkeys(sockaddr[0] for _, _, _, _, sockaddr in addr_info))
+        self._store(hostname, addresses, self.ttl)
+        return addresses
+
+    def _store(self, hostname: str, addresses: List[str], ttl: float) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {host: entry for host, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[hostname] = (time.monotonic() + ttl, addresses)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+dns_cache = DNSCache()
+
+def resolve_vetted(hostname: str) -> str:
+    """
+    Resolve hostname through the shared DNS cache and return an address that
+    passed the same checks as is_safe_url. Connections are pinned to this
+    address, which closes the DNS rebinding gap between check and connect.
+    """
+    try:
+        ip = ipaddress.ip_address(hostname.strip('[]'))
+        if not _is_public_ip(ip):
+            raise UnsafeAddressError(f"Refusing to connect to non-public address {hostname}")
+        return str(ip)
+    except ValueError:
+        pass
+
+    if hostname.lower() in ('localhost',):
+        raise UnsafeAddressError(f"Refusing to connect to {hostname}")
+
+    addresses = dns_cache.resolve(hostname)
+    for address in addresses:
+        if not _is_public_ip(ipaddress.ip_address(address)):
+            raise UnsafeAddressError(f"{hostname} resolves to non-public address {address}")
+    return addresses[0]
+
 def is_safe_url(url: str) -> bool:
     """
     Validates a URL to prevent SSRF attacks.
     Checks if the URL scheme is http/https and if the hostname resolves to a public IP.
     """
+    with span('url_check', url=url) as check:
+        safe = _check_url(url)
+        check.tag('result', 'safe' if safe else 'blocked')
+    return safe
+
+def _check_url(url: str) -> bool:
     try:
         parsed = urlparse(url)
     except Exception:
@@ -22,31 +128,22 @@ def is_safe_url(url: str) -> bool:
     # Check if hostname is an IP address
     try:
         ip = ipaddress.ip_address(hostname)
-        if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
-            return False
-        if ip.is_multicast:
-            return False
-        return True
+        return _is_public_ip(ip)
     except ValueError:
-        # Hostname is a domain, we need to be careful about DNS rebinding.
-        # Ideally, we would resolve here and use the IP for the request.
-        # Since we can't easily patch requests/feedparser to use a specific IP without
-        # complex changes, we will do a best-effort check here.
+        # Hostname is a domain. The resolution is cached and the HTTP layer
+        # pins connections to the vetted address (see resolve_vetted), so a
+        # DNS rebind between this check and the request has no effect.
         pass
 
     if hostname.lower() in ('localhost',):
         return False
 
-    # Optional: Resolve the domain to check if it points to a private IP.
+    # Resolve the domain to check if it points to a private IP.
     # This protects against domains configured to point to 127.0.0.1 etc.
     try:
         # valid domains can still resolve to private IPs
-        addr_info = socket.getaddrinfo(hostname, None)
-        for _, _, _, _, sockaddr in addr_info:
-            ip = ipaddress.ip_address(sockaddr[0])
-            if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
-                return False
-            if ip.is_multicast:
+        for address in dns_cache.resolve(hostname):
+            if not _is_public_ip(ipaddress.ip_address(address)):
                 return False
     except socket.gaierror:
         # If we can't resolve it, it's safer to reject, or accept and let the request fail.
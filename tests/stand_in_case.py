@@ -0,0 +1,50 @@
+import os
+import sys
+import unittest
+from typing import Any, Dict
+from unittest.mock import patch
+import handler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from stand_ins import StandInConfig, StandInServer  # noqa: E402
+
+class StandInTestCase(unittest.TestCase):
+    """
+    Base for tests running the real handler against the local newsletter and
+    Messages API stand-ins (benchmarks/stand_ins.py). Each test starts its
+    own server with start_server(); server_config holds the class defaults.
+    """
+
+    server_config: Dict[str, Any] = {}
+
+    def setUp(self):
+        handler._feed_cache.clear()
+        self.addCleanup(handler._feed_cache.clear)
+        # The SSRF guard refuses loopback; let these tests reach the stand-ins
+        self.patch('handler.is_safe_url', lambda url: True)
+        self.patch('security_utils.resolve_vetted', lambda host: host)
+        self.patch('handler.ANTHROPIC_API_KEY', 'stand-in')
+
+    def patch(self, target: str, value: Any) -> None:
+        patcher = patch(target, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start_server(self, **config) -> StandInServer:
+        self.server = StandInServer(StandInConfig(**{**self.server_config, **config})).start()
+        self.addCleanup(self.server.stop)
+        self.patch('claude_utils.ANTHROPIC_API_URL', self.server.base_url)
+        return self.server
+
+    def job_input(self, newsletters: int = 2, **job_input) -> Dict[str, Any]:
+        """Input for a scrape job over the first newsletters, with no host delay and caches bypassed"""
+        return {
+            'newsletters': [f'{self.server.base_url}/n{i}' for i in range(newsletters)],
+            'posts_per_newsletter': 2,
+            'host_delay_seconds': 0,
+            'content_mode': 'scrape',
+            'cache_policy': 'bypass',
+            'post_cache': 'bypass',
+            **job_input,
+        }
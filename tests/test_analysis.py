@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import handler
+from claude_utils import ClaudeAPIError, prompt_text
+from job_context import job_scope
+from text_utils import allocate_budget, estimate_tokens, truncate_to_tokens
+
+def make_post(source, index, content='word ' * 100):
+    return {
+        'author': f'Author {source}',
+        'title': f'Post {index}',
+        'url': f'https://{source}.example.com/p/{index}',
+        'published': '',
+        'full_content': content,
+        'source': f'https://{source}.example.com',
+    }
+
+def message(text):
+    return {'text': text, 'usage': {'input_tokens': 100, 'output_tokens': 20}, 'cache': 'miss', 'latency_seconds': 0.0}
+
+class TestTokenBudget(unittest.TestCase):
+    def test_small_items_keep_full_size(self):
+        self.assertEqual(allocate_budget([10, 500, 1000], 610), [10, 300, 300])
+        self.assertEqual(allocate_budget([10, 20], 1000), [10, 20])
+        self.assertEqual(allocate_budget([], 1000), [])
+
+    def test_truncate_prefers_paragraph_boundary(self):
+        text = 'a' * 380 + '\n\n' + 'b' * 100
+        self.assertEqual(truncate_to_tokens(text, 100), 'a' * 380)
+        self.assertEqual(truncate_to_tokens('short', 100), 'short')
+
+    def test_pack_posts_stays_within_budget(self):
+        posts = [make_post('a', 0, 'x' * 40000), make_post('b', 1, 'short body')]
+        packed = handler.pack_posts(posts, 2000)
+
+        self.assertLessEqual(estimate_tokens(packed), 2000)
+        self.assertIn('Content: short body\n', packed)
+        self.assertIn('x...', packed)
+
+class TestMapReduceAnalysis(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('handler.ANTHROPIC_API_KEY', 'key')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.posts = [make_post(source, i) for source in ('a', 'b', 'c') for i in range(2)]
+
+    @patch('handler.create_message')
+    def test_single_mode_sends_one_prompt(self, mock_create):
+        mock_create.return_value = message('Report')
+        analysis = handler.analyze_research_intelligence(self.posts)
+
+        mock_create.assert_called_once()
+        self.assertEqual(analysis['analysis_mode'], 'single')
+        self.assertIn('Analyze these newsletter posts', ''.join(prompt_text(mock_create.call_args[0][1])))
+
+    @patch('handler.create_message')
+    def test_shards_run_concurrently_and_reduce_in_order(self, mock_create):
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def fake_create(api_key, prompt, max_tokens, **kwargs):
+            if max_tokens != handler.MAP_MAX_TOKENS:
+                return message('Report')
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.1)
+            with lock:
+                in_flight.pop()
+            source = prompt.split('Source: ')[1].split('\n')[0]
+            return message(f'Summary of {source}')
+
+        mock_create.side_effect = fake_create
+        started = time.monotonic()
+        with job_scope(options={'analysis_mode': 'map_reduce', 'analysis_parallelism': 2, 'analysis_shard': 'post'}):
+            analysis = handler.analyze_research_intelligence(self.posts)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(max(peak), 2)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(analysis['shards_analyzed'], 6)
+        self.assertEqual(analysis['map_usage'], {'input_tokens': 600, 'output_tokens': 120})
+        reduce_prompt = ''.join(prompt_text(mock_create.call_args[0][1]))
+        self.assertIn('Analyze these summaries of newsletter posts', reduce_prompt)
+        self.assertLess(reduce_prompt.index('a.example.com'), reduce_prompt.index('c.example.com'))
+
+    @patch('handler.create_message')
+    def test_failed_shards_are_reported_and_skipped(self, mock_create):
+        def fake_create(api_key, prompt, max_tokens, **kwargs):
+            if max_tokens == handler.MAP_MAX_TOKENS and 'b.example.com' in prompt:
+                raise ClaudeAPIError(529, 'overloaded')
+            return message('Text')
+
+        mock_create.side_effect = fake_create
+        with job_scope(options={'analysis_mode': 'map_reduce'}):
+            analysis = handler.analyze_research_intelligence(self.posts)
+
+        self.assertEqual(analysis['shards_analyzed'], 2)
+        self.assertEqual(analysis['shard_errors'], ['https://b.example.com: Claude API error: 529'])
+
+    @patch('handler.extract_substack_content')
+    def test_handler_rejects_invalid_analysis_inputs(self, mock_extract):
+        for job_input in ({'analysis_mode': 'tree'}, {'analysis_shard': 'word'},
+                          {'analysis_parallelism': 0}, {'prompt_token_budget': 10}):
+            with self.subTest(job_input=job_input):
+                result = handler.handler({'input': {'newsletters': ['https://example.com'], **job_input}})
+                self.assertIn('error', result)
+        mock_extract.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
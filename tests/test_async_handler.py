@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import handler
+from cache_utils import SingleFlight
+from job_context import JobStats, WorkSkipped, job_scope
+
+class TestSingleFlight(unittest.TestCase):
+    def run_concurrently(self, flight, fn, callers=4):
+        results = [None] * callers
+        errors = [None] * callers
+
+        def call(index):
+            try:
+                results[index] = flight.do('key', fn)
+            except Exception as e:
+                errors[index] = e
+
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        results, _ = self.run_concurrently(flight, slow)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertEqual({value for value, _ in results}, {'value'})
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_errors_reach_every_waiter_and_are_not_kept(self):
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        _, errors = self.run_concurrently(flight, failing)
+
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        self.assertEqual(flight.do('key', lambda: 'retry'), ('retry', False))
+
+    def test_waiters_rerun_a_call_the_leader_skipped(self):
+        flight = SingleFlight(unshared=(WorkSkipped,))
+        calls = []
+
+        def skipped_first():
+            first = not calls
+            calls.append(1)
+            time.sleep(0.1)
+            if first:
+                raise WorkSkipped('deadline')
+            return 'value'
+
+        results, errors = self.run_concurrently(flight, skipped_first)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([type(error) for error in errors if error is not None], [WorkSkipped])
+        self.assertEqual(sorted(result for result in results if result is not None),
+                         [('value', False), ('value', True), ('value', True)])
+
+class TestCoalescedFetches(unittest.TestCase):
+    def setUp(self):
+        handler._feed_cache.clear()
+
+    @patch('handler.get_session')
+    def test_concurrent_jobs_share_a_feed_fetch(self, mock_session):
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {'Content-Type': 'application/rss+xml'}
+        response.__enter__.return_value = response
+
+        def slow_get(*args, **kwargs):
+            time.sleep(0.1)
+            return response
+
+        mock_session.return_value.get.side_effect = slow_get
+        stats = [JobStats(), JobStats()]
+
+        def job(job_stats):
+            with job_scope(stats=job_stats):
+                handler.fetch_feed('https://example.com/feed')
+
+        with patch('handler.read_limited', return_value=b'<rss version="2.0"><channel></channel></rss>'):
+            threads = [threading.Thread(target=job, args=(job_stats,)) for job_stats in stats]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        mock_session.return_value.get.assert_called_once()
+        statuses = sorted(job_stats.section('feeds')['https://example.com/feed']['status'] for job_stats in stats)
+        self.assertEqual(statuses, ['miss', 'shared'])
+
+    @patch('handler.get_session')
+    def test_a_feed_skipped_by_one_job_is_fetched_by_the_next(self, mock_session):
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {'Content-Type': 'application/rss+xml'}
+        response.__enter__.return_value = response
+        mock_session.return_value.get.return_value = response
+        fetch_feed = handler._fetch_feed
+
+        def leader_skips(rss_url, fetch):
+            if not fetches:
+                fetches.append(rss_url)
+                time.sleep(0.1)
+                raise WorkSkipped('deadline')
+            return fetch_feed(rss_url, fetch)
+
+        fetches = []
+        stats = [JobStats(), JobStats()]
+
+        def job(job_stats):
+            with job_scope(stats=job_stats):
+                handler.fetch_feed('https://example.com/feed')
+
+        with patch('handler._fetch_feed', side_effect=leader_skips), \
+                patch('handler.read_limited', return_value=b'<rss version="2.0"><channel></channel></rss>'):
+            threads = [threading.Thread(target=job, args=(job_stats,)) for job_stats in stats]
+            for thread in threads:
+                thread.start()
+                time.sleep(0.02)
+            for thread in threads:
+                thread.join()
+
+        statuses = [job_stats.section('feeds')['https://example.com/feed']['status'] for job_stats in stats]
+        self.assertEqual(statuses, ['skipped', 'miss'])
+        self.assertEqual(stats[1].section('skipped'), {})
+
+    @patch('handler._get_post_content')
+    def test_post_key_covers_job_settings(self, mock_get):
+        def slow_get(url, stamp):
+            time.sleep(0.1)
+            return 'content', 'scrape'
+
+        mock_get.side_effect = slow_get
+        options = [{'post_cache': 'use'}, {'post_cache': 'use'}, {'post_cache': 'refresh'}]
+
+        def job(job_options):
+            with job_scope(options=job_options):
+                handler._shared_post_content('https://example.com/p/1', 'stamp')
+
+        threads = [threading.Thread(target=job, args=(job_options,)) for job_options in options]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock_get.call_count, 2)
+
+class TestAsyncHandler(unittest.TestCase):
+    def test_jobs_overlap_on_one_worker(self):
+        def slow_handler(event):
+            time.sleep(0.2)
+            return {'job': event['id']}
+
+        async def run_jobs():
+            return await asyncio.gather(*[handler.async_handler({'id': index}) for index in range(4)])
+
+        with patch('handler.handler', side_effect=slow_handler):
+            started = time.monotonic()
+            results = asyncio.run(run_jobs())
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(results, [{'job': index} for index in range(4)])
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(handler.concurrency_modifier(1), handler.WORKER_JOB_CONCURRENCY)
+
+    def test_async_stream_handler_keeps_job_scope_across_steps(self):
+        def fake_stream(event):
+            with job_scope(options={'marker': event['id']}):
+                for _ in range(3):
+                    yield {'event': 'step'}
+
+        async def collect():
+            return [item async for item in handler.async_stream_handler({'id': 1})]
+
+        with patch('handler.stream_handler', side_effect=fake_stream):
+            self.assertEqual(len(asyncio.run(collect())), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import time
+import unittest
+from unittest.mock import patch
+import handler
+from claude_utils import batch_messages
+from job_context import JobStats, WorkSkipped, job_scope
+from stand_in_case import StandInTestCase
+
+def drain(generator):
+    """Run a generator to the end, returning (yielded items, return value)"""
+    items = []
+    while True:
+        try:
+            items.append(next(generator))
+        except StopIteration as stop:
+            return items, stop.value
+
+class TestBatchJobs(StandInTestCase):
+    """Batch jobs against the local newsletter and Message Batches API stand-ins"""
+
+    server_config = {'newsletters': 3, 'posts': 2, 'paragraphs': 10, 'preload_kb': 1, 'page_latency_ms': 0,
+                     'llm_delay_ms': 0, 'llm_output_words': 40, 'batch_latency_ms': 100}
+
+    def start_server(self, **config):
+        super().start_server(**config)
+        self.patch('claude_utils.BATCH_POLL_SECONDS', 0.05)
+
+    def groups_input(self):
+        url = self.server.base_url
+        return self.job_input(groups={
+            'first': [f'{url}/n0', f'{url}/n1'], 'second': [f'{url}/n1', f'{url}/n2'], 'third': [f'{url}/n0'],
+        })
+
+    def test_groups_share_fetching_and_go_out_as_two_batches(self):
+        self.start_server()
+        events = list(handler.stream_handler({'input': self.groups_input()}))
+        result = events[-1]['result']
+
+        self.assertEqual([group['name'] for group in result['groups']], ['first', 'second', 'third'])
+        self.assertEqual([group['posts_collected'] for group in result['groups']], [4, 4, 2])
+        for group in result['groups']:
+            self.assertNotIn('error', group['research_intelligence'])
+            self.assertNotIn('error', group['outreach_strategy'])
+        self.assertEqual(result['newsletters_scanned'], 3)
+        self.assertEqual(result['batch_stats']['batches'], 2)
+        self.assertEqual(result['batch_stats']['succeeded'], 6)
+
+        served = self.server.snapshot()['requests']
+        self.assertEqual(served['feed'], 3)
+        self.assertEqual(served['batch_create'], 2)
+        self.assertNotIn('messages', served)
+        stages = {event['stage'] for event in events if event['event'] == 'progress'}
+        self.assertEqual(stages, {'collect', 'analysis', 'outreach'})
+
+    def test_errored_requests_fail_only_their_group(self):
+        self.start_server(batch_errors=1)
+        result = handler.handler({'input': self.groups_input()})
+
+        first, second, third = result['groups']
+        self.assertEqual(first['research_intelligence'], {'error': 'Batch request errored: stand-in batch error'})
+        self.assertNotIn('outreach_strategy', first)
+        self.assertNotIn('error', second['research_intelligence'])
+        self.assertEqual(second['outreach_strategy'], {'error': 'Batch request errored: stand-in batch error'})
+        self.assertNotIn('error', third['outreach_strategy'])
+
+    def test_groups_without_posts_are_not_sent(self):
+        self.start_server()
+        url = self.server.base_url
+        result = handler.handler({'input': self.job_input(groups={'full': [f'{url}/n0'], 'empty': [f'{url}/n9']})})
+
+        full, empty = result['groups']
+        self.assertNotIn('error', full['research_intelligence'])
+        self.assertEqual(empty['posts_collected'], 0)
+        self.assertEqual(empty['research_intelligence'], {'error': 'No posts collected'})
+        self.assertNotIn('outreach_strategy', empty)
+        self.assertEqual(result['empty_groups'], ['empty'])
+        self.assertEqual(result['batch_stats']['requests'], 2)
+
+    def test_batch_is_canceled_when_the_deadline_is_near(self):
+        self.start_server(batch_latency_ms=60000)
+        requests = [{'custom_id': 'a', 'prompt': 'hello', 'max_tokens': 10}]
+        stats = JobStats()
+        with job_scope(stats=stats, options={'cache_policy': 'bypass'}, deadline=time.monotonic() + 2.5):
+            with self.assertRaises(WorkSkipped):
+                drain(batch_messages('stand-in', requests))
+
+        self.assertEqual(self.server.snapshot()['requests']['batch_cancel'], 1)
+
+    @patch('handler.extract_substack_content')
+    def test_handler_rejects_invalid_groups(self, mock_extract):
+        for job_input in ({'groups': []}, {'groups': {}}, {'groups': {'a': []}}, {'groups': {'a': 'https://a.com'}},
+                          {'groups': {'a': ['https://a.com']}, 'analysis_mode': 'map_reduce'},
+                          {'groups': {'a': ['https://a.com']}, 'incremental': True}):
+            with self.subTest(job_input=job_input):
+                self.assertIn('error', handler.handler({'input': job_input}))
+        mock_extract.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+import handler
+from cache_utils import PersistentCache
+from job_context import JobStats, job_scope
+
+class TestPersistentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'cache', 'test.sqlite3')
+
+    def test_round_trip_and_persistence(self):
+        PersistentCache(self.path, ttl_seconds=60, max_bytes=1024).put('k', b'value')
+
+        self.assertEqual(PersistentCache(self.path, ttl_seconds=60, max_bytes=1024).get('k'), b'value')
+
+    def test_expired_entries_are_ignored(self):
+        cache = PersistentCache(self.path, ttl_seconds=60, max_bytes=1024)
+        with patch('cache_utils.time.time', return_value=1000.0):
+            cache.put('k', b'value')
+        with patch('cache_utils.time.time', return_value=1061.0):
+            self.assertIsNone(cache.get('k'))
+
+    def test_lru_eviction_by_size(self):
+        cache = PersistentCache(self.path, ttl_seconds=60, max_bytes=10)
+        with patch('cache_utils.time.time', return_value=1000.0):
+            cache.put('a', b'aaaa')
+        with patch('cache_utils.time.time', return_value=1001.0):
+            cache.put('b', b'bbbb')
+        with patch('cache_utils.time.time', return_value=1002.0):
+            cache.get('a')
+        with patch('cache_utils.time.time', return_value=1003.0):
+            cache.put('c', b'cccc')
+            self.assertEqual(cache.get('a'), b'aaaa')
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('c'), b'cccc')
+
+    def test_size_total_is_kept_across_replaces_expiry_and_workers(self):
+        first = PersistentCache(self.path, ttl_seconds=60, max_bytes=10)
+        second = PersistentCache(self.path, ttl_seconds=60, max_bytes=10)
+        with patch('cache_utils.time.time', return_value=1000.0):
+            first.put('a', b'aaaa')
+            second.put('a', b'aa')
+        with patch('cache_utils.time.time', return_value=1030.0):
+            second.put('b', b'bbbb')
+        with patch('cache_utils.time.time', return_value=1070.0):
+            first.put('c', b'ccccccc')
+            self.assertIsNone(second.get('b'))
+
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('SELECT total FROM cache_size').fetchone()[0], 7)
+        self.assertEqual(conn.execute('SELECT SUM(size) FROM cache').fetchone()[0], 7)
+
+    def test_wal_files_are_switched_to_the_rollback_journal(self):
+        os.makedirs(os.path.dirname(self.path))
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.close()
+
+        PersistentCache(self.path, ttl_seconds=60, max_bytes=1024).put('k', b'value')
+
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+
+    def test_unusable_path_disables_cache(self):
+        blocker = os.path.join(self.tmpdir.name, 'file')
+        open(blocker, 'w').close()
+        cache = PersistentCache(os.path.join(blocker, 'db.sqlite3'), ttl_seconds=60, max_bytes=1024)
+
+        cache.put('k', b'value')
+        self.assertIsNone(cache.get('k'))
+
+class TestPostStore(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        store = PersistentCache(os.path.join(tmpdir.name, 'posts.sqlite3'), ttl_seconds=60, max_bytes=1024 * 1024)
+        patcher = patch('handler._post_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('handler._scrape_post', return_value=('Body text', 4096))
+    def test_second_fetch_is_served_from_store(self, mock_scrape):
+        stats = JobStats()
+        with job_scope(stats=stats):
+            self.assertEqual(handler.get_post_content('https://example.com/p/1', 'Mon'), 'Body text')
+            self.assertEqual(handler.get_post_content('https://example.com/p/1', 'Mon'), 'Body text')
+
+        mock_scrape.assert_called_once()
+        self.assertEqual(stats.section('post_cache'), {'misses': 1, 'hits': 1, 'bytes_saved': 4096})
+
+    @patch('handler._scrape_post', return_value=('Body text', 4096))
+    def test_new_stamp_and_policies_rescrape(self, mock_scrape):
+        handler.get_post_content('https://example.com/p/1', 'Mon')
+        handler.get_post_content('https://example.com/p/1', 'Tue')
+        with job_scope(options={'post_cache': 'refresh'}):
+            handler.get_post_content('https://example.com/p/1', 'Tue')
+        with job_scope(options={'post_cache': 'bypass'}):
+            handler.get_post_content('https://example.com/p/2', 'Tue')
+        handler.get_post_content('https://example.com/p/2', 'Tue')
+
+        self.assertEqual(mock_scrape.call_count, 5)
+
+    @patch('handler._scrape_post', return_value=('Body text', 4096))
+    def test_each_extractor_has_its_own_entries(self, mock_scrape):
+        handler.get_post_content('https://example.com/p/1', 'Mon')
+        with job_scope(options={'extractor': 'lxml'}):
+            handler.get_post_content('https://example.com/p/1', 'Mon')
+            handler.get_post_content('https://example.com/p/1', 'Mon')
+
+        self.assertEqual(mock_scrape.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import handler
+from cache_utils import PersistentCache
+from claude_utils import ClaudeAPIError, create_message
+from job_context import JobStats, job_scope
+
+def api_response(text, status_code=200, usage=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = 'error body'
+    response.json.return_value = {
+        'content': [{'type': 'text', 'text': text}],
+        'usage': usage or {'input_tokens': 1200, 'output_tokens': 300},
+    }
+    return response
+
+class ClaudeTestCase(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        cache = PersistentCache(os.path.join(tmpdir.name, 'responses.sqlite3'), ttl_seconds=60, max_bytes=1024 * 1024)
+        cache_patcher = patch('claude_utils._response_cache', cache)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+        backoff_patcher = patch('claude_utils.CLAUDE_BACKOFF_SECONDS', 0)
+        backoff_patcher.start()
+        self.addCleanup(backoff_patcher.stop)
+
+        self.session = MagicMock()
+        self.session.post.return_value = api_response('Analysis text')
+        session_patcher = patch('claude_utils.get_session', return_value=self.session)
+        session_patcher.start()
+        self.addCleanup(session_patcher.stop)
+
+class TestResponseCache(ClaudeTestCase):
+    def test_identical_request_is_served_from_cache(self):
+        stats = JobStats()
+        with job_scope(stats=stats):
+            first = create_message('key', 'prompt', 3000)
+            second = create_message('key', 'prompt', 3000)
+
+        self.assertEqual((first['cache'], second['cache']), ('miss', 'hit'))
+        self.assertEqual(second['text'], 'Analysis text')
+        self.session.post.assert_called_once()
+        self.assertEqual(stats.section('llm_cache')['tokens_saved'], 1500)
+
+    def test_key_covers_model_tokens_and_prompt(self):
+        create_message('key', 'prompt', 3000)
+        create_message('key', 'prompt', 2500)
+        create_message('key', 'other prompt', 3000)
+        create_message('key', 'prompt', 3000, model='claude-other')
+
+        self.assertEqual(self.session.post.call_count, 4)
+
+    def test_refresh_and_bypass_policies(self):
+        create_message('key', 'prompt', 3000)
+        with job_scope(options={'cache_policy': 'refresh'}):
+            self.assertEqual(create_message('key', 'prompt', 3000)['cache'], 'miss')
+        with job_scope(options={'cache_policy': 'bypass'}):
+            self.assertEqual(create_message('key', 'new prompt', 3000)['cache'], 'bypass')
+        self.assertEqual(create_message('key', 'new prompt', 3000)['cache'], 'miss')
+
+        self.assertEqual(self.session.post.call_count, 4)
+
+    def test_errors_are_not_cached(self):
+        self.session.post.return_value = api_response('', status_code=529)
+        with self.assertRaises(ClaudeAPIError):
+            create_message('key', 'prompt', 3000)
+
+class TestOutreachChaining(ClaudeTestCase):
+    @patch('handler.ANTHROPIC_API_KEY', 'key')
+    def test_outreach_reuses_cache_for_same_analysis(self):
+        posts = [{'author': 'A', 'title': 'T', 'url': 'u', 'published': '', 'full_content': 'c', 'source': 's'}]
+        analysis = handler.analyze_research_intelligence(posts)
+        self.session.post.return_value = api_response('Outreach text')
+
+        first = handler.generate_outreach_strategy(analysis)
+        second = handler.generate_outreach_strategy(dict(analysis))
+
+        self.assertEqual(analysis['cache'], 'miss')
+        self.assertEqual((first['cache'], second['cache']), ('miss', 'hit'))
+        self.assertEqual(second['outreach_strategy'], 'Outreach text')
+        self.assertEqual(self.session.post.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+import handler
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestColdStart(unittest.TestCase):
+    def test_heavy_imports_are_deferred(self):
+        probe = "import sys, handler; print(sorted(m for m in ('runpod', 'bs4', 'feedparser') if m in sys.modules))"
+        output = subprocess.run([sys.executable, '-c', probe], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip().splitlines()[-1], '[]')
+
+    @patch('handler.dns_cache.resolve')
+    def test_warm_up_prepares_session_dns_and_parsers(self, mock_resolve):
+        mock_resolve.side_effect = [['93.184.216.34'], OSError('no such host')]
+
+        timings = handler.warm_up(hosts=['example.com', 'missing.example'])
+
+        self.assertEqual(set(timings), {'parsers', 'session', 'caches', 'dns'})
+        self.assertEqual([call.args[0] for call in mock_resolve.call_args_list], ['example.com', 'missing.example'])
+        self.assertIn('feedparser', sys.modules)
+        self.assertIsNotNone(handler.get_session())
+
+    def test_runpod_is_imported_on_demand(self):
+        probe = ("import sys, handler; loaded = 'runpod' in sys.modules; handler.import_runpod(); "
+                 "print(loaded, 'runpod.serverless' in sys.modules)")
+        output = subprocess.run([sys.executable, '-c', probe], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip().splitlines()[-1], 'False True')
+
+if __name__ == '__main__':
+    unittest.main()
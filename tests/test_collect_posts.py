@@ -0,0 +1,51 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from handler import collect_posts, handler
+from job_context import fetch_slot
+
+class TestCollectPosts(unittest.TestCase):
+    @patch('handler.extract_substack_content')
+    def test_preserves_newsletter_order(self, mock_extract):
+        # Later newsletters finish first; output must still follow input order
+        def fake_extract(url, max_posts):
+            time.sleep(0.05 if url.endswith('/0') else 0)
+            return [{'title': url}]
+        mock_extract.side_effect = fake_extract
+
+        newsletters = [f'https://example.com/{i}' for i in range(4)]
+        posts = collect_posts(newsletters, 1, max_concurrency=4)
+
+        self.assertEqual([p['title'] for p in posts], newsletters)
+
+    @patch('handler.extract_substack_content')
+    def test_concurrency_limit_bounds_fetches(self, mock_extract):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def fake_extract(url, max_posts):
+            with fetch_slot():
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                time.sleep(0.02)
+                with lock:
+                    state['active'] -= 1
+            return []
+        mock_extract.side_effect = fake_extract
+
+        collect_posts([f'https://example.com/{i}' for i in range(6)], 1, max_concurrency=2)
+
+        self.assertLessEqual(state['peak'], 2)
+
+    @patch('handler.extract_substack_content')
+    @patch('handler.analyze_research_intelligence')
+    def test_invalid_max_concurrency(self, mock_analyze, mock_extract):
+        result = handler({'input': {'newsletters': ['https://example.com'], 'max_concurrency': 0}})
+
+        self.assertIn("error", result)
+        mock_extract.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import feedparser
+import requests
+import handler
+from claude_utils import ClaudeAPIError, create_message
+from http_utils import CircuitBreaker, HostRateLimiter, guarded_get, host_breaker
+from job_context import JobStats, WorkSkipped, fetch_slot, job_scope, request_timeout, time_left
+
+def http_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.text = 'error body'
+    response.json.return_value = {'content': [{'type': 'text', 'text': 'ok'}], 'usage': {}}
+    response.__enter__.return_value = response
+    return response
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures_and_probes_after_cooldown(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=lambda: now[0])
+
+        breaker.record_failure('a.com')
+        breaker.record_success('a.com')
+        breaker.record_failure('a.com')
+        self.assertTrue(breaker.allow('a.com'))
+        breaker.record_failure('a.com')
+        self.assertFalse(breaker.allow('a.com'))
+        self.assertTrue(breaker.allow('b.com'))
+        self.assertEqual(breaker.open_hosts(), {'a.com': 10})
+
+        now[0] = 11
+        self.assertTrue(breaker.allow('a.com'))
+        self.assertFalse(breaker.allow('a.com'))  # one trial request at a time
+        breaker.record_failure('a.com')
+        self.assertFalse(breaker.allow('a.com'))
+
+        now[0] = 22
+        self.assertTrue(breaker.allow('a.com'))
+        breaker.record_success('a.com')
+        self.assertTrue(breaker.allow('a.com'))
+        self.assertEqual(breaker.open_hosts(), {})
+
+class TestGuardedGet(unittest.TestCase):
+    def setUp(self):
+        host_breaker.clear()
+        self.addCleanup(host_breaker.clear)
+
+    def test_failures_open_the_host_circuit(self):
+        session = MagicMock()
+        session.get.return_value = http_response(503)
+        for _ in range(host_breaker.failure_threshold - 1):
+            with guarded_get(session, 'https://down.example.com/feed', timeout=10):
+                pass
+        session.get.side_effect = requests.ConnectionError('refused')
+        with self.assertRaises(requests.ConnectionError), guarded_get(session, 'https://down.example.com/p/1', timeout=10):
+            pass
+
+        with self.assertRaises(WorkSkipped) as skipped, guarded_get(session, 'https://down.example.com/p/2', timeout=10):
+            pass
+        self.assertEqual(skipped.exception.reason, 'circuit_open')
+        self.assertEqual(session.get.call_count, host_breaker.failure_threshold)
+        self.assertIn('down.example.com', host_breaker.open_hosts())
+
+    def test_timeout_is_capped_by_the_deadline(self):
+        session = MagicMock()
+        session.get.return_value = http_response(200)
+        with job_scope(deadline=time.monotonic() + 3), guarded_get(session, 'https://example.com', timeout=10):
+            pass
+        self.assertLessEqual(session.get.call_args.kwargs['timeout'], 3)
+
+        with job_scope(deadline=time.monotonic() + 0.5), self.assertRaises(WorkSkipped):
+            with guarded_get(session, 'https://example.com', timeout=10):
+                pass
+        session.get.assert_called_once()
+
+class TestDeadline(unittest.TestCase):
+    def test_nested_scopes_only_tighten_the_deadline(self):
+        self.assertIsNone(time_left())
+        self.assertEqual(request_timeout(10), 10)
+        with job_scope(deadline=time.monotonic() + 5):
+            with job_scope(deadline=time.monotonic() + 60):
+                self.assertLessEqual(time_left(), 5)
+            with job_scope(deadline=time.monotonic() + 2):
+                self.assertLessEqual(request_timeout(10), 2)
+
+    def test_host_waits_past_the_deadline_are_skipped_without_sleeping(self):
+        limiter = HostRateLimiter(default_interval=3.0)
+        started = time.monotonic()
+        with job_scope(rate_limiter=limiter, deadline=started + 2):
+            with fetch_slot('https://slow.example.com/p/1'):
+                pass
+            with self.assertRaises(WorkSkipped), fetch_slot('https://slow.example.com/p/2'):
+                pass
+            with fetch_slot('https://other.example.com/p/1'):
+                pass
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_concurrency_slot_wait_is_bounded_by_the_deadline(self):
+        started = time.monotonic()
+        with job_scope(max_concurrency=1, deadline=started + 1.3), fetch_slot():
+            with self.assertRaises(WorkSkipped), fetch_slot():
+                pass
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    @patch('handler.is_safe_url', return_value=True)
+    def test_skipped_scrape_falls_back_to_feed_text(self, mock_safe):
+        entry = feedparser.FeedParserDict({'link': 'https://slow.example.com/p/1', 'summary': '<p>Short summary</p>'})
+        stats = JobStats()
+        with job_scope(stats=stats, options={'content_mode': 'scrape', 'post_cache': 'bypass'},
+                       deadline=time.monotonic()):
+            content, source = handler._entry_content(entry)
+
+        self.assertEqual((content, source), ('Short summary', 'feed_summary'))
+        self.assertEqual(stats.section('skipped')['https://slow.example.com/p/1'],
+                         {'stage': 'post_scrape', 'reason': 'deadline'})
+
+    def test_skipped_feed_serves_stale_copy(self):
+        url = 'https://stale.example.com/feed'
+        handler._feed_cache.clear()
+        self.addCleanup(handler._feed_cache.clear)
+        handler._feed_cache.put(url, feedparser.parse(b'<rss version="2.0"><channel><title>Old</title></channel></rss>'))
+        handler._feed_cache.get(url).fetched_at = 0
+
+        stats = JobStats()
+        with job_scope(stats=stats, deadline=time.monotonic()):
+            feed = handler.fetch_feed(url)
+
+        self.assertEqual(feed.feed.title, 'Old')
+        self.assertEqual(stats.section('feeds')[url]['status'], 'stale')
+        self.assertEqual(stats.section('skipped')[url]['reason'], 'deadline')
+
+    @patch('handler.ANTHROPIC_API_KEY', 'key')
+    @patch('claude_utils.get_session')
+    def test_llm_stages_are_skipped_past_the_deadline(self, mock_session):
+        posts = [{'author': 'A', 'title': 'T', 'url': 'u', 'published': '', 'full_content': 'c', 'source': 's'}]
+        stats = JobStats()
+        with job_scope(stats=stats, deadline=time.monotonic()):
+            analysis = handler.analyze_research_intelligence(posts)
+
+        self.assertEqual(analysis, {'error': 'Analysis skipped: deadline'})
+        self.assertEqual(stats.section('skipped')['analysis']['reason'], 'deadline')
+        mock_session.return_value.post.assert_not_called()
+
+    @patch('handler.extract_substack_content')
+    def test_handler_validates_deadline(self, mock_extract):
+        for deadline in (0, -1, 'soon', True, handler.MAX_DEADLINE_SECONDS + 1):
+            with self.subTest(deadline=deadline):
+                result = handler.handler({'input': {'newsletters': ['https://example.com'], 'deadline_seconds': deadline}})
+                self.assertIn('error', result)
+        mock_extract.assert_not_called()
+
+@patch('claude_utils.CLAUDE_BACKOFF_SECONDS', 0)
+@patch('claude_utils._response_cache', MagicMock(get=MagicMock(return_value=None)))
+class TestClaudeRetries(unittest.TestCase):
+    @patch('claude_utils.get_session')
+    def test_overloaded_responses_are_retried(self, mock_session):
+        mock_session.return_value.post.side_effect = [http_response(529), http_response(429), http_response(200)]
+
+        self.assertEqual(create_message('key', 'prompt', 100)['text'], 'ok')
+        self.assertEqual(mock_session.return_value.post.call_count, 3)
+
+    @patch('claude_utils.get_session')
+    def test_gives_up_when_retry_after_exceeds_the_deadline(self, mock_session):
+        mock_session.return_value.post.return_value = http_response(529, {'retry-after': '30'})
+
+        with job_scope(deadline=time.monotonic() + 10), self.assertRaises(ClaudeAPIError):
+            create_message('key', 'prompt', 100)
+        mock_session.return_value.post.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
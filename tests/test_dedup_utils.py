@@ -0,0 +1,76 @@
+import random
+import unittest
+from unittest.mock import patch
+import handler
+from dedup_utils import canonical_url, duplicate_groups, estimate_similarity, minhash_signature
+from job_context import job_scope
+
+rng = random.Random(7)
+VOCABULARY = [f'word{i}' for i in range(2000)]
+
+def essay(words=600):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+def make_post(url, content, source='https://a.example.com'):
+    return {'title': url, 'url': url, 'published': '', 'full_content': content, 'source': source, 'author': source}
+
+class TestCanonicalUrl(unittest.TestCase):
+    def test_tracking_and_formatting_differences_collapse(self):
+        expected = canonical_url('https://example.substack.com/p/post')
+        for url in ('http://www.Example.substack.com/p/post/',
+                    'https://example.substack.com/p/post?utm_source=twitter&r=abc12',
+                    'https://example.substack.com/p/post#comments'):
+            self.assertEqual(canonical_url(url), expected)
+        self.assertNotEqual(canonical_url('https://example.substack.com/p/post?page=2'), expected)
+
+class TestMinHash(unittest.TestCase):
+    def test_similarity_tracks_overlap(self):
+        text = essay()
+        words = text.split()
+        edited = ' '.join(words[:570] + essay(30).split())
+
+        self.assertEqual(estimate_similarity(minhash_signature(text), minhash_signature(text)), 1.0)
+        self.assertGreater(estimate_similarity(minhash_signature(text), minhash_signature(edited)), 0.8)
+        self.assertLess(estimate_similarity(minhash_signature(text), minhash_signature(essay())), 0.1)
+        self.assertEqual(estimate_similarity([], minhash_signature(text)), 0.0)
+
+    def test_groups_by_url_or_content(self):
+        shared = essay()
+        groups = duplicate_groups(
+            ['https://a.com/p/1', 'https://b.com/x', 'https://www.a.com/p/1/', 'https://c.com/y'],
+            [shared, essay(), '', shared.upper()],
+            threshold=0.8,
+        )
+        self.assertEqual(groups, [[0, 2, 3], [1]])
+
+class TestDedupePosts(unittest.TestCase):
+    def test_merges_copies_and_reports_savings(self):
+        shared = essay()
+        posts = [
+            make_post('https://a.com/p/1', shared),
+            make_post('https://b.com/p/2', essay(), 'https://b.example.com'),
+            make_post('https://c.com/p/1', shared + ' extra words', 'https://c.example.com'),
+        ]
+
+        with job_scope(options={'dedup_threshold': 0.9}):
+            deduped, stats = handler.dedupe_posts(posts)
+
+        self.assertEqual([post['url'] for post in deduped], ['https://c.com/p/1', 'https://b.com/p/2'])
+        self.assertEqual([source['url'] for source in deduped[0]['sources']], ['https://a.com/p/1', 'https://c.com/p/1'])
+        self.assertNotIn('sources', deduped[1])
+        self.assertEqual(stats['duplicates_removed'], 1)
+        self.assertGreater(stats['tokens_saved'], 0)
+
+        with job_scope(options={'dedup': False}):
+            self.assertEqual(handler.dedupe_posts(posts)[0], posts)
+
+    @patch('handler.extract_substack_content')
+    def test_handler_validates_threshold(self, mock_extract):
+        for threshold in (0, 1.5, 'high', True):
+            with self.subTest(threshold=threshold):
+                result = handler.handler({'input': {'newsletters': ['https://example.com'], 'dedup_threshold': threshold}})
+                self.assertIn('error', result)
+        mock_extract.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
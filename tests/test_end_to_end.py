@@ -0,0 +1,34 @@
+import unittest
+import handler
+from stand_in_case import StandInTestCase
+
+class TestEndToEnd(StandInTestCase):
+    """The real handler against local newsletter and Messages API stand-ins"""
+
+    server_config = {'newsletters': 2, 'posts': 2, 'paragraphs': 20, 'preload_kb': 20, 'page_latency_ms': 0,
+                     'llm_delay_ms': 0, 'llm_output_words': 40, 'llm_chunk_delay_ms': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.start_server()
+        self.event = {'input': self.job_input()}
+
+    def test_handler_scrapes_and_analyzes(self):
+        result = handler.handler(self.event)
+
+        self.assertEqual(result['posts_collected'], 4)
+        self.assertTrue(all(post['full_content'] for post in result['posts']))
+        self.assertTrue(result['research_intelligence']['research_intelligence'])
+        self.assertTrue(result['outreach_strategy']['outreach_strategy'])
+        self.assertEqual(self.server.snapshot()['requests'], {'feed': 2, 'page': 4, 'messages': 2})
+
+    def test_stream_handler_over_sse(self):
+        events = list(handler.stream_handler(self.event))
+        result = events[-1]['result']
+        streamed = ''.join(event['text'] for event in events if event['event'] == 'analysis')
+
+        self.assertEqual(streamed, result['research_intelligence']['research_intelligence'])
+        self.assertEqual(self.server.snapshot()['requests']['messages_stream'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+from extract_utils import (
+    RawTextFilter,
+    StreamingExtractor,
+    available_extractors,
+    create_extractor,
+    extract_streaming,
+    extract_with_soup,
+    sniff_encoding,
+)
+from handler import handler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from make_fixtures import build_fixtures  # noqa: E402
+
+PAGE = b"""<!DOCTYPE html><html><head><meta charset="utf-8">
+<script>var preload = "<div class='post-content'><p>not content</p></div>";</script></head>
+<body><div class="nav"><p>Navigation</p></div>
+<article><h1 class="post-title">The Title \xe2\x80\x94 caf\xc3\xa9</h1>
+<div class="available-content"><div class="body markup">
+<p>First <em>para</em> <!-- hidden --> here.</p>
+<blockquote><p>Quoted para</p></blockquote>
+<h2>Section</h2><p></p><p>   </p>
+<p>Second &amp; more<br>line</p>
+</div></div></article><footer><p>Footer</p></footer></body></html>"""
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+class TestStreamingExtractor(unittest.TestCase):
+    def test_matches_soup_at_any_chunk_size(self):
+        expected = extract_with_soup(PAGE)
+        self.assertIn('Quoted para', expected)
+        for size in (1, 7, 64, len(PAGE)):
+            self.assertEqual(extract_streaming(chunked(PAGE, size)), expected)
+
+    def test_prefers_post_content_container(self):
+        page = (b"<html><body><article><p>Article only</p>"
+                b"<div class='post-content'><p>Post body</p></div></article></body></html>")
+        self.assertEqual(extract_streaming([page]), 'Post body')
+        self.assertEqual(extract_with_soup(page), 'Post body')
+
+    def test_stops_once_enough_text_is_collected(self):
+        paragraphs = b''.join(b'<p>' + b'word ' * 50 + b'</p>' for _ in range(200))
+        page = b"<html><body><div class='available-content'>" + paragraphs + b"</div></body></html>"
+        extractor = StreamingExtractor(max_chars=1000)
+
+        fed = 0
+        for chunk in chunked(page, 512):
+            fed += len(chunk)
+            if extractor.feed(chunk):
+                break
+
+        self.assertLess(fed, len(page) // 4)
+        self.assertEqual(extractor.close(), extract_with_soup(page, max_chars=1000))
+
+    def test_no_container_returns_empty(self):
+        self.assertEqual(extract_streaming([b"<html><body><p>Loose text</p></body></html>"]), "")
+
+class TestRawTextFilter(unittest.TestCase):
+    def test_strips_script_and_style_bodies_across_chunks(self):
+        page = b"<head><SCRIPT type='x'>if (a</b) { '</p>' }</script><style>p{}</style></head><p>kept</p>"
+        for size in (1, 3, len(page)):
+            text_filter = RawTextFilter()
+            out = b''.join(text_filter.feed(chunk) for chunk in chunked(page, size)) + text_filter.flush()
+            self.assertEqual(out, b"<head><SCRIPT type='x'></script><style></style></head><p>kept</p>")
+
+class TestExtractorBackends(unittest.TestCase):
+    def run_backend(self, name, page):
+        extractor = create_extractor(name, 5000)
+        for chunk in chunked(page, 8192):
+            if extractor.feed(chunk):
+                break
+        return extractor.close()
+
+    def test_backends_match_reference_on_fixtures(self):
+        for fixture, page in build_fixtures().items():
+            if fixture == 'malformed.html':
+                continue
+            expected = extract_with_soup(page)
+            for name in available_extractors():
+                with self.subTest(fixture=fixture, backend=name):
+                    self.assertEqual(self.run_backend(name, page), expected)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_extractor('regex')
+
+    @patch('handler.extract_substack_content')
+    def test_handler_rejects_unknown_backend(self, mock_extract):
+        result = handler({'input': {'newsletters': ['https://example.com'], 'extractor': 'regex'}})
+
+        self.assertIn("error", result)
+        mock_extract.assert_not_called()
+
+class TestSniffEncoding(unittest.TestCase):
+    def test_header_then_meta_then_utf8(self):
+        self.assertEqual(sniff_encoding('text/html; charset=Windows-1252', b''), 'windows-1252')
+        self.assertEqual(sniff_encoding('text/html', b'<meta charset="ISO-8859-1">'), 'iso-8859-1')
+        self.assertEqual(sniff_encoding(None, b'<html>'), 'utf-8')
+
+    def test_undeclared_utf8_decodes(self):
+        page = "<html><body><article><p>café — ok</p></article></body></html>".encode('utf-8')
+        self.assertEqual(extract_streaming([page]), 'café — ok')
+
+if __name__ == '__main__':
+    unittest.main()
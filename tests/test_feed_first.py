@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import patch
+import feedparser
+from handler import extract_substack_content
+from job_context import JobStats, job_scope
+
+LONG_BODY = ''.join(f"<p>Paragraph {i} about machine consciousness and stories.</p>" for i in range(120))
+
+FEED_XML = f"""<?xml version="1.0"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel><title>Newsletter</title>
+<item><title>Full</title><link>https://example.com/p/full</link>
+<content:encoded><![CDATA[{LONG_BODY}]]></content:encoded></item>
+<item><title>Truncated</title><link>https://example.com/p/truncated</link>
+<content:encoded><![CDATA[<p>Only a teaser.</p>]]></content:encoded></item>
+<item><title>Bare</title><link>https://example.com/p/bare</link></item>
+</channel></rss>"""
+
+@patch('handler.is_safe_url', return_value=True)
+@patch('handler.fetch_feed', side_effect=lambda url: feedparser.parse(FEED_XML))
+@patch('handler._get_post_content', return_value=('Scraped body', 'scrape'))
+class TestFeedFirst(unittest.TestCase):
+    def test_uses_feed_body_and_falls_back_when_truncated(self, mock_get, mock_feed, mock_safe):
+        stats = JobStats()
+        with job_scope(stats=stats):
+            posts = extract_substack_content('https://example.com', 5)
+
+        self.assertEqual([p['content_source'] for p in posts], ['feed', 'scrape', 'scrape'])
+        self.assertTrue(posts[0]['full_content'].startswith('Paragraph 0 about'))
+        self.assertIn('\n\nParagraph 1 about', posts[0]['full_content'])
+        self.assertEqual(len(posts[0]['full_content']), 5000)
+        # Scrapes run concurrently, so only the set of scraped URLs is deterministic
+        self.assertEqual({call.args[0] for call in mock_get.call_args_list},
+                         {'https://example.com/p/truncated', 'https://example.com/p/bare'})
+        self.assertEqual(stats.section('content_sources'), {'feed': 1, 'scrape': 2})
+
+    def test_scrape_mode_ignores_feed_body(self, mock_get, mock_feed, mock_safe):
+        with job_scope(options={'content_mode': 'scrape'}):
+            posts = extract_substack_content('https://example.com', 5)
+
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual({p['content_source'] for p in posts}, {'scrape'})
+
+    def test_min_chars_is_configurable(self, mock_get, mock_feed, mock_safe):
+        with job_scope(options={'feed_content_min_chars': 5}):
+            posts = extract_substack_content('https://example.com', 5)
+
+        self.assertEqual([p['content_source'] for p in posts], ['feed', 'feed', 'scrape'])
+        self.assertEqual(posts[1]['full_content'], 'Only a teaser.')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import handler
+from handler import fetch_feed
+from job_context import JobStats, job_scope
+
+FEED_XML = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Test Feed</title>
+<item><title>Post one</title><link>https://example.com/p/one</link></item>
+</channel></rss>"""
+
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+
+    def do_GET(self):
+        FeedHandler.requests_seen.append(dict(self.headers))
+        if self.path == '/huge':
+            body = b"<rss>" + b"x" * 4096
+        elif self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        else:
+            body = FEED_XML
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestFetchFeed(unittest.TestCase):
+    def setUp(self):
+        FeedHandler.requests_seen = []
+        handler._feed_cache.clear()
+        # The pinned adapter refuses loopback; let these tests reach the local server
+        patcher = patch('security_utils.resolve_vetted', side_effect=lambda host: host)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def test_miss_then_fresh_hit_then_not_modified(self):
+        url = f"{self.base}/feed"
+        stats = JobStats()
+        with job_scope(stats=stats):
+            feed = fetch_feed(url)
+            self.assertEqual(stats.section('feeds')[url]['status'], 'miss')
+            self.assertEqual(feed.entries[0].title, 'Post one')
+
+            self.assertIs(fetch_feed(url), feed)
+            self.assertEqual(stats.section('feeds')[url]['status'], 'hit')
+            self.assertEqual(len(FeedHandler.requests_seen), 1)
+
+            with patch.object(handler._feed_cache.get(url), 'is_fresh', return_value=False):
+                self.assertIs(fetch_feed(url), feed)
+            self.assertEqual(stats.section('feeds')[url]['status'], 'not_modified')
+            self.assertEqual(FeedHandler.requests_seen[-1].get('If-None-Match'), '"v1"')
+
+    def test_download_is_size_capped(self):
+        url = f"{self.base}/huge"
+        stats = JobStats()
+        with patch('handler.MAX_RESPONSE_SIZE_BYTES', 1024), job_scope(stats=stats):
+            fetch_feed(url)
+
+        self.assertEqual(stats.section('feeds')[url]['bytes'], 1024)
+
+if __name__ == '__main__':
+    unittest.main()
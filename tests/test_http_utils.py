@@ -0,0 +1,185 @@
+import threading
+import time
+import unittest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from http_utils import (
+    HostRateLimiter,
+    JobRateLimiter,
+    MAX_HOST_INTERVAL_SECONDS,
+    get_session,
+    mount_caller_retries,
+    job_connection_stats,
+)
+from job_context import JobStats, job_scope
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.posts += 1
+        time.sleep(0.5)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+class TestHostRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch('http_utils.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_host_is_spaced(self):
+        limiter = HostRateLimiter(default_interval=1.0)
+
+        self.assertEqual(limiter.wait("https://a.example.com/p/1"), 0)
+        self.assertEqual(limiter.wait("https://a.example.com/p/2"), 1.0)
+        self.assertEqual(limiter.wait("https://a.example.com/p/3"), 2.0)
+
+    def test_different_hosts_interleave(self):
+        limiter = HostRateLimiter(default_interval=1.0)
+
+        self.assertEqual(limiter.wait("https://a.example.com/p/1"), 0)
+        self.assertEqual(limiter.wait("https://b.example.com/p/1"), 0)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_jobs_share_the_worker_slots(self):
+        shared = HostRateLimiter(default_interval=0.0)
+        first = JobRateLimiter(shared, default_interval=1.0)
+        second = JobRateLimiter(shared, default_interval=1.0)
+
+        self.assertEqual(first.wait("https://a.example.com/p/1"), 0)
+        self.assertEqual(second.wait("https://a.example.com/p/2"), 1.0)
+        self.assertEqual(first.wait("https://a.example.com/p/3"), 2.0)
+
+    def test_job_interval_cannot_lower_the_worker_interval(self):
+        shared = HostRateLimiter(default_interval=0.0, host_intervals={'a.example.com': 2.0})
+        job = JobRateLimiter(shared, default_interval=0.0)
+
+        self.assertEqual(job.wait("https://a.example.com/p/1"), 0)
+        self.assertEqual(job.wait("https://a.example.com/p/2"), 2.0)
+        self.assertEqual(job.wait("https://b.example.com/p/1"), 0)
+        self.assertEqual(job.wait("https://b.example.com/p/2"), 0)
+
+    def test_per_host_override(self):
+        limiter = HostRateLimiter(default_interval=1.0, host_intervals={'Slow.example.com': 5.0})
+
+        self.assertEqual(limiter.interval_for('slow.example.com'), 5.0)
+        self.assertEqual(limiter.interval_for('fast.example.com'), 1.0)
+
+    def test_crawl_delay_is_honored_and_capped(self):
+        fetches = []
+
+        def robots(scheme, host):
+            fetches.append(host)
+            return "User-agent: *\nCrawl-delay: 3\n" if host == 'polite.example.com' else "User-agent: *\nCrawl-delay: 9999\n"
+
+        limiter = HostRateLimiter(default_interval=1.0, respect_crawl_delay=True, robots_fetcher=robots)
+
+        self.assertEqual(limiter.interval_for('polite.example.com'), 3.0)
+        self.assertEqual(limiter.interval_for('polite.example.com'), 3.0)
+        self.assertEqual(limiter.interval_for('greedy.example.com'), MAX_HOST_INTERVAL_SECONDS)
+        self.assertEqual(fetches, ['polite.example.com', 'greedy.example.com'])
+
+    def test_crawl_delay_ignored_by_default(self):
+        limiter = HostRateLimiter(default_interval=1.0, robots_fetcher=lambda scheme, host: self.fail("fetched robots"))
+
+        self.assertEqual(limiter.interval_for('a.example.com'), 1.0)
+
+class TestPooledSession(unittest.TestCase):
+    def setUp(self):
+        # The pinned adapter refuses loopback; let these tests reach the local server
+        patcher = patch('security_utils.resolve_vetted', side_effect=lambda host: host)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.posts = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def test_session_is_shared(self):
+        self.assertIs(get_session(), get_session())
+
+    def test_connections_are_reused(self):
+        job_stats = JobStats()
+        with job_scope(stats=job_stats):
+            for _ in range(3):
+                self.assertEqual(get_session().get(self.url, timeout=5).text, 'ok')
+
+        stats = job_connection_stats(job_stats.section('connections'))
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reused'], 2)
+
+    def test_connection_stats_are_counted_per_job(self):
+        first, second = JobStats(), JobStats()
+        with job_scope(stats=first):
+            get_session().get(self.url, timeout=5)
+        with job_scope(stats=second):
+            for _ in range(2):
+                get_session().get(self.url, timeout=5)
+
+        self.assertEqual(job_connection_stats(first.section('connections')),
+                         {'requests': 1, 'new_connections': 1, 'reused': 0})
+        self.assertEqual(job_connection_stats(second.section('connections')),
+                         {'requests': 2, 'new_connections': 0, 'reused': 2})
+
+    def test_post_is_not_resent_after_a_read_timeout(self):
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            get_session().post(self.url, json={}, timeout=0.1)
+        time.sleep(0.6)
+        self.assertEqual(self.server.posts, 1)
+
+    def test_caller_retry_mount_follows_the_base_url(self):
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        mount_caller_retries(base_url)
+
+        adapter = get_session().get_adapter(f"{base_url}/v1/messages")
+        self.assertFalse(adapter.max_retries.status_forcelist)
+        self.assertTrue(get_session().get_adapter("http://127.0.0.1:9/").max_retries.status_forcelist)
+
+class TestPinnedConnections(unittest.TestCase):
+    def test_loopback_is_refused(self):
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            get_session().get("http://127.0.0.1:9/", timeout=1)
+
+    def test_connects_to_vetted_address(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        # A hostname that would never resolve on its own is connected via the pinned address
+        with patch('security_utils.resolve_vetted', return_value='127.0.0.1') as mock_resolve:
+            response = get_session().get(f"http://pinned.invalid:{server.server_address[1]}/", timeout=5)
+
+        self.assertEqual(response.text, 'ok')
+        mock_resolve.assert_called_with('pinned.invalid')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import handler
+from cache_utils import PersistentCache
+from stand_in_case import StandInTestCase
+
+class TestIncrementalRuns(StandInTestCase):
+    """Repeated incremental jobs against the local newsletter and Messages API stand-ins"""
+
+    server_config = {'newsletters': 2, 'posts': 3, 'paragraphs': 10, 'preload_kb': 1, 'page_latency_ms': 0,
+                     'llm_delay_ms': 0, 'llm_output_words': 40}
+
+    def setUp(self):
+        super().setUp()
+        self.start_server()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.patch('handler._state_store',
+                   PersistentCache(os.path.join(tmpdir.name, 'state.sqlite3'), ttl_seconds=3600, max_bytes=1024 * 1024))
+        self.input = self.job_input(incremental=True)
+
+    def requests_since(self, before):
+        after = self.server.snapshot()['requests']
+        return {kind: count - before.get(kind, 0) for kind, count in after.items() if count != before.get(kind, 0)}
+
+    def test_initial_update_then_unchanged(self):
+        first = handler.handler({'input': self.input})
+        self.assertEqual(first['incremental_stats']['mode'], 'initial')
+        self.assertEqual(first['incremental_stats']['cursors_advanced'], 2)
+
+        # Each feed has one entry beyond the first posts_per_newsletter
+        before = self.server.snapshot()['requests']
+        second = handler.handler({'input': self.input})
+
+        self.assertEqual(second['incremental_stats']['mode'], 'update')
+        self.assertEqual(second['incremental_stats']['new_entries'], 2)
+        self.assertEqual(second['incremental_stats']['entries_skipped'], 4)
+        self.assertEqual([post['url'].rsplit('/', 1)[1] for post in second['posts']], ['post-2', 'post-2'])
+        self.assertEqual(self.requests_since(before), {'page': 2, 'messages': 2})
+
+        before = self.server.snapshot()['requests']
+        started = time.perf_counter()
+        third = handler.handler({'input': self.input})
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(third['posts_collected'], 0)
+        self.assertEqual(third['research_intelligence']['research_intelligence'],
+                         second['research_intelligence']['research_intelligence'])
+        self.assertEqual(third['research_intelligence']['cache'], 'state')
+        self.assertEqual(third['outreach_strategy']['outreach_strategy'],
+                         second['outreach_strategy']['outreach_strategy'])
+        self.assertEqual(third['incremental_stats']['entries_skipped'], 6)
+        self.assertEqual(self.requests_since(before), {})  # fresh feed cache, no pages, no LLM
+        self.assertLess(elapsed, 0.5)
+
+    def test_only_analyzed_entries_advance_the_cursors(self):
+        first = handler.handler({'input': {**self.input, 'top_k': 1}})
+        self.assertEqual(first['incremental_stats']['cursors_advanced'], 1)
+
+        second = handler.handler({'input': self.input})
+        analyzed = [post['url'] for post in first['posts'] if post['analyzed']]
+        ranked_out = [post['url'] for post in first['posts'] if not post['analyzed']]
+        urls = [post['url'] for post in second['posts']]
+        self.assertEqual(len(analyzed), 1)
+        self.assertNotIn(analyzed[0], urls)
+        self.assertTrue(set(ranked_out) <= set(urls))
+
+    @patch('handler._scrape_post', side_effect=handler.WorkSkipped('deadline'))
+    def test_skipped_scrapes_keep_cursors(self, mock_scrape):
+        skipped = handler.handler({'input': self.input})
+        self.assertEqual(skipped['incremental_stats']['mode'], 'initial')
+        self.assertEqual(skipped['incremental_stats']['cursors_advanced'], 0)
+
+        mock_scrape.side_effect = None
+        mock_scrape.return_value = ('post text', 9)
+        retried = handler.handler({'input': {**self.input, 'dedup': False}})
+        self.assertEqual([post['url'] for post in retried['posts']], [post['url'] for post in skipped['posts']])
+        self.assertEqual(retried['incremental_stats']['cursors_advanced'], 2)
+
+    @patch('handler.create_message', side_effect=handler.ClaudeAPIError(529, 'overloaded'))
+    def test_failed_analysis_keeps_cursors(self, mock_create):
+        failed = handler.handler({'input': self.input})
+        self.assertEqual(failed['incremental_stats'], {
+            'state_key': failed['incremental_stats']['state_key'], 'mode': 'failed',
+            'new_entries': 4, 'entries_skipped': 0, 'cursors_advanced': 0,
+        })
+
+        mock_create.side_effect = None
+        mock_create.return_value = {'text': 'report', 'usage': {}, 'cache': 'miss'}
+        retried = handler.handler({'input': self.input})
+        self.assertEqual(retried['posts_collected'], 4)
+
+    def test_state_key_separates_rolling_reports(self):
+        handler.handler({'input': self.input})
+        other = handler.handler({'input': {**self.input, 'state_key': 'weekly'}})
+
+        self.assertEqual(other['incremental_stats']['mode'], 'initial')
+        self.assertEqual(other['posts_collected'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import MagicMock, patch
+import handler
+from cache_utils import PersistentCache
+from claude_utils import create_message
+from job_context import JobMetrics, job_scope, metrics_enabled, record_span, span
+
+PAGE = b"<html><body><article><p>" + b"word " * 2000 + b"</p></article></body></html>"
+
+class TestSpans(unittest.TestCase):
+    def test_disabled_spans_are_no_ops(self):
+        self.assertFalse(metrics_enabled())
+        with span('stage', url='u') as current:
+            current.add('bytes', 10)
+            current.tag('cache', 'hit')
+        record_span('stage', 1.0, bytes=1)
+
+    def test_aggregates_measures_tags_and_errors(self):
+        metrics = JobMetrics()
+        with job_scope(metrics=metrics):
+            for cache in ('hit', 'miss', 'hit'):
+                with span('claude') as current:
+                    current.add('input_tokens', 100)
+                    current.tag('cache', cache)
+            with self.assertRaises(ValueError), span('feed_fetch'):
+                raise ValueError('boom')
+
+        stages = metrics.summary()['stages']
+        self.assertEqual(stages['claude']['count'], 3)
+        self.assertEqual(stages['claude']['input_tokens'], 300)
+        self.assertEqual(stages['claude']['cache'], {'hit': 2, 'miss': 1})
+        self.assertEqual(stages['feed_fetch']['error'], {'ValueError': 1})
+
+    def test_log_lines_are_json(self):
+        output = io.StringIO()
+        with redirect_stdout(output), job_scope(metrics=JobMetrics(job_id='job-1', log=True)):
+            with span('url_check', url='https://example.com') as current:
+                current.tag('result', 'safe')
+
+        line = json.loads(output.getvalue())
+        self.assertEqual((line['event'], line['job_id'], line['stage']), ('span', 'job-1', 'url_check'))
+        self.assertEqual((line['url'], line['result']), ('https://example.com', 'safe'))
+
+class TestInstrumentedCalls(unittest.TestCase):
+    @patch('handler.is_safe_url', return_value=True)
+    @patch('handler.get_session')
+    def test_scrape_splits_download_and_parse(self, mock_session, mock_safe):
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {'Content-Type': 'text/html; charset=utf-8'}
+        response.iter_content.return_value = [PAGE[i:i + 8192] for i in range(0, len(PAGE), 8192)]
+        response.__enter__.return_value = response
+        mock_session.return_value.get.return_value = response
+
+        metrics = JobMetrics()
+        with job_scope(metrics=metrics):
+            content, bytes_read = handler._scrape_post('https://example.com/p/1')
+
+        stages = metrics.summary()['stages']
+        self.assertTrue(content)
+        self.assertEqual(stages['post_scrape']['bytes'], bytes_read)
+        self.assertEqual(stages['post_download']['bytes'], bytes_read)
+        self.assertEqual(stages['post_parse']['chars'], len(content))
+        self.assertIn('fetch_wait', stages)
+
+    def test_claude_calls_record_tokens_and_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = PersistentCache(os.path.join(tmpdir, 'responses.sqlite3'), ttl_seconds=60, max_bytes=1024 * 1024)
+            response = MagicMock()
+            response.status_code = 200
+            response.json.return_value = {'content': [{'text': 'ok'}], 'usage': {'input_tokens': 10, 'output_tokens': 5}}
+            metrics = JobMetrics()
+            with patch('claude_utils._response_cache', cache), \
+                    patch('claude_utils.get_session') as mock_session, job_scope(metrics=metrics):
+                mock_session.return_value.post.return_value = response
+                create_message('key', 'prompt', 100)
+                create_message('key', 'prompt', 100)
+
+        claude = metrics.summary()['stages']['claude']
+        self.assertEqual(claude['cache'], {'miss': 1, 'hit': 1})
+        self.assertEqual((claude['input_tokens'], claude['output_tokens']), (10, 5))
+
+    @patch('handler.analyze_research_intelligence', return_value={'error': 'skipped'})
+    @patch('handler.collect_posts', return_value=[])
+    def test_metrics_block_only_when_requested(self, mock_collect, mock_analyze):
+        event = {'input': {'newsletters': ['https://example.com']}}
+        self.assertNotIn('metrics', handler.handler(event))
+
+        result = handler.handler({'input': {**event['input'], 'metrics': True}})
+        self.assertEqual(set(result['metrics']['stages']), {'collect', 'prepare', 'analysis'})
+        self.assertIn('wall_ms', result['metrics'])
+
+if __name__ == '__main__':
+    unittest.main()
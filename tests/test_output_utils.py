@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import patch
+import handler
+from output_utils import decode_result, encode_result, project, sources_table
+
+def make_post(index, source='https://a.example.com', author='A'):
+    return {'title': f'Post {index}', 'url': f'{source}/p/{index}', 'summary': 's', 'full_content': ' '.join(f'word{index}x{i}' for i in range(50)),
+            'source': source, 'author': author, 'scraped_at': f'2024-01-01T00:00:0{index}'}
+
+RESULT = {
+    'posts_collected': 2,
+    'posts': [make_post(1), make_post(2)],
+    'research_intelligence': {'research_intelligence': 'report', 'usage': {'input_tokens': 10}},
+}
+
+class TestProjection(unittest.TestCase):
+    def test_include_paths_step_into_lists(self):
+        projected = project(RESULT, ['posts.title', 'research_intelligence.research_intelligence'])
+
+        self.assertEqual(projected, {
+            'posts': [{'title': 'Post 1'}, {'title': 'Post 2'}],
+            'research_intelligence': {'research_intelligence': 'report'},
+        })
+
+    def test_exclude_leaves_the_input_untouched(self):
+        projected = project(RESULT, exclude=['posts.full_content', 'posts.summary', 'missing.field'])
+
+        self.assertNotIn('full_content', projected['posts'][0])
+        self.assertEqual(projected['posts'][0]['title'], 'Post 1')
+        self.assertIn('full_content', RESULT['posts'][0])
+        self.assertIs(project(RESULT), RESULT)
+
+class TestSourcesTable(unittest.TestCase):
+    def test_repeated_metadata_moves_into_the_table(self):
+        merged = {**make_post(3, 'https://b.example.com', 'B'),
+                  'sources': [{'url': 'u1', 'source': 'https://b.example.com', 'author': 'B'},
+                              {'url': 'u2', 'source': 'https://a.example.com', 'author': 'A'}]}
+        posts, table = sources_table([make_post(2), make_post(1), merged, {'title': 'bare'}])
+
+        self.assertEqual(table, [
+            {'source': 'https://a.example.com', 'author': 'A', 'scraped_at': '2024-01-01T00:00:01'},
+            {'source': 'https://b.example.com', 'author': 'B', 'scraped_at': '2024-01-01T00:00:03'},
+        ])
+        self.assertEqual([post.get('source_id') for post in posts], [0, 0, 1, None])
+        self.assertNotIn('author', posts[0])
+        self.assertEqual(posts[2]['sources'], [{'url': 'u1', 'source_id': 1}, {'url': 'u2', 'source_id': 0}])
+
+class TestEncoding(unittest.TestCase):
+    def test_gzip_round_trip(self):
+        envelope = encode_result(RESULT, 'gzip')
+
+        self.assertEqual(envelope['encoding'], 'gzip+base64')
+        self.assertEqual(decode_result(envelope), RESULT)
+
+    @patch('handler.analyze_research_intelligence', return_value={'research_intelligence': 'report ' * 200})
+    @patch('handler.collect_posts')
+    def test_handler_projects_and_encodes(self, mock_collect, mock_analyze):
+        mock_collect.return_value = [make_post(index) for index in range(1, 6)]
+        job_input = {'newsletters': ['https://a.example.com'], 'include_outreach_strategy': False}
+
+        plain = handler.handler({'input': job_input})
+        compact = handler.handler({'input': {**job_input, 'exclude_fields': ['posts.full_content'],
+                                             'sources_table': True, 'encoding': 'gzip'}})
+
+        decoded = decode_result(compact)
+        self.assertEqual(len(decoded['posts']), 5)
+        self.assertNotIn('full_content', decoded['posts'][0])
+        self.assertEqual(len(decoded['source_table']), 1)
+        self.assertEqual(decoded['research_intelligence'], plain['research_intelligence'])
+        self.assertEqual(plain['size_stats']['result_bytes'], plain['size_stats']['projected_bytes'])
+        sizes = compact['size_stats']
+        self.assertLess(sizes['projected_bytes'], sizes['result_bytes'])
+        self.assertLess(sizes['encoded_bytes'], sizes['projected_bytes'])
+
+    @patch('handler.extract_substack_content')
+    def test_handler_validates_output_inputs(self, mock_extract):
+        for job_input in ({'fields': 'posts'}, {'fields': ['posts.']}, {'exclude_fields': [1]},
+                          {'sources_table': 'yes'}, {'encoding': 'brotli'}):
+            with self.subTest(job_input=job_input):
+                result = handler.handler({'input': {'newsletters': ['https://example.com'], **job_input}})
+                self.assertIn('error', result)
+        mock_extract.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import handler
+from claude_utils import _payload, create_message, request_key, supports_prompt_cache, text_block
+from job_context import job_scope
+from stand_in_case import StandInTestCase
+
+class TestPromptStructure(unittest.TestCase):
+    def test_cache_markers_follow_the_prompt_cache_mode(self):
+        with job_scope(options={'prompt_cache': 'corpus'}):
+            self.assertEqual(handler.user_prompt('posts', 'task'),
+                             [text_block('posts', cached=True), text_block('task')])
+            self.assertEqual(handler.user_prompt('', 'task'), 'task')
+        with job_scope(options={'prompt_cache': 'off'}):
+            self.assertEqual(handler.user_prompt('posts', 'task'), 'poststask')
+
+    def test_corpus_is_the_default_only_on_models_that_cache(self):
+        self.assertFalse(supports_prompt_cache('claude-3-sonnet-20240229'))
+        self.assertFalse(supports_prompt_cache('claude-2.1'))
+        self.assertTrue(supports_prompt_cache('claude-3-5-sonnet-20241022'))
+        self.assertTrue(supports_prompt_cache('claude-3-haiku-20240307'))
+        self.assertTrue(supports_prompt_cache('claude-sonnet-4-20250514'))
+
+    def test_markers_ending_a_prefix_below_the_minimum_are_not_sent(self):
+        corpus = 'x' * 4000
+        with job_scope(options={'prompt_cache': 'corpus'}):
+            payload = _payload('claude-3-5-sonnet-20241022', 10, 'task', handler.SYSTEM_PROMPT)
+        self.assertNotIn('cache_control', payload['system'][0])
+
+        with job_scope(options={'prompt_cache': 'corpus'}):
+            short = _payload('claude-3-5-sonnet-20241022', 10, [text_block('posts', cached=True), text_block('task')],
+                             handler.SYSTEM_PROMPT)
+            sonnet = _payload('claude-3-5-sonnet-20241022', 10, [text_block(corpus, cached=True), text_block('task')],
+                              handler.SYSTEM_PROMPT)
+            haiku = _payload('claude-3-haiku-20240307', 10, [text_block(corpus, cached=True), text_block('task')],
+                             handler.SYSTEM_PROMPT)
+        self.assertEqual(short['messages'][0]['content'][0], text_block('posts'))
+        self.assertEqual(sonnet['messages'][0]['content'][0], text_block(corpus, cached=True))
+        self.assertEqual(haiku['messages'][0]['content'][0], text_block(corpus))
+
+    @patch('claude_utils._post_message')
+    def test_corpus_breakpoint_is_sent_to_the_api(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200, json=lambda: {'content': [{'text': 'ok'}], 'usage': {}})
+        corpus = 'x' * 4000
+        with job_scope(options={'prompt_cache': 'corpus', 'cache_policy': 'bypass'}):
+            create_message('key', handler.user_prompt(corpus, 'task'), 10, model='claude-3-5-sonnet-20241022',
+                           system=handler.SYSTEM_PROMPT)
+
+        sent = mock_post.call_args.args[1]
+        self.assertEqual(sent['messages'][0]['content'][0]['cache_control'], {'type': 'ephemeral'})
+        self.assertNotIn('cache_control', sent['messages'][0]['content'][1])
+
+    @patch('handler.create_message')
+    def test_map_shards_get_only_the_summary_instructions(self, mock_create):
+        post = {'author': 'A', 'title': 'T', 'url': 'https://a.example.com/p/1', 'published': '',
+                'full_content': 'body', 'source': 'https://a.example.com'}
+        handler._summarize_shard([post], 1000)
+
+        system = mock_create.call_args.kwargs['system']
+        self.assertEqual(system, handler.MAP_SYSTEM_PROMPT)
+        self.assertNotIn('## Outreach strategy', system)
+        self.assertIn('## Outreach strategy', handler.SYSTEM_PROMPT)
+
+    def test_cache_markers_stay_out_of_the_response_cache_key(self):
+        self.assertEqual(request_key('m', 10, [text_block('a', cached=True)], 'system'),
+                         request_key('m', 10, [text_block('a')], 'system'))
+        self.assertNotEqual(request_key('m', 10, 'a', 'system'), request_key('m', 10, 'a', 'other'))
+
+class TestPromptCaching(StandInTestCase):
+    """The analysis -> outreach chain against the Messages API stand-in's prompt cache"""
+
+    server_config = {'newsletters': 2, 'posts': 2, 'paragraphs': 10, 'preload_kb': 1, 'page_latency_ms': 0,
+                     'llm_delay_ms': 0, 'llm_output_words': 40, 'cache_min_tokens': 500}
+
+    def setUp(self):
+        super().setUp()
+        self.start_server()
+
+    def test_outreach_reads_the_corpus_written_by_the_analysis(self):
+        result = handler.handler({'input': self.job_input(prompt_cache='corpus')})
+
+        analysis_usage = result['research_intelligence']['usage']
+        outreach_usage = result['outreach_strategy']['usage']
+        self.assertGreater(analysis_usage['cache_creation_input_tokens'], 0)
+        self.assertEqual(analysis_usage['cache_read_input_tokens'], 0)
+        self.assertEqual(outreach_usage['cache_read_input_tokens'], analysis_usage['cache_creation_input_tokens'])
+        self.assertEqual(result['prompt_cache_stats']['cache_read_input_tokens'],
+                         outreach_usage['cache_read_input_tokens'])
+        self.assertEqual(self.server.snapshot()['prompt_cache']['cache_read_input_tokens'],
+                         outreach_usage['cache_read_input_tokens'])
+
+    def test_off_sends_no_cache_markers(self):
+        result = handler.handler({'input': self.job_input(prompt_cache='off')})
+
+        self.assertNotIn('error', result['outreach_strategy'])
+        self.assertEqual(result['prompt_cache_stats']['read_ratio'], 0.0)
+        self.assertEqual(self.server.snapshot()['prompt_cache'],
+                         {'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0})
+
+    @patch('handler.extract_substack_content')
+    def test_handler_rejects_unknown_prompt_cache_mode(self, mock_extract):
+        result = handler.handler({'input': {'newsletters': ['https://example.com'], 'prompt_cache': 'always'}})
+        self.assertIn('error', result)
+        mock_extract.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
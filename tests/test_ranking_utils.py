@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+import handler
+from job_context import job_scope
+from ranking_utils import bm25_scores, query_terms, tokenize
+
+def make_post(title, content):
+    return {'title': title, 'url': f'https://example.com/{title}', 'published': '', 'summary': '',
+            'full_content': content, 'source': 'https://example.com', 'author': 'Author'}
+
+FILLER = 'benchmark results gpu training throughput latency ' * 20
+
+POSTS = [
+    make_post('scaling', FILLER),
+    make_post('minds', FILLER + 'Do language models have minds? Questions of consciousness and subjective experience.'),
+    make_post('companions', FILLER + 'People form relationships with AI companions out of loneliness.'),
+    make_post('chips', 'wafer supply export controls foundry capacity ' * 40),
+]
+
+class TestBM25(unittest.TestCase):
+    def test_stemming_matches_word_forms(self):
+        self.assertEqual(tokenize('Consciousness minds stories'), tokenize('conscious mind story'))
+        self.assertEqual(query_terms(['mind', 'minds', 'the']), ['mind'])
+
+    def test_topical_posts_score_higher(self):
+        scores = bm25_scores([post['full_content'] for post in POSTS], 'consciousness subjective experience minds')
+
+        self.assertEqual(max(range(len(scores)), key=scores.__getitem__), 1)
+        self.assertEqual(scores[0], 0.0)
+        self.assertEqual(bm25_scores([], 'mind'), [])
+        self.assertEqual(bm25_scores(['text'], ''), [0.0])
+
+class TestRankPosts(unittest.TestCase):
+    def test_all_posts_forwarded_in_order_by_default(self):
+        annotated, forwarded, stats = handler.rank_posts(POSTS)
+
+        self.assertEqual([post['title'] for post in forwarded], [post['title'] for post in POSTS])
+        self.assertTrue(all(post['analyzed'] for post in annotated))
+        self.assertGreater(annotated[1]['relevance_score'], annotated[0]['relevance_score'])
+        self.assertEqual(stats['posts_forwarded'], 4)
+
+    def test_top_k_and_token_budget(self):
+        with job_scope(options={'top_k': 2}):
+            annotated, forwarded, _ = handler.rank_posts(POSTS)
+        self.assertEqual([post['title'] for post in forwarded], ['minds', 'companions'])
+        self.assertEqual([post['analyzed'] for post in annotated], [False, True, True, False])
+
+        with job_scope(options={'rank_token_budget': 300}):
+            _, forwarded, stats = handler.rank_posts(POSTS)
+        self.assertEqual([post['title'] for post in forwarded], ['minds'])
+        self.assertLessEqual(stats['tokens_forwarded'], 300)
+
+    @patch('handler.analyze_research_intelligence')
+    @patch('handler.collect_posts')
+    def test_handler_analyzes_forwarded_posts_and_reports_scores(self, mock_collect, mock_analyze):
+        mock_collect.return_value = POSTS
+        mock_analyze.return_value = {'error': 'skipped'}
+
+        result = handler.handler({'input': {'newsletters': ['https://example.com'], 'top_k': 1,
+                                            'topic_query': ['companions', 'loneliness']}})
+
+        self.assertEqual([post['title'] for post in mock_analyze.call_args[0][0]], ['companions'])
+        self.assertEqual(len(result['posts']), 4)
+        self.assertIn('relevance_score', result['posts'][0])
+        self.assertEqual(result['ranking_stats']['posts_forwarded'], 1)
+
+    @patch('handler.extract_substack_content')
+    def test_handler_validates_ranking_inputs(self, mock_extract):
+        for job_input in ({'top_k': 0}, {'rank_token_budget': -1}, {'topic_query': 'the of'}, {'topic_query': [1]}):
+            with self.subTest(job_input=job_input):
+                result = handler.handler({'input': {'newsletters': ['https://example.com'], **job_input}})
+                self.assertIn('error', result)
+        mock_extract.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
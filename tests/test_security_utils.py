@@ -1,5 +1,12 @@
+import socket
 import unittest
-from security_utils import is_safe_url
+from unittest.mock import patch
+from security_utils import is_safe_url, resolve_vetted, dns_cache, DNSCache, UnsafeAddressError
+from job_context import JobStats, job_scope
+
+def fake_addrinfo(address):
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    return (family, socket.SOCK_STREAM, 6, '', (address, 0))
 
 class TestIsSafeUrl(unittest.TestCase):
     def test_safe_urls(self):
@@ -30,5 +37,39 @@ class TestIsSafeUrl(unittest.TestCase):
         self.assertFalse(is_safe_url("not_a_url"))
         self.assertFalse(is_safe_url(""))
 
+class TestDNSCache(unittest.TestCase):
+    def setUp(self):
+        dns_cache.clear()
+        self.addCleanup(dns_cache.clear)
+
+    @patch('security_utils.socket.getaddrinfo', return_value=[fake_addrinfo('93.184.216.34')])
+    def test_resolves_once_per_ttl(self, mock_getaddrinfo):
+        stats = JobStats()
+        with job_scope(stats=stats):
+            self.assertTrue(is_safe_url("https://example.com/feed"))
+            self.assertTrue(is_safe_url("https://example.com/p/post"))
+            self.assertEqual(resolve_vetted("example.com"), '93.184.216.34')
+
+        mock_getaddrinfo.assert_called_once()
+        self.assertEqual(stats.section('dns')['hits'], 2)
+        self.assertEqual(stats.section('dns')['misses'], 1)
+
+    @patch('security_utils.socket.getaddrinfo',
+           return_value=[fake_addrinfo('2606:2800::1'), fake_addrinfo('93.184.216.34')])
+    def test_prefers_ipv4(self, mock_getaddrinfo):
+        self.assertEqual(DNSCache().resolve("example.com"), ['93.184.216.34', '2606:2800::1'])
+
+    @patch('security_utils.socket.getaddrinfo', return_value=[fake_addrinfo('10.0.0.5')])
+    def test_private_resolution_is_refused(self, mock_getaddrinfo):
+        self.assertFalse(is_safe_url("https://internal.example.com"))
+        with self.assertRaises(UnsafeAddressError):
+            resolve_vetted("internal.example.com")
+
+    @patch('security_utils.socket.getaddrinfo', side_effect=socket.gaierror(socket.EAI_NONAME, 'not found'))
+    def test_failures_are_cached_briefly(self, mock_getaddrinfo):
+        self.assertFalse(is_safe_url("https://missing.example.com"))
+        self.assertFalse(is_safe_url("https://missing.example.com"))
+        mock_getaddrinfo.assert_called_once()
+
 if __name__ == '__main__':
     unittest.main()
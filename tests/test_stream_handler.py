@@ -0,0 +1,145 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import handler
+from cache_utils import PersistentCache
+from claude_utils import ClaudeAPIError, stream_message
+
+def sse_lines(*events):
+    lines = []
+    for event, data in events:
+        lines += [f'event: {event}', f'data: {json.dumps(data)}', '']
+    return lines
+
+def text_stream(*deltas, input_tokens=50, output_tokens=10):
+    return sse_lines(
+        ('message_start', {'type': 'message_start', 'message': {'usage': {'input_tokens': input_tokens, 'output_tokens': 1}}}),
+        ('ping', {'type': 'ping'}),
+        *[('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                   'delta': {'type': 'text_delta', 'text': delta}}) for delta in deltas],
+        ('message_delta', {'type': 'message_delta', 'usage': {'output_tokens': output_tokens}}),
+        ('message_stop', {'type': 'message_stop'}),
+    )
+
+def stream_response(lines, status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = 'error body'
+    response.iter_lines.return_value = iter(lines)
+    response.__enter__.return_value = response
+    return response
+
+def drain(generator):
+    items = []
+    while True:
+        try:
+            items.append(next(generator))
+        except StopIteration as stop:
+            return items, stop.value
+
+class TestStreamMessage(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        cache = PersistentCache(os.path.join(tmpdir.name, 'responses.sqlite3'), ttl_seconds=60, max_bytes=1024 * 1024)
+        cache_patcher = patch('claude_utils._response_cache', cache)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+        backoff_patcher = patch('claude_utils.CLAUDE_BACKOFF_SECONDS', 0)
+        backoff_patcher.start()
+        self.addCleanup(backoff_patcher.stop)
+
+        self.session = MagicMock()
+        session_patcher = patch('claude_utils.get_session', return_value=self.session)
+        session_patcher.start()
+        self.addCleanup(session_patcher.stop)
+
+    def test_yields_deltas_and_caches_the_message(self):
+        self.session.post.return_value = stream_response(text_stream('Hello', ', world'))
+
+        deltas, message = drain(stream_message('key', 'prompt', 100))
+        self.assertEqual(deltas, ['Hello', ', world'])
+        self.assertEqual(message['text'], 'Hello, world')
+        self.assertEqual(message['usage'], {'input_tokens': 50, 'output_tokens': 10})
+        self.assertEqual(message['cache'], 'miss')
+        self.assertTrue(self.session.post.call_args.kwargs['json']['stream'])
+
+        deltas, cached = drain(stream_message('key', 'prompt', 100))
+        self.assertEqual((deltas, cached['cache']), (['Hello, world'], 'hit'))
+        self.session.post.assert_called_once()
+
+    def test_error_status_and_error_events_raise(self):
+        self.session.post.return_value = stream_response([], status_code=529)
+        with self.assertRaises(ClaudeAPIError):
+            drain(stream_message('key', 'prompt', 100))
+
+        self.session.post.return_value = stream_response(
+            sse_lines(('error', {'type': 'error', 'error': {'type': 'overloaded_error'}}))
+        )
+        with self.assertRaises(ClaudeAPIError):
+            drain(stream_message('key', 'other prompt', 100))
+
+def fake_posts(newsletter_url, max_posts):
+    return [{
+        'title': f'Post from {newsletter_url}', 'url': f'{newsletter_url}/p/1', 'published': '', 'summary': '',
+        'full_content': 'Body text', 'content_source': 'feed', 'source': newsletter_url,
+        'author': 'Author', 'scraped_at': 'now',
+    }]
+
+def fake_stream(api_key, prompt, max_tokens, **kwargs):
+    text = 'Analysis text' if max_tokens == handler.ANALYSIS_MAX_TOKENS else 'Outreach text'
+    for word in text.split(' '):
+        yield word + ' '
+    return {'text': text, 'usage': {}, 'cache': 'miss', 'latency_seconds': 0.0}
+
+class TestStreamHandler(unittest.TestCase):
+    event = {'input': {'newsletters': ['https://a.example.com', 'https://b.example.com']}}
+
+    def setUp(self):
+        for target, value in (('handler.ANTHROPIC_API_KEY', 'key'),
+                              ('handler.extract_substack_content', fake_posts),
+                              ('handler.stream_message', fake_stream),
+                              ('handler.STREAM_CHUNK_CHARS', 1)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_event_order(self):
+        events = list(handler.stream_handler(self.event))
+        kinds = [event['event'] for event in events]
+
+        self.assertEqual(kinds, ['started', 'posts', 'posts', 'analysis', 'analysis', 'outreach', 'outreach', 'result'])
+        self.assertEqual({event['newsletter'] for event in events[1:3]}, set(self.event['input']['newsletters']))
+        self.assertEqual(''.join(event['text'] for event in events if event['event'] == 'analysis'), 'Analysis text ')
+
+    def test_posts_events_carry_metadata_only(self):
+        events = list(handler.stream_handler(self.event))
+        streamed = [post for event in events if event['event'] == 'posts' for post in event['posts']]
+
+        self.assertEqual(len(streamed), 2)
+        for post in streamed:
+            self.assertEqual(set(post), set(handler.STREAM_POST_FIELDS))
+
+    @patch('handler.create_message')
+    def test_result_matches_handler_output(self, mock_create):
+        mock_create.side_effect = lambda api_key, prompt, max_tokens, **kwargs: drain(
+            fake_stream(api_key, prompt, max_tokens))[1]
+
+        streamed = list(handler.stream_handler(self.event))[-1]['result']
+        returned = handler.handler(self.event)
+
+        self.assertEqual(streamed.keys(), returned.keys())
+        self.assertEqual(streamed['posts'], returned['posts'])
+        self.assertEqual(streamed['research_intelligence']['research_intelligence'], 'Analysis text')
+        self.assertEqual(streamed['outreach_strategy']['outreach_strategy'], 'Outreach text')
+
+    def test_invalid_input_yields_error_result(self):
+        events = list(handler.stream_handler({'input': {'newsletters': 'not a list'}}))
+        self.assertEqual(len(events), 1)
+        self.assertIn('error', events[0]['result'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import math
+from typing import List
+
+# Rough characters-per-token ratio for English prose with Claude's tokenizer
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough for budgeting prompts"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Trim text to roughly max_tokens, preferring to cut at a paragraph or
+    sentence boundary in the last fifth of the allowance.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    for boundary in ('\n\n', '. '):
+        position = cut.rfind(boundary)
+        if position >= max_chars * 0.8:
+            return cut[:position + (1 if boundary == '. ' else 0)]
+    return cut
+
+def allocate_budget(sizes: List[int], budget: int) -> List[int]:
+    """
+    Split a token budget across items of the given sizes (water-filling):
+    items smaller than an equal share keep their full size and the leftover
+    is shared among the larger ones.
+    """
+    allocation = [0] * len(sizes)
+    remaining = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    left = budget
+    while remaining:
+        share = left // len(remaining)
+        index = remaining[0]
+        if sizes[index] <= share:
+            allocation[index] = sizes[index]
+            left -= sizes[index]
+            remaining.pop(0)
+        else:
+            for index in remaining:
+                allocation[index] = share
+            break
+    return allocation